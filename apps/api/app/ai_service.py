@@ -1,37 +1,123 @@
+import asyncio
+import json
+import logging
 import os
-from openai import OpenAI
+import random
+import weakref
+from typing import TYPE_CHECKING, AsyncIterator
 from dotenv import load_dotenv
 
+from . import llm_cache, metrics
+from .logs import log_event
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+SUMMARY_UNAVAILABLE = "Summary unavailable."
+ANSWER_ERROR_PREFIX = "AI Error: "
+# Summaries read the start of a document, where its topic, parties, dates and totals are;
+# ingest can then ask for one while the rest of the file is still being extracted
+SUMMARY_INPUT_CHARS = int(os.getenv("SUMMARY_INPUT_CHARS", "12000"))
 
-def summarize_text(text: str) -> str:
-    if not text:
-        return "No text found."
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Fast and cheap
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful and caring assistant. If the document is uploaded - summarize it in 1 concise sentence. Focus on the main topic, dates, and money amounts. If the user ask questions- ask politely and friendly-you can use smiles"
-                },
-                {"role": "user", "content": f"Here is the text:\n\n{text}"}
-            ],
-            max_tokens=150,
-            temperature=0.5
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"AI Error: {e}")
-        return "Summary unavailable."
 
+class AnswerError(str):
+    """The error text stream_answer() sends in place of the rest of an answer that failed."""
 
-# NEW VERSION (Allows chatting without files)
-def answer_user_question(context: str, question: str):
-    messages = [
+
+# Async path: one shared client, at most AI_MAX_CONCURRENCY requests in flight per event loop
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "5"))
+AI_RETRY_BASE_DELAY = 0.5
+
+# The OpenAI SDK takes about a second to import, so it and both clients are
+# loaded on first use (or by init_clients() in the app's lifespan hook), not
+# when this module is imported.
+_client: "OpenAI | None" = None
+_async_client: "AsyncOpenAI | None" = None
+_retryable: tuple[type[Exception], ...] | None = None
+_ai_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+_cache: llm_cache.ResponseCache | None = None
+
+
+def get_client() -> "OpenAI":
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def init_clients() -> None:
+    """Build both clients up front, so the first request doesn't pay for the SDK import."""
+    get_client()
+    get_async_client()
+
+
+def get_cache() -> llm_cache.ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = llm_cache.build_cache()
+    return _cache
+
+
+def set_cache(cache: llm_cache.ResponseCache) -> None:
+    global _cache
+    _cache = cache
+
+
+def _count_lookup(operation: str, cached: str | None) -> str | None:
+    metrics.LLM_CACHE_REQUESTS.inc(operation=operation, result="miss" if cached is None else "hit")
+    return cached
+
+
+def _cache_lookup(operation: str, key: str) -> str | None:
+    return _count_lookup(operation, get_cache().get(key))
+
+
+async def _cache_lookup_async(operation: str, key: str) -> str | None:
+    return _count_lookup(operation, await get_cache().get_async(key))
+
+
+def _complete(operation: str, **params) -> str:
+    """chat.completions.create through the response cache; only successful answers are stored."""
+    cache = get_cache()
+    key = llm_cache.make_key(**params)
+    cached = _cache_lookup(operation, key)
+    if cached is not None:
+        return cached
+    with metrics.timed(operation, params["model"]):
+        response = get_client().chat.completions.create(**params)
+    metrics.record_usage(operation, getattr(response, "usage", None))
+    content = response.choices[0].message.content
+    cache.set(key, content)
+    return content
+
+
+def _summary_params(text: str) -> dict:
+    return dict(
+        model="gpt-4o-mini",  # Fast and cheap
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a helpful and caring assistant. If the document is uploaded - summarize it in 1 concise sentence. Focus on the main topic, dates, and money amounts. If the user ask questions- ask politely and friendly-you can use smiles"
+            },
+            {"role": "user", "content": f"Here is the text:\n\n{text[:SUMMARY_INPUT_CHARS]}"}
+        ],
+        max_tokens=150,
+        temperature=0.5
+    )
+
+
+def answer_messages(context: str, question: str, history: list[dict] | None = None) -> list[dict]:
+    """The chat prompt: instructions, earlier conversation (if any), then context and question."""
+    return [
         {
             "role": "system",
             "content": (
@@ -41,30 +127,281 @@ def answer_user_question(context: str, question: str):
                 "Be polite and concise."
             )
         },
+        *(history or []),
         {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
     ]
 
+
+def _answer_params(context: str, question: str, history: list[dict] | None = None) -> dict:
+    return dict(
+        model="gpt-4o",  # or gpt-3.5-turbo
+        messages=answer_messages(context, question, history),
+        temperature=0.7
+    )
+
+
+def _fold_params(summary: str | None, turns: list[tuple[str, str]], max_tokens: int) -> dict:
+    transcript = "\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+    earlier = f"Summary so far:\n{summary}\n\n" if summary else ""
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "You maintain a running summary of a conversation between a user and their assistant. "
+                    "Merge the new exchanges into the summary. Keep facts, names, dates, amounts, "
+                    "decisions and open questions; drop small talk. Reply with the updated summary only."
+                ),
+            },
+            {"role": "user", "content": f"{earlier}New exchanges:\n{transcript}"},
+        ],
+        max_tokens=max_tokens,
+        temperature=0.2,
+    )
+
+
+def _task_params(notes: list[list[tuple[str, str | None]]], today: str) -> dict:
+    listed = "\n\n".join(
+        f"Note {n}:\n" + "\n".join(f"- {line}" + (f" (date: {due})" if due else "") for line, due in lines)
+        for n, lines in enumerate(notes, start=1)
+    )
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "You find the user's to-dos in their notes. For each note you get the lines a rule-based "
+                    "filter flagged, with the date it read from the line, if any. Return JSON: "
+                    '{"tasks": [{"note": <note number>, "title": <short imperative title>, '
+                    '"due": "YYYY-MM-DD" or null}]}. Only include things someone still has to do; '
+                    f"skip boilerplate, past events and general statements. Today is {today}."
+                ),
+            },
+            {"role": "user", "content": listed},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+
+
+def summarize_text(text: str) -> str:
+    if not text:
+        return "No text found."
+    try:
+        content = _complete("summarize", **_summary_params(text))
+        return content.strip()
+    except Exception as e:
+        log_event("ai_error", logging.WARNING, operation="summarize", error=str(e))
+        return SUMMARY_UNAVAILABLE
+
+
+# NEW VERSION (Allows chatting without files)
+def answer_user_question(context: str, question: str, history: list[dict] | None = None):
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # or gpt-3.5-turbo
-            messages=messages,
-            temperature=0.7
+        return _complete("answer", **_answer_params(context, question, history))
+    except Exception as e:
+        return f"{ANSWER_ERROR_PREFIX}{str(e)}"
+
+
+def get_async_client() -> "AsyncOpenAI":
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+
+        # Retries are ours (below), so they happen outside the concurrency slot
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return _async_client
+
+
+def _retryable_errors() -> tuple[type[Exception], ...]:
+    global _retryable
+    if _retryable is None:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+        _retryable = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+    return _retryable
+
+
+def _ai_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _ai_slots.get(loop)
+    if semaphore is None:
+        semaphore = _ai_slots[loop] = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+    return semaphore
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Honour the server's Retry-After on 429s, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return AI_RETRY_BASE_DELAY * 2 ** attempt * (1 + random.random())
+
+
+async def _call_with_retries(make_call):
+    for attempt in range(AI_MAX_RETRIES + 1):
+        async with _ai_semaphore():
+            try:
+                return await make_call()
+            except _retryable_errors() as e:
+                if attempt == AI_MAX_RETRIES:
+                    raise
+                delay = _retry_delay(e, attempt)
+        await asyncio.sleep(delay)
+
+
+async def _complete_async(operation: str, **params) -> str:
+    cache = get_cache()
+    key = llm_cache.make_key(**params)
+    cached = await _cache_lookup_async(operation, key)
+    if cached is not None:
+        return cached
+    with metrics.timed(operation, params["model"]):
+        response = await _call_with_retries(
+            lambda: get_async_client().chat.completions.create(**params)
         )
-        return response.choices[0].message.content
+    metrics.record_usage(operation, getattr(response, "usage", None))
+    content = response.choices[0].message.content
+    await cache.set_async(key, content)
+    return content
+
+
+async def summarize_text_async(text: str) -> str:
+    if not text:
+        return "No text found."
+    try:
+        content = await _complete_async("summarize", **_summary_params(text))
+        return content.strip()
     except Exception as e:
-        return f"AI Error: {str(e)}"
+        log_event("ai_error", logging.WARNING, operation="summarize", error=str(e))
+        return SUMMARY_UNAVAILABLE
+
+
+async def summarize_many(texts: list[str]) -> list[str | BaseException]:
+    """Summarize several documents concurrently (bounded by AI_MAX_CONCURRENCY).
+
+    Identical texts are only sent once. Results come back in input order;
+    an unexpected failure for one text is returned in its slot instead of
+    failing the batch.
+    """
+    unique = list(dict.fromkeys(texts))
+    results = await asyncio.gather(*(summarize_text_async(t) for t in unique), return_exceptions=True)
+    by_text = dict(zip(unique, results))
+    return [by_text[t] for t in texts]
+
+
+async def answer_user_question_async(context: str, question: str, history: list[dict] | None = None) -> str:
+    try:
+        return await _complete_async("answer", **_answer_params(context, question, history))
+    except Exception as e:
+        return f"{ANSWER_ERROR_PREFIX}{str(e)}"
+
+
+async def summarize_conversation_async(
+    summary: str | None, turns: list[tuple[str, str]], max_tokens: int
+) -> str | None:
+    """Fold (question, answer) turns into the running summary; None if the model call failed."""
+    try:
+        content = await _complete_async("fold", **_fold_params(summary, turns, max_tokens))
+        return content.strip() or None
+    except Exception as e:
+        log_event("ai_error", logging.WARNING, operation="fold", error=str(e))
+        return None
+
+
+async def extract_tasks_async(notes: list[list[tuple[str, str | None]]], today: str) -> list[dict] | None:
+    """Tasks in several notes at once, each given as (line, date) pairs; None if the model call failed."""
+    try:
+        content = await _complete_async("tasks", **_task_params(notes, today))
+        tasks = json.loads(content).get("tasks")
+    except Exception as e:
+        log_event("ai_error", logging.WARNING, operation="tasks", error=str(e))
+        return None
+    return tasks if isinstance(tasks, list) else []
+
+
+async def stream_answer(context: str, question: str, history: list[dict] | None = None) -> AsyncIterator[str]:
+    """Yield the answer as it is generated; a cached answer is yielded in one piece.
+
+    Only opening the stream is retried: once tokens have been sent they
+    cannot be taken back. The full answer is cached when the stream
+    completes; a failed, truncated or empty one is not.
+    """
+    params = _answer_params(context, question, history)
+    cache = get_cache()
+    key = llm_cache.make_key(**params)
+    cached = await _cache_lookup_async("answer", key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    finish_reason = None
+    try:
+        with metrics.timed("answer", f"{params['model']}:stream"):
+            stream = await _call_with_retries(
+                lambda: get_async_client().chat.completions.create(
+                    **params, stream=True, stream_options={"include_usage": True}
+                )
+            )
+            async with _ai_semaphore():
+                async for event in stream:
+                    # The last event carries the token counts and no choices
+                    metrics.record_usage("answer", getattr(event, "usage", None))
+                    if not event.choices:
+                        continue
+                    finish_reason = event.choices[0].finish_reason or finish_reason
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+    except Exception as e:
+        yield AnswerError(f"{ANSWER_ERROR_PREFIX}{str(e)}")
+        return
+    answer = "".join(parts)
+    # A stream that ended without "stop" was cut short (max_tokens, content filter): not worth replaying
+    if finish_reason == "stop" and answer.strip():
+        await cache.set_async(key, answer)
+
+
+async def transcribe_audio_async(file_path: str) -> str:
+    if not os.path.exists(file_path):
+        return "Voice file not found."
+
+    try:
+        with open(file_path, "rb") as audio_file:
+            async def create():
+                audio_file.seek(0)  # a retry must re-send the whole file
+                return await get_async_client().audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                )
+
+            with metrics.timed("transcribe", "whisper-1"):
+                transcript = await _call_with_retries(create)
+        return transcript.text
+    except Exception as e:
+        log_event("ai_error", logging.WARNING, operation="transcribe", error=str(e))
+        return "Error transcribing audio."
+
 
 def transcribe_audio(file_path: str) -> str:
     if not os.path.exists(file_path):
         return "Voice file not found."
 
     try:
-        audio_file = open(file_path, "rb")
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file
-        )
+        with open(file_path, "rb") as audio_file, metrics.timed("transcribe", "whisper-1"):
+            transcript = get_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file
+            )
         return transcript.text
     except Exception as e:
-        print(f"Whisper Error: {e}")
+        log_event("ai_error", logging.WARNING, operation="transcribe", error=str(e))
         return "Error transcribing audio."
\ No newline at end of file
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from . import storage
+
+BLOB_DIR = Path(os.getenv("BLOB_DIR", "data/blobs"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(sha256: str, ext: str = "") -> Path:
+    """Content-addressed location: data/blobs/<2 hex chars>/<sha256><ext>."""
+    return BLOB_DIR / sha256[:2] / f"{sha256}{ext.lower()}"
+
+
+def put_file(
+    src: Path,
+    ext: str = "",
+    sha256: str | None = None,
+    link: bool = False,
+) -> tuple[str, Path]:
+    """Adopt `src` into the store without copying when possible.
+
+    By default `src` is moved in (or discarded if the same bytes are already
+    stored). With `link=True` the source is left in place and the blob is a
+    hard link to it; that falls back to a copy across filesystems.
+    Returns (sha256, stored path). Pass `sha256` when it was computed while writing `src`.
+    """
+    sha256 = sha256 or hash_file(src)
+    dest = blob_path(sha256, ext)
+    if dest.exists():
+        if not link:
+            src.unlink()
+        return sha256, dest
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if link:
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+    else:
+        # A rename when src is on the same filesystem, a copy otherwise
+        shutil.move(src, dest)
+    return sha256, dest
+
+
+def put_bytes(data: bytes, ext: str = "") -> tuple[str, Path]:
+    sha256 = hashlib.sha256(data).hexdigest()
+    dest = blob_path(sha256, ext)
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Write under a unique name and rename, so concurrent writers never expose a partial blob
+        tmp = dest.with_name(f".{uuid.uuid4()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, dest)
+    return sha256, dest
+
+
+# Archival: blobs idle for BLOB_ARCHIVE_AFTER_DAYS, and the least recently used
+# ones while the hot directory is over BLOB_HOT_MAX_MB, move to the archive tier.
+BLOB_ARCHIVE_AFTER_SECONDS = float(os.getenv("BLOB_ARCHIVE_AFTER_DAYS", "30")) * 24 * 3600
+BLOB_HOT_MAX_BYTES = int(os.getenv("BLOB_HOT_MAX_MB", "2048")) * 1024 * 1024
+BLOB_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("BLOB_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+def blob_key(path: Path) -> str:
+    """Location of a hot blob relative to BLOB_DIR, which is also its key in the archive."""
+    return Path(path).resolve().relative_to(BLOB_DIR.resolve()).as_posix()
+
+
+def touch(path: Path) -> None:
+    # mtime doubles as "last used": blobs are immutable, and atime is often disabled.
+    # Files outside BLOB_DIR are never archived, and their mtime is not ours to change.
+    if Path(path).resolve().is_relative_to(BLOB_DIR.resolve()):
+        os.utime(path)
+
+
+def archive_cold_blobs(
+    archive: "storage.ArchiveStorage | None" = None,
+    max_hot_bytes: int | None = None,
+    archive_after: float | None = None,
+    now: float | None = None,
+) -> list[str]:
+    """Move cold blobs into the archive tier and delete the hot copies; returns the archived keys."""
+    archive = archive or storage.get_storage()
+    max_hot_bytes = BLOB_HOT_MAX_BYTES if max_hot_bytes is None else max_hot_bytes
+    archive_after = BLOB_ARCHIVE_AFTER_SECONDS if archive_after is None else archive_after
+    now = time.time() if now is None else now
+
+    blobs = []
+    for path in BLOB_DIR.glob("??/*"):
+        if path.is_file() and not path.name.startswith("."):
+            stat = path.stat()
+            blobs.append((stat.st_mtime, stat.st_size, path))
+    blobs.sort()
+    hot_bytes = sum(size for _, size, _ in blobs)
+
+    archived = []
+    for mtime, size, path in blobs:
+        if hot_bytes <= max_hot_bytes and now - mtime < archive_after:
+            break
+        key = blob_key(path)
+        archive.put_file(key, path)
+        path.unlink()
+        hot_bytes -= size
+        archived.append(key)
+    return archived
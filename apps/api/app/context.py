@@ -0,0 +1,140 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .vector_index import Chunk
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+SEPARATOR = "\n\n"
+# Chat format framing, as OpenAI counts it: role markers per message, plus the reply's start
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception:
+        # tiktoken missing (or its BPE file unavailable offline): use the regex estimate.
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+
+def count_message_tokens(messages: list[dict]) -> int:
+    """Prompt size of a chat request: content plus the chat format's per-message overhead."""
+    return sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(m["content"]) for m in messages) + REPLY_PRIMING_TOKENS
+
+
+@dataclass
+class Candidate:
+    """One piece of context in priority order; `fallback` is used when `text` does not fit."""
+
+    text: str
+    fallback: str | None = None
+    note_id: int | None = None
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    tokens: int
+    used: int
+    summarized: int
+    dropped: int
+
+
+def merge_chunks(chunks: list[Chunk]) -> list[Chunk]:
+    """Collapse overlapping/adjacent chunks of the same note into one span.
+
+    The merged chunk keeps the best score of its parts and the result stays
+    ordered by that score, so retrieval ranking survives the merge.
+    """
+    by_note: dict[int, list[Chunk]] = {}
+    for chunk in chunks:
+        by_note.setdefault(chunk.note_id, []).append(chunk)
+
+    merged: list[Chunk] = []
+    for note_chunks in by_note.values():
+        note_chunks.sort(key=lambda c: c.start)
+        current = note_chunks[0]
+        for chunk in note_chunks[1:]:
+            if chunk.start <= current.end:
+                if chunk.end > current.end:
+                    tail = chunk.text[current.end - chunk.start:]
+                    current = Chunk(
+                        note_id=current.note_id,
+                        start=current.start,
+                        end=chunk.end,
+                        text=current.text + tail,
+                        score=max(current.score, chunk.score),
+                    )
+                else:
+                    current.score = max(current.score, chunk.score)
+            else:
+                merged.append(current)
+                current = chunk
+        merged.append(current)
+
+    merged.sort(key=lambda c: c.score, reverse=True)
+    return merged
+
+
+def candidates_from_chunks(chunks: list[Chunk], summaries: dict[int, str | None]) -> list[Candidate]:
+    return [
+        Candidate(text=chunk.text, fallback=summaries.get(chunk.note_id), note_id=chunk.note_id)
+        for chunk in merge_chunks(chunks)
+    ]
+
+
+def assemble_context(candidates: list[Candidate], budget: int = CONTEXT_TOKEN_BUDGET) -> AssembledContext:
+    """Greedily pack candidates into `budget` tokens, highest priority first.
+
+    Exact duplicates (after whitespace normalisation) are skipped, and a
+    note's summary is only included once even if several of its chunks
+    fall back to it.
+    """
+    parts: list[str] = []
+    seen: set[str] = set()
+    separator_tokens = count_tokens(SEPARATOR)
+    tokens = used = summarized = dropped = 0
+
+    for candidate in candidates:
+        for text, is_fallback in ((candidate.text, False), (candidate.fallback, True)):
+            if not text:
+                continue
+            key = " ".join(text.split()).lower()
+            if key in seen:
+                if is_fallback:
+                    dropped += 1
+                break
+            cost = count_tokens(text) + (separator_tokens if parts else 0)
+            if tokens + cost <= budget:
+                parts.append(text)
+                seen.add(key)
+                tokens += cost
+                used += 1
+                summarized += is_fallback
+                break
+        else:
+            dropped += 1
+
+    return AssembledContext(
+        text=SEPARATOR.join(parts),
+        tokens=tokens,
+        used=used,
+        summarized=summarized,
+        dropped=dropped,
+    )
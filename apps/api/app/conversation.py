@@ -0,0 +1,110 @@
+import logging
+import os
+from dataclasses import dataclass, field
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import ai_service, crud, models
+from .context import count_tokens
+from .logs import log_event
+
+# /chat remembers each user's conversation. The newest turns go back to the
+# model verbatim; older ones are folded into a single rolling summary. Both
+# parts are capped, so the prompt stays bounded however long the conversation.
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1500"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+# At most this many turns go into one summarization call, oldest first
+CHAT_FOLD_BATCH = 20
+
+
+@dataclass
+class History:
+    summary: str | None = None
+    turns: list[models.ConversationTurn] = field(default_factory=list)  # oldest first
+
+
+def _turn_tokens(turn: models.ConversationTurn) -> int:
+    return count_tokens(turn.question) + count_tokens(turn.answer)
+
+
+def recent_turns(newest_first: list[models.ConversationTurn]) -> list[models.ConversationTurn]:
+    """The newest turns within CHAT_HISTORY_TURNS and CHAT_HISTORY_TOKENS, oldest first."""
+    kept: list[models.ConversationTurn] = []
+    tokens = 0
+    for turn in newest_first[:CHAT_HISTORY_TURNS]:
+        tokens += _turn_tokens(turn)
+        if tokens > CHAT_HISTORY_TOKENS:
+            break
+        kept.append(turn)
+    return kept[::-1]
+
+
+async def load_history(db: AsyncSession, user_id: int) -> History:
+    summary = await crud.get_conversation_summary_async(db, user_id)
+    after_id = summary.through_turn_id if summary else 0
+    turns = await crud.get_conversation_turns_async(db, user_id, after_id=after_id, limit=CHAT_HISTORY_TURNS)
+    return History(summary=summary.summary if summary else None, turns=recent_turns(turns))
+
+
+def to_messages(history: History) -> list[dict]:
+    """History as chat messages, to go between the system prompt and the new question."""
+    messages = []
+    if history.summary:
+        messages.append({"role": "system", "content": f"Summary of the conversation so far:\n{history.summary}"})
+    for turn in history.turns:
+        messages.append({"role": "user", "content": turn.question})
+        messages.append({"role": "assistant", "content": turn.answer})
+    return messages
+
+
+async def record_turn(
+    db: AsyncSession,
+    user_id: int,
+    question: str,
+    answer: str,
+    prompt_tokens: int,
+) -> models.ConversationTurn | None:
+    if answer.startswith(ai_service.ANSWER_ERROR_PREFIX):
+        return None  # an error message would only mislead the turns after it
+    return await crud.add_conversation_turn_async(db, user_id, question, answer, prompt_tokens)
+
+
+async def fold_history(session_factory: async_sessionmaker, user_id: int) -> bool:
+    """Fold turns that have left the verbatim window into the rolling summary.
+
+    Runs after each answer, in the background. If two folds race, the
+    second one's summary is discarded rather than overwriting the first.
+    """
+    try:
+        async with session_factory() as db:
+            summary = await crud.get_conversation_summary_async(db, user_id)
+            previous = summary.through_turn_id if summary else None
+            newest = await crud.get_conversation_turns_async(
+                db, user_id, after_id=previous or 0, limit=CHAT_HISTORY_TURNS
+            )
+            kept = recent_turns(newest)
+            # Only the next batch is loaded, however far behind the summary has fallen
+            to_fold = await crud.get_conversation_turns_async(
+                db, user_id, after_id=previous or 0, before_id=kept[0].id if kept else None,
+                limit=CHAT_FOLD_BATCH, oldest_first=True,
+            )
+        if not to_fold:
+            return False
+
+        new_summary = await ai_service.summarize_conversation_async(
+            summary.summary if summary else None,
+            [(turn.question, turn.answer) for turn in to_fold],
+            max_tokens=CHAT_SUMMARY_TOKENS,
+        )
+        if new_summary is None:
+            return False  # turns stay unfolded; the next answer tries again
+        async with session_factory() as db:
+            saved = await crud.save_conversation_summary_async(
+                db, user_id, new_summary, through_turn_id=to_fold[-1].id, previous_through=previous
+            )
+        log_event("conversation_folded", user_id=user_id, turns=len(to_fold), saved=saved)
+        return saved
+    except Exception as e:
+        log_event("conversation_fold_failed", logging.ERROR, user_id=user_id, error=str(e))
+        return False
@@ -1,6 +1,17 @@
+import json
+import uuid
 from datetime import datetime
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy import Row, Select, and_, column, delete, func, literal_column, or_, select, table, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, undefer
+from . import models, schemas, search_index
+
+_notes_fts = table(search_index.FTS_TABLE, column("rowid"))
+
+# Search previews are cut by SQLite from the FTS index around the best match
+PREVIEW_TOKENS = 12
+PREVIEW_CHARS = 80  # leading excerpt, where there is no FTS index
 
 
 def create_note(db: Session, note_in: schemas.NoteCreate) -> models.Note:
@@ -15,15 +26,127 @@ def create_note(db: Session, note_in: schemas.NoteCreate) -> models.Note:
     db.refresh(db_note)
     return db_note
 
-def search_notes(db: Session, user_id: int, limit: int = 3)-> list[models.Note]:
-    return db.query(models.Note)\
-        .filter(models.Note.user_id == user_id)\
-        .order_by(models.Note.created_at.desc())\
-        .limit(limit)\
-        .all()
+def create_job_notes(
+    db: Session,
+    job_id: str,
+    notes_in: dict[int, schemas.NoteCreate],
+    tasks_in: dict[int, list[schemas.TaskCreate]],
+) -> dict[int, int]:
+    """Insert a job's notes and their tasks, keyed by file index, and put each note's id on its job file.
+
+    All in one transaction: one commit (one WAL sync) instead of one per
+    note, and a job re-run after a crash finds which files already have
+    their note instead of creating it twice.
+    """
+    db_notes = {
+        index: models.Note(
+            user_id=note_in.user_id,
+            attachment_path=note_in.attachment_path,
+            full_text=note_in.full_text,
+            summary=note_in.summary,
+        )
+        for index, note_in in notes_in.items()
+    }
+    db.add_all(db_notes.values())
+    db.flush()
+    for index, db_note in db_notes.items():
+        db.add_all(
+            models.Task(user_id=task_in.user_id, title=task_in.title, due_at=task_in.due_at, note_id=db_note.id)
+            for task_in in tasks_in.get(index, [])
+        )
+    job = get_job(db, job_id)
+    if job:
+        files = json.loads(job.files)
+        for index, db_note in db_notes.items():
+            files[index]["note_id"] = db_note.id
+        job.files = json.dumps(files)
+    db.commit()
+    return {index: db_note.id for index, db_note in db_notes.items()}
+
+def _search_query(
+    bind,
+    columns: tuple,
+    user_id: int,
+    search_term: str,
+    limit: int,
+    offset: int,
+    match_all: bool,
+) -> Select | None:
+    if not search_index.is_supported(bind):
+        # The user's text is matched literally: % and _ in it are not wildcards
+        escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        return select(*columns)\
+            .where(models.Note.user_id == user_id)\
+            .where(or_(
+                models.Note.full_text.ilike(pattern, escape="\\"),
+                models.Note.summary.ilike(pattern, escape="\\"),
+            ))\
+            .order_by(models.Note.created_at.desc())\
+            .offset(offset)\
+            .limit(limit)
 
-def get_note(db: Session, note_id: int) -> models.Note | None:
-    return db.query(models.Note).filter(models.Note.id == note_id).first()
+    match = search_index.build_match_query(search_term, match_all=match_all)
+    if match is None:
+        return None
+    # Summary hits weigh more than body hits: the summary is the note's gist.
+    return select(*columns)\
+        .join(_notes_fts, _notes_fts.c.rowid == models.Note.id)\
+        .where(text(f"{search_index.FTS_TABLE} MATCH :match").bindparams(match=match))\
+        .where(models.Note.user_id == user_id)\
+        .order_by(text(f"bm25({search_index.FTS_TABLE}, 1.0, 2.0)"))\
+        .offset(offset)\
+        .limit(limit)
+
+def search_notes(
+    db: Session,
+    user_id: int,
+    search_term: str,
+    limit: int = 10,
+    offset: int = 0,
+    match_all: bool = True,
+) -> list[models.Note]:
+    """BM25-ranked full-text search over a user's notes (best match first)."""
+    query = _search_query(db.get_bind(), (models.Note,), user_id, search_term, limit, offset, match_all)
+    if query is None:
+        return []
+    return list(db.scalars(query).all())
+
+def search_note_previews(
+    db: Session,
+    user_id: int,
+    search_term: str,
+    limit: int = 10,
+    offset: int = 0,
+) -> list[Row]:
+    """Same ranking as search_notes, as (id, attachment_path, created_at, preview) rows.
+
+    The preview is computed in SQL, so no note body is ever sent to Python.
+    """
+    bind = db.get_bind()
+    if search_index.is_supported(bind):
+        preview = literal_column(
+            f"snippet({search_index.FTS_TABLE}, -1, '', '', '...', {PREVIEW_TOKENS})"
+        )
+    else:
+        preview = func.substr(models.Note.full_text, 1, PREVIEW_CHARS)
+    columns = (models.Note.id, models.Note.attachment_path, models.Note.created_at, preview.label("preview"))
+    query = _search_query(bind, columns, user_id, search_term, limit, offset, match_all=True)
+    if query is None:
+        return []
+    return list(db.execute(query).all())
+
+def get_note(db: Session, note_id: int, with_text: bool = False) -> models.Note | None:
+    q = db.query(models.Note).filter(models.Note.id == note_id)
+    if with_text:
+        q = q.options(undefer(models.Note.full_text))
+    return q.first()
+
+def get_note_summaries(db: Session, note_ids: list[int]) -> dict[int, str | None]:
+    rows = db.query(models.Note.id, models.Note.summary)\
+        .filter(models.Note.id.in_(note_ids))\
+        .all()
+    return {note_id: summary for note_id, summary in rows}
 
 def create_task(db: Session, task_in: schemas.TaskCreate) -> models.Task:
     db_task = models.Task(
@@ -38,15 +161,60 @@ def create_task(db: Session, task_in: schemas.TaskCreate) -> models.Task:
     return db_task
 
 
+def create_tasks_bulk(db: Session, tasks_in: list[schemas.TaskCreate]) -> list[models.Task]:
+    db_tasks = [
+        models.Task(
+            user_id=task_in.user_id,
+            title=task_in.title,
+            due_at=task_in.due_at,
+            note_id=task_in.note_id,
+        )
+        for task_in in tasks_in
+    ]
+    db.add_all(db_tasks)
+    db.commit()
+    for db_task in db_tasks:
+        db.refresh(db_task)
+    return db_tasks
+
+
+def task_page_key(task: models.Task) -> tuple:
+    """Sort key of a task in list_tasks order; the keyset cursor for the page after it."""
+    return (task.due_at, task.id)
+
+
 def list_tasks(
     db: Session,
     user_id: int,
     status: str | None = None,
+    limit: int | None = None,
+    after: tuple | None = None,
 ) -> list[models.Task]:
-    q = db.query(models.Task).filter(models.Task.user_id == user_id)
-    if status:
-        q = q.filter(models.Task.status == status)
-    return q.order_by(models.Task.due_at.is_(None), models.Task.due_at).all()
+    """Tasks by due date (undated last), continuing after the `task_page_key` in `after`.
+
+    Dated and undated tasks are read by two queries, each in plain index
+    order (ix_tasks_user_status_due, or ix_tasks_user_due without a status),
+    so a page never sorts the user's whole task list.
+    """
+    def tasks_query():
+        q = db.query(models.Task).filter(models.Task.user_id == user_id)
+        return q.filter(models.Task.status == status) if status else q
+
+    tasks: list[models.Task] = []
+    if after is None or after[0] is not None:
+        q = tasks_query().filter(models.Task.due_at.isnot(None))
+        if after is not None:
+            q = q.filter(tuple_(models.Task.due_at, models.Task.id) > tuple_(*after))
+        q = q.order_by(models.Task.due_at, models.Task.id)
+        tasks = (q.limit(limit) if limit is not None else q).all()
+        if limit is not None and len(tasks) == limit:
+            return tasks
+
+    q = tasks_query().filter(models.Task.due_at.is_(None))
+    if after is not None and after[0] is None:
+        q = q.filter(models.Task.id > after[1])
+    q = q.order_by(models.Task.id)
+    return tasks + (q.limit(limit - len(tasks)) if limit is not None else q).all()
 
 
 def complete_task(db: Session, task_id: int) -> models.Task | None:
@@ -72,4 +240,242 @@ def get_user_notes(db: Session, user_id: int, limit: int = 3):
         .filter(models.Note.user_id == user_id)\
         .order_by(models.Note.created_at.desc())\
         .limit(limit)\
-        .all()
\ No newline at end of file
+        .all()
+
+def note_page_key(note: models.Note) -> tuple:
+    return (note.created_at, note.id)
+
+def list_notes(
+    db: Session,
+    user_id: int,
+    limit: int,
+    after: tuple | None = None,
+) -> list[models.Note]:
+    """A user's notes newest first, continuing after the `note_page_key` in `after`."""
+    q = db.query(models.Note).filter(models.Note.user_id == user_id)
+    if after is not None:
+        created_at, note_id = after
+        q = q.filter(or_(
+            models.Note.created_at < created_at,
+            and_(models.Note.created_at == created_at, models.Note.id < note_id),
+        ))
+    return q.order_by(models.Note.created_at.desc(), models.Note.id.desc())\
+        .limit(limit)\
+        .all()
+
+def _new_job(user_id: int, files: list[schemas.JobFile]) -> models.IngestJob:
+    return models.IngestJob(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        status="queued",
+        total_files=len(files),
+        processed_files=0,
+        files=json.dumps([f.model_dump() for f in files]),
+    )
+
+
+def create_job(db: Session, user_id: int, files: list[schemas.JobFile]) -> models.IngestJob:
+    job = _new_job(user_id, files)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> models.IngestJob | None:
+    return db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+
+
+def set_job_status(db: Session, job_id: str, status: str, error: str | None = None) -> None:
+    db.query(models.IngestJob)\
+        .filter(models.IngestJob.id == job_id)\
+        .update({"status": status, "error": error, "updated_at": datetime.utcnow()})
+    db.commit()
+
+
+def touch_job(db: Session, job_id: str) -> None:
+    """Heartbeat of a running job: a job whose updated_at goes stale has lost its worker."""
+    db.query(models.IngestJob)\
+        .filter(models.IngestJob.id == job_id)\
+        .update({"updated_at": datetime.utcnow()})
+    db.commit()
+
+
+def claim_stale_jobs(db: Session, stale_before: datetime, limit: int = 100) -> list[str]:
+    """Take over unfinished jobs untouched since `stale_before`, requeued.
+
+    Each claim is an UPDATE conditioned on the updated_at that was read, so
+    when several API processes recover at once every job goes to one of them.
+    """
+    unfinished = models.IngestJob.status.in_(("queued", "running"))
+    stale = db.query(models.IngestJob.id, models.IngestJob.updated_at)\
+        .filter(unfinished, models.IngestJob.updated_at < stale_before)\
+        .order_by(models.IngestJob.updated_at)\
+        .limit(limit)\
+        .all()
+    claimed = []
+    for job_id, seen in stale:
+        result = db.execute(
+            update(models.IngestJob)
+            .where(models.IngestJob.id == job_id, unfinished, models.IngestJob.updated_at == seen)
+            .values(status="queued", updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+    db.commit()
+    return claimed
+
+
+def record_job_file(db: Session, job_id: str, index: int, file_result: schemas.JobFile) -> None:
+    """Store the outcome of one file of a job and bump its progress counter."""
+    job = get_job(db, job_id)
+    if not job:
+        return
+    files = json.loads(job.files)
+    files[index] = file_result.model_dump()
+    job.files = json.dumps(files)
+    job.processed_files = sum(1 for f in files if f["status"] in ("done", "failed"))
+    db.commit()
+
+
+def get_cached_extraction(db: Session, key: str) -> models.ExtractionCache | None:
+    return db.query(models.ExtractionCache).filter(models.ExtractionCache.key == key).first()
+
+
+def save_cached_extraction(
+    db: Session,
+    key: str,
+    sha256: str,
+    full_text: str,
+    summary: str | None,
+) -> None:
+    db.merge(models.ExtractionCache(key=key, sha256=sha256, full_text=full_text, summary=summary))
+    db.commit()
+
+
+# Async variants for the `async def` endpoints, so a slow query awaits instead of blocking the event loop.
+
+async def search_notes_async(
+    db: AsyncSession,
+    user_id: int,
+    search_term: str,
+    limit: int = 10,
+    offset: int = 0,
+    match_all: bool = True,
+    with_text: bool = False,
+) -> list[models.Note]:
+    # Async sessions can't lazy-load, so callers that read full_text must ask for it up front
+    query = _search_query(db.get_bind(), (models.Note,), user_id, search_term, limit, offset, match_all)
+    if query is None:
+        return []
+    if with_text:
+        query = query.options(undefer(models.Note.full_text))
+    return list((await db.scalars(query)).all())
+
+
+async def get_note_summaries_async(db: AsyncSession, note_ids: list[int]) -> dict[int, str | None]:
+    rows = await db.execute(
+        select(models.Note.id, models.Note.summary).where(models.Note.id.in_(note_ids))
+    )
+    return {note_id: summary for note_id, summary in rows}
+
+
+async def get_user_notes_async(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 3,
+    with_text: bool = False,
+) -> list[models.Note]:
+    query = select(models.Note)\
+        .where(models.Note.user_id == user_id)\
+        .order_by(models.Note.created_at.desc())\
+        .limit(limit)
+    if with_text:
+        query = query.options(undefer(models.Note.full_text))
+    return list((await db.scalars(query)).all())
+
+
+async def delete_user_notes_async(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(delete(models.Note).where(models.Note.user_id == user_id))
+    await db.commit()
+    return result.rowcount
+
+
+async def create_job_async(db: AsyncSession, user_id: int, files: list[schemas.JobFile]) -> models.IngestJob:
+    job = _new_job(user_id, files)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def get_conversation_summary_async(db: AsyncSession, user_id: int) -> models.ConversationSummary | None:
+    return await db.get(models.ConversationSummary, user_id)
+
+
+async def get_conversation_turns_async(
+    db: AsyncSession,
+    user_id: int,
+    after_id: int = 0,
+    limit: int | None = None,
+    before_id: int | None = None,
+    oldest_first: bool = False,
+) -> list[models.ConversationTurn]:
+    """The user's turns after `after_id` (and before `before_id`), newest first unless `oldest_first`."""
+    query = select(models.ConversationTurn)\
+        .where(models.ConversationTurn.user_id == user_id, models.ConversationTurn.id > after_id)\
+        .order_by(models.ConversationTurn.id if oldest_first else models.ConversationTurn.id.desc())\
+        .limit(limit)
+    if before_id is not None:
+        query = query.where(models.ConversationTurn.id < before_id)
+    return list((await db.scalars(query)).all())
+
+
+async def add_conversation_turn_async(
+    db: AsyncSession,
+    user_id: int,
+    question: str,
+    answer: str,
+    prompt_tokens: int,
+) -> models.ConversationTurn:
+    turn = models.ConversationTurn(
+        user_id=user_id, question=question, answer=answer, prompt_tokens=prompt_tokens
+    )
+    db.add(turn)
+    await db.commit()
+    return turn
+
+
+async def save_conversation_summary_async(
+    db: AsyncSession,
+    user_id: int,
+    summary: str,
+    through_turn_id: int,
+    previous_through: int | None,
+) -> bool:
+    """Store a new rolling summary, unless another fold got there first (False then)."""
+    if previous_through is None:
+        db.add(models.ConversationSummary(user_id=user_id, summary=summary, through_turn_id=through_turn_id))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+        return True
+    result = await db.execute(
+        update(models.ConversationSummary)
+        .where(
+            models.ConversationSummary.user_id == user_id,
+            models.ConversationSummary.through_turn_id == previous_through,
+        )
+        .values(summary=summary, through_turn_id=through_turn_id, updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def delete_conversation_async(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(delete(models.ConversationTurn).where(models.ConversationTurn.user_id == user_id))
+    await db.execute(delete(models.ConversationSummary).where(models.ConversationSummary.user_id == user_id))
+    await db.commit()
+    return result.rowcount
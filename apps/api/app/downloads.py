@@ -0,0 +1,101 @@
+import mimetypes
+import re
+from pathlib import Path
+from typing import Callable, Iterator, Mapping
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+from . import blob_store, storage
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def etag_for(path: Path, size: int, mtime_ns: int | None = None) -> str:
+    """Blobs are named by their sha256, a strong validator; other files get a weak one from their stat."""
+    stem = path.name.split(".", 1)[0]
+    if _SHA256_RE.match(stem):
+        return f'"{stem}"'
+    if mtime_ns is None:
+        mtime_ns = path.stat().st_mtime_ns
+    return f'W/"{mtime_ns:x}-{size:x}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Single byte range as inclusive (start, end); None means send the whole file.
+
+    Multi-range requests are answered with the whole file, which RFC 9110 allows.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def blob_response(path: Path, request_headers: Mapping[str, str]) -> Response:
+    """Serve an attachment from the hot directory or, once archived, from the archive tier.
+
+    Supports conditional requests (ETag / If-None-Match -> 304) and single Range requests (206).
+    """
+    read: Callable[[int, int], Iterator[bytes]]
+    if path.exists():
+        # Stat before touching: the touch moves the mtime a weak ETag is built from
+        stat = path.stat()
+        size = stat.st_size
+        etag = etag_for(path, size, stat.st_mtime_ns)
+        local = storage.LocalBackend(path.parent)
+        read = lambda start, end: local.read(path.name, start, end)  # noqa: E731
+        blob_store.touch(path)
+    else:
+        try:
+            key = blob_store.blob_key(path)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="File missing from disk") from None
+        archive = storage.get_storage()
+        obj = archive.stat(key)
+        if obj is None:
+            raise HTTPException(status_code=404, detail="File missing from disk")
+        size = obj.size
+        etag = etag_for(path, size)
+        read = lambda start, end: archive.read(obj, start, end)  # noqa: E731
+
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, no-cache"}
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    byte_range = parse_range(request_headers.get("range"), size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read(0, size - 1), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read(start, end), status_code=206, media_type=media_type, headers=headers)
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import re
+from typing import Protocol
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(Protocol):
+    """Anything that maps texts to an (n, dim) float32 matrix of unit vectors."""
+
+    name: str
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray: ...
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Deterministic, offline embedder: signed feature hashing of words and bigrams.
+
+    No model download and no network, so it is what tests and local runs use.
+    Retrieval quality is lexical, not semantic.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> list[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                matrix[row, (value >> 1) % self.dim] += sign
+        return _normalize(matrix)
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        from .ai_service import get_client
+
+        response = get_client().embeddings.create(model=self.model, input=texts)
+        matrix = np.array([item.embedding for item in response.data], dtype=np.float32)
+        return _normalize(matrix)
+
+
+def get_embedder() -> Embedder:
+    """Pick the embedder from EMBEDDING_BACKEND ("hashing" by default, or "openai")."""
+    backend = os.getenv("EMBEDDING_BACKEND", "hashing").lower()
+    if backend == "openai":
+        return OpenAIEmbedder(model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"))
+    if backend == "hashing":
+        return HashingEmbedder(dim=int(os.getenv("EMBEDDING_DIM", "512")))
+    raise ValueError(f"Unknown embedding backend: {backend}")
@@ -1,10 +1,355 @@
+import codecs
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from html.parser import HTMLParser
 from pathlib import Path
-import pymupdf
-from PIL import Image
-import pytesseract
-import docx
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from .logs import log_event
+
+# Extractor backends (pymupdf, PIL + pytesseract, python-docx) are imported
+# inside the functions that need them: each loads on the first file of its
+# type, instead of every API worker paying for all of them at startup.
+if TYPE_CHECKING:
+    import pymupdf
+    from PIL import Image
+
+# Bump when extraction output changes, so cached results keyed on it are not reused.
+# 3: ingest joins PDF pages with blank lines, section by section
+EXTRACTOR_VERSION = "3"
+
+# Shared process pool for CPU-bound extraction (whole files and individual PDF pages).
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+# PDFs with at least this many pages are split across the pool page by page.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "60"))
+# Pages with less extractable text than this are treated as scans and OCR'd.
+OCR_MIN_PAGE_CHARS = 20
+OCR_DPI = 300
+
+# Text-like formats are yielded in sections of about this many characters, cut at paragraph breaks.
+SECTION_CHARS = int(os.getenv("EXTRACT_SECTION_CHARS", "4000"))
+# Text files at least this big are memory-mapped rather than read into memory.
+MMAP_MIN_BYTES = 1024 * 1024
+TEXT_BLOCK_BYTES = 256 * 1024
+SNIFF_BYTES = 8192
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+_pool: Executor | None = None
+_worker_doc: "tuple[str, pymupdf.Document] | None" = None
+
+
+def get_pool() -> Executor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _kill_workers(pool: Executor) -> None:
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+
+
+def retire_pool(pool: Executor) -> Executor:
+    """Replace a pool that has a hung worker; returns the pool to use from now on.
+
+    A running task can't be cancelled, and the pool won't say which process
+    runs it. So new work goes to a fresh pool, and the old one is shut down.
+    Its processes are killed once the tasks already running there have had
+    PDF_PAGE_TIMEOUT to finish.
+    """
+    global _pool
+    if _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False)
+        reaper = threading.Timer(PDF_PAGE_TIMEOUT, _kill_workers, args=(pool,))
+        reaper.daemon = True
+        reaper.start()
+    return get_pool()
+
+
+# --- type detection ---------------------------------------------------------
+
+_MAGIC: list[tuple[bytes, str]] = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"OggS", "audio/ogg"),
+    (b"ID3", "audio/mpeg"),
+    (b"fLaC", "audio/flac"),
+    (b"\x1aE\xdf\xa3", "audio/webm"),
+]
+
+_EXTENSIONS = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+    ".docx": DOCX_MIME,
+    ".txt": "text/plain",
+    ".text": "text/plain",
+    ".log": "text/plain",
+    ".md": "text/markdown",
+    ".markdown": "text/markdown",
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".ogg": "audio/ogg",
+    ".oga": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".webm": "audio/webm",
+}
+
+
+def _sniff_magic(path: Path, head: bytes) -> str | None:
+    for signature, mime in _MAGIC:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] in (b"WEBP", b"WAVE"):
+        return "image/webp" if head[8:12] == b"WEBP" else "audio/wav"
+    if head[4:8] == b"ftyp" and head[8:11] == b"M4A":
+        return "audio/mp4"
+    if head[:2] in (b"\xff\xfb", b"\xff\xfa", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"  # MP3 frame sync, no ID3 tag
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                return DOCX_MIME if "word/document.xml" in archive.namelist() else "application/zip"
+        except zipfile.BadZipFile:
+            return None
+    if head.lstrip()[:14].lower().startswith((b"<!doctype html", b"<html")):
+        return "text/html"
+    return None
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still text
+        return e.start >= len(head) - 3
+    return True
+
+
+def detect_mime(path: Path) -> str | None:
+    """MIME type from the file's leading bytes, then its extension, then a plain-text sniff."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        head = b""
+    mime = _sniff_magic(path, head) or _EXTENSIONS.get(path.suffix.lower())
+    if mime is None and head and _looks_like_text(head):
+        mime = "text/plain"
+    return mime
+
+
+def is_audio(mime: str | None) -> bool:
+    """Audio has no extractor here: ingest sends it to transcription instead."""
+    return bool(mime) and mime.startswith("audio/")
+
+
+# --- text, markdown, html -----------------------------------------------------
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n")
+_MD_HEADING = re.compile(r"#{1,6}\s")
+
+
+def _iter_text_blocks(path: Path) -> Iterator[str]:
+    """Decoded UTF-8 blocks of at most TEXT_BLOCK_BYTES, cut after a line break where there is one.
+
+    Large files are memory-mapped, so only the block being decoded is paged in.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= MMAP_MIN_BYTES else f.read()
+        try:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            start = 0
+            while start < size:
+                end = min(start + TEXT_BLOCK_BYTES, size)
+                if end < size:
+                    cut = data.rfind(b"\n", start, end)
+                    if cut > start:
+                        end = cut + 1
+                yield decoder.decode(data[start:end], final=end >= size)
+                start = end
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+def _bounded(text: str) -> Iterator[str]:
+    """Cut text longer than SECTION_CHARS at line breaks (or anywhere, if it has none)."""
+    while len(text) > SECTION_CHARS:
+        cut = text.rfind("\n", 0, SECTION_CHARS) + 1 or SECTION_CHARS
+        yield text[:cut]
+        text = text[cut:]
+    yield text
+
+
+def _iter_paragraphs(blocks: Iterable[str]) -> Iterator[str]:
+    """Blank-line separated paragraphs; ones that straddle two blocks are stitched back together."""
+    pending = ""
+    for block in blocks:
+        *paragraphs, pending = _PARAGRAPH_BREAK.split(pending + block)
+        yield from paragraphs
+        if len(pending) > SECTION_CHARS:
+            # No blank line in a while (logs, minified text): don't let it grow unbounded
+            *done, pending = _bounded(pending)
+            yield from done
+    yield pending
+
+
+def _group_sections(paragraphs: Iterable[tuple[str, bool]]) -> Iterator[str]:
+    """Join (paragraph, starts_section) pairs into sections of up to about SECTION_CHARS."""
+    section: list[str] = []
+    size = 0
+    for paragraph, starts_section in paragraphs:
+        for piece in _bounded(paragraph.strip()):
+            piece = piece.strip()
+            if not piece:
+                continue
+            if section and (starts_section or size + len(piece) > SECTION_CHARS):
+                yield "\n\n".join(section)
+                section, size = [], 0
+            section.append(piece)
+            size += len(piece) + 2
+            starts_section = False
+    if section:
+        yield "\n\n".join(section)
+
+
+def iter_text_sections(path: Path) -> Iterator[str]:
+    yield from _group_sections((p, False) for p in _iter_paragraphs(_iter_text_blocks(path)))
+
+
+def iter_markdown_sections(path: Path) -> Iterator[str]:
+    """Like plain text, but every heading starts a new section."""
+    yield from _group_sections(
+        (p, bool(_MD_HEADING.match(p.lstrip()))) for p in _iter_paragraphs(_iter_text_blocks(path))
+    )
+
+
+class _HTMLText(HTMLParser):
+    """Visible text as paragraphs: block-level tags end one, headings start a new section."""
+
+    BLOCK_TAGS = {
+        "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+        "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol",
+        "p", "pre", "section", "table", "td", "th", "title", "tr", "ul",
+    }
+    HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: list[tuple[str, bool]] = []
+        self._text: list[str] = []
+        self._heading = False
+        self._skip_depth = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._text).split())
+        if text:
+            self.paragraphs.append((text, self._heading))
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in self.HEADING_TAGS
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            self._heading = False
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def drain(self) -> list[tuple[str, bool]]:
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+
+def iter_html_sections(path: Path) -> Iterator[str]:
+    def paragraphs() -> Iterator[tuple[str, bool]]:
+        parser = _HTMLText()
+        for block in _iter_text_blocks(path):
+            parser.feed(block)
+            yield from parser.drain()
+        parser.close()
+        yield from parser.drain()
+
+    yield from _group_sections(paragraphs())
+
+
+# --- docx, images, pdf ------------------------------------------------------
+
+def _is_heading(paragraph) -> bool:
+    style = paragraph.style
+    return style is not None and (style.name or "").startswith("Heading")
+
+
+def iter_docx_sections(path: Path) -> Iterator[str]:
+    """Paragraphs grouped into sections, with a new one at every heading."""
+    import docx
+
+    try:
+        doc = docx.Document(path)
+    except Exception as e:
+        raise ValueError(f"Error reading .docx file: {e}") from e
+    yield from _group_sections((para.text, _is_heading(para)) for para in doc.paragraphs)
+
 
 def extract_text_from_docx(path: Path) -> str:
+    import docx
+
     try:
         doc = docx.Document(path)
         full_text = []
@@ -12,33 +357,167 @@ def extract_text_from_docx(path: Path) -> str:
             full_text.append(para.text)
         return "\n".join(full_text)
     except Exception as e:
-        raise ValueError(f"Error reading .docx file: {e}")
+        raise ValueError(f"Error reading .docx file: {e}") from e
+
+
+def _ocr_image(img: "Image.Image") -> str:
+    from . import ocr
+
+    return ocr.ocr_image(img)
+
+
+def _page_text(page: "pymupdf.Page") -> str:
+    text = page.get_text("text")
+    if len(text.strip()) < OCR_MIN_PAGE_CHARS and page.get_images():
+        import pymupdf
+        from PIL import Image
+
+        pix = page.get_pixmap(dpi=OCR_DPI, colorspace=pymupdf.csGRAY)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        img.info["dpi"] = (OCR_DPI, OCR_DPI)
+        text = _ocr_image(img)
+    return text
+
+
+def _extract_pdf_page(path: str, page_number: int) -> str:
+    """Pool task: keeps the last opened document per worker so pages don't re-open it."""
+    global _worker_doc
+    import pymupdf
+
+    if _worker_doc is None or _worker_doc[0] != path:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+        _worker_doc = (path, pymupdf.open(path))
+    return _page_text(_worker_doc[1][page_number])
+
+
+def iter_pdf_pages(path: Path) -> Iterator[str]:
+    """Each page's text, whitespace collapsed, in page order as soon as it is ready.
+
+    Long PDFs fan out over the pool page by page; earlier pages are yielded
+    while later ones are still being extracted.
+    """
+    import pymupdf
+
+    with pymupdf.open(str(path)) as doc:
+        page_count = doc.page_count
+        if page_count < PDF_PARALLEL_MIN_PAGES or EXTRACT_WORKERS < 2:
+            for page in doc:
+                yield " ".join(_page_text(page).split())
+            return
+
+    pool = get_pool()
+    futures = [pool.submit(_extract_pdf_page, str(path), n) for n in range(page_count)]
+    try:
+        for n in range(page_count):
+            try:
+                text = futures[n].result(timeout=PDF_PAGE_TIMEOUT)
+            except TimeoutError:
+                log_event("pdf_page_timeout", logging.WARNING, file=path.name, page=n + 1, seconds=PDF_PAGE_TIMEOUT)
+                text = ""
+                # The hung worker would hold its slot forever: move to a fresh pool,
+                # taking along the pages still queued behind it
+                pool = retire_pool(pool)
+                for m in range(n + 1, page_count):
+                    if futures[m].cancel():
+                        futures[m] = pool.submit(_extract_pdf_page, str(path), m)
+            except BrokenProcessPool as e:
+                log_event("pdf_page_error", logging.WARNING, file=path.name, page=n + 1, error=str(e))
+                text = ""
+            yield " ".join(text.split())
+    finally:
+        # The consumer may stop early; don't leave the remaining pages queued
+        for future in futures:
+            future.cancel()
 
 
 def extract_text_from_pdf(path: Path) -> str:
-    doc = pymupdf.open(str(path))
-    text = ""
-    for page in doc:
-        text += page.get_text("text")
-    cleaned = " ".join(text.split())
-    return cleaned
+    # One join at the end instead of growing a string page by page
+    return " ".join(page for page in iter_pdf_pages(path) if page)
 
 def extract_text_from_image(path: Path) -> str:
-    img = Image.open(path)
-    gray_img = img.convert("L")
-    text = pytesseract.image_to_string(gray_img)
-    clean_text = text.replace("\x0c", "").strip()
-    return clean_text
+    from PIL import Image
 
-def extract_text_generic(path: Path) -> str:
-    ext = path.suffix.lower()
+    with Image.open(path) as img:
+        img.load()
+        # The original, not a grayscale copy: preprocessing needs its EXIF orientation and DPI
+        return _ocr_image(img)
+
+
+# --- registry -----------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Extractor:
+    name: str
+    mime_types: tuple[str, ...]
+    # Page or section chunks, yielded as they are extracted
+    sections: Callable[[Path], Iterator[str]]
+    # The whole text at once; defaults to the sections joined by blank lines
+    text: Callable[[Path], str] | None = None
+    # Read from a thread by ingest, which takes each section as it comes: cheap formats (text,
+    # markdown, HTML) and PDFs, which fan their pages out over the pool themselves. Otherwise
+    # extraction is CPU-bound (OCR, DOCX parsing) and the whole text comes back from a pool worker.
+    streams: bool = False
+
+
+EXTRACTORS: dict[str, Extractor] = {}
 
-    if ext in [".png", ".jpg", ".jpeg", ".webp"]:
-        return extract_text_from_image(path)
-    elif ext == ".pdf":
-        return extract_text_from_pdf(path)
-    elif ext == ".docx":
-        return extract_text_from_docx(path)
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
 
+def register(extractor: Extractor) -> Extractor:
+    for mime in extractor.mime_types:
+        EXTRACTORS[mime] = extractor
+    return extractor
+
+
+# The module-level functions are looked up at call time, so they can be replaced after registration
+register(Extractor(
+    "pdf", ("application/pdf",),
+    sections=lambda path: iter_pdf_pages(path),
+    text=lambda path: extract_text_from_pdf(path),
+    streams=True,
+))
+register(Extractor(
+    "image", ("image/png", "image/jpeg", "image/webp", "image/gif", "image/tiff"),
+    sections=lambda path: iter([extract_text_from_image(path)]),
+    text=lambda path: extract_text_from_image(path),
+))
+register(Extractor(
+    "docx", (DOCX_MIME,),
+    sections=lambda path: iter_docx_sections(path),
+    text=lambda path: extract_text_from_docx(path),
+))
+register(Extractor("text", ("text/plain",), sections=lambda path: iter_text_sections(path), streams=True))
+register(Extractor("markdown", ("text/markdown",), sections=lambda path: iter_markdown_sections(path), streams=True))
+register(Extractor("html", ("text/html",), sections=lambda path: iter_html_sections(path), streams=True))
+
+
+def extractor_for(mime: str | None) -> Extractor | None:
+    return EXTRACTORS.get(mime) if mime else None
+
+
+def get_extractor(path: Path) -> Extractor:
+    mime = detect_mime(path)
+    extractor = extractor_for(mime)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type: {mime or path.suffix.lower() or 'unknown'}")
+    return extractor
+
+
+def extractor_id(path: Path, mime: str | None = None) -> str:
+    """Identifies which extractor (and version) handles `path`, for cache keys."""
+    mime = mime or detect_mime(path)
+    extractor = extractor_for(mime)
+    name = extractor.name if extractor else (mime or path.suffix.lower().lstrip(".") or "none").replace("/", "-")
+    return f"{name}-v{EXTRACTOR_VERSION}"
+
+
+def iter_sections(path: Path) -> Iterator[str]:
+    """Stream a file's text as page / section chunks, so consumers can start before extraction ends."""
+    yield from get_extractor(path).sections(path)
+
+
+def extract_text_generic(path: Path) -> str:
+    extractor = get_extractor(path)
+    if extractor.text is not None:
+        return extractor.text(path)
+    return "\n\n".join(extractor.sections(path))
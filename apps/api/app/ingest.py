@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator
+
+from sqlalchemy.orm import sessionmaker
+
+from . import ai_service, crud, extraction, metrics, schemas, task_extraction, transcription, vector_index
+from .extraction import extract_text_generic, iter_sections
+from .logs import log_event
+
+# Running jobs bump updated_at this often; one untouched for JOB_STALE_SECONDS has lost its worker
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+
+
+def get_extract_pool() -> Executor:
+    # OCR / DOCX parsing is CPU-bound and holds the GIL, so it runs in worker processes.
+    return extraction.get_pool()
+
+
+def shutdown() -> None:
+    extraction.shutdown_pool()
+
+
+def _safe_extract(path: str) -> str:
+    try:
+        return extract_text_generic(Path(path))
+    except Exception:
+        return ""
+
+
+async def _safe_transcribe(path: Path) -> str:
+    try:
+        return await transcription.transcribe(path)
+    except Exception as e:
+        log_event("transcribe_error", logging.WARNING, file=path.name, error=str(e))
+        return ""
+
+
+async def _in_session(session_factory: sessionmaker, fn, *args, **kwargs):
+    """Run a sync crud call in a worker thread.
+
+    On the event loop, a write waiting out SQLite's busy timeout would also
+    block the async sessions holding the lock, and they could never commit.
+    """
+    def call():
+        with session_factory() as db:
+            return fn(db, *args, **kwargs)
+
+    return await asyncio.to_thread(call)
+
+
+class _Sections:
+    """A file's text as it arrives: each section is embedded right away, and the summary is
+    asked for as soon as there is enough text for it, while extraction carries on."""
+
+    def __init__(self, summarize: bool = True):
+        self.parts: list[str] = []
+        self.length = 0
+        # vector_index.Embedded per section
+        self.embedded: list[asyncio.Future] = []
+        self.summarizing: asyncio.Task | None = None
+        self._summarize = summarize
+
+    def add(self, section: str) -> None:
+        if not section.strip():
+            return
+        offset = self.length + 2 if self.parts else 0  # after the "\n\n" joining it to the previous one
+        self.parts.append(section)
+        self.length = offset + len(section)
+        self.embedded.append(asyncio.ensure_future(
+            asyncio.to_thread(vector_index.get_index().embed, section, offset)
+        ))
+        if self._summarize and self.summarizing is None and self.length >= ai_service.SUMMARY_INPUT_CHARS:
+            self.summarizing = asyncio.create_task(ai_service.summarize_text_async(self.text()))
+
+    def text(self) -> str:
+        return "\n\n".join(self.parts)
+
+    def discard(self) -> None:
+        for pending in (*self.embedded, self.summarizing):
+            if pending is not None:
+                pending.cancel()
+
+
+@dataclass
+class _Extracted:
+    text: str
+    summary: str | None
+    cache_key: str | None
+    sections: _Sections
+
+
+async def _stream_sections(path: Path) -> AsyncIterator[str]:
+    """The file's sections as the extractor yields them, from a worker thread."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def produce() -> None:
+        try:
+            for section in iter_sections(path):
+                loop.call_soon_threadsafe(queue.put_nowait, section)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    producer = loop.run_in_executor(None, produce)
+    while (section := await queue.get()) is not None:
+        yield section
+    await producer  # raises what the extractor raised
+
+
+async def _extract(pending: schemas.JobFile, session_factory: sessionmaker) -> _Extracted:
+    path = Path(pending.location)
+    mime = extraction.detect_mime(path)  # reads the first few KiB
+    cache_key = f"{pending.sha256}:{extraction.extractor_id(path, mime)}" if pending.sha256 else None
+    if cache_key:
+        cached = await _in_session(session_factory, crud.get_cached_extraction, cache_key)
+        if cached:
+            # Same bytes, same extractor: skip OCR/parsing and the LLM entirely
+            sections = _Sections(summarize=False)
+            sections.add(cached.full_text)
+            return _Extracted(text=cached.full_text, summary=cached.summary, cache_key=None, sections=sections)
+
+    sections = _Sections()
+    with metrics.timed("extract", path.suffix.lower()):
+        extractor = extraction.extractor_for(mime)
+        if extraction.is_audio(mime):
+            # Voice notes and recordings: network-bound, so awaited here rather than in the pool
+            sections.add(await _safe_transcribe(path))
+        elif extractor is not None and extractor.streams:
+            # Read from a thread (PDFs fan their pages out over the pool from there), section by section
+            try:
+                async for section in _stream_sections(path):
+                    sections.add(section)
+            except Exception as e:
+                log_event("extract_error", logging.WARNING, file=path.name, error=str(e))
+                sections.discard()
+                sections = _Sections()
+        else:
+            # OCR and DOCX parsing are CPU-bound and hold the GIL: the whole file goes to a pool worker
+            loop = asyncio.get_running_loop()
+            sections.add(await loop.run_in_executor(get_extract_pool(), _safe_extract, pending.location))
+    return _Extracted(text=sections.text(), summary=None, cache_key=cache_key, sections=sections)
+
+
+async def _persist(
+    job_id: str,
+    user_id: int,
+    index: int,
+    pending: schemas.JobFile,
+    extracted: _Extracted | BaseException,
+    note_id: int | None,
+    session_factory: sessionmaker,
+    progress_lock: asyncio.Lock,
+) -> bool:
+    result = pending.model_copy()
+    try:
+        if isinstance(extracted, BaseException):
+            raise extracted
+        text, summary = extracted.text, extracted.summary
+
+        # Only cache real results: an empty text may be a transient extraction failure, worth retrying
+        if extracted.cache_key and text.strip() and summary != ai_service.SUMMARY_UNAVAILABLE:
+            await _in_session(
+                session_factory, crud.save_cached_extraction, extracted.cache_key, pending.sha256, text, summary
+            )
+
+        try:
+            embedded = await asyncio.gather(*extracted.sections.embedded)
+            await asyncio.to_thread(vector_index.get_index().append, user_id, note_id, embedded)
+        except Exception as e:
+            log_event("indexing_error", logging.WARNING, job_id=job_id, note_id=note_id, error=str(e))
+
+        result.status = "done"
+        result.note_id = note_id
+        result.summary = summary
+        result.text_preview = text[:300] if text else ""
+    except Exception as e:
+        result.status = "failed"
+        result.error = str(e)
+
+    # record_job_file rewrites the job's file list: one writer at a time, or updates get lost
+    async with progress_lock:
+        await _in_session(session_factory, crud.record_job_file, job_id, index, result)
+    return result.status == "done"
+
+
+async def _resume(pending: schemas.JobFile, user_id: int, session_factory: sessionmaker) -> _Extracted:
+    """A file whose note and tasks an earlier, interrupted run already saved: only indexing is left."""
+    note = await _in_session(session_factory, crud.get_note, pending.note_id, with_text=True)
+    if note is None:
+        raise LookupError(f"Note {pending.note_id} was deleted before its file finished")
+    sections = _Sections(summarize=False)
+    if not await asyncio.to_thread(vector_index.get_index().has_note, user_id, note.id):
+        sections.add(note.full_text)
+    return _Extracted(text=note.full_text, summary=note.summary, cache_key=None, sections=sections)
+
+
+async def _heartbeat(job_id: str, session_factory: sessionmaker) -> None:
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            await _in_session(session_factory, crud.touch_job, job_id)
+        except Exception as e:
+            log_event("job_heartbeat_failed", logging.WARNING, job_id=job_id, error=str(e))
+
+
+async def run_job(job_id: str, session_factory: sessionmaker) -> None:
+    """Extraction -> summary and task extraction -> note persistence for every file of a job.
+
+    All files are extracted concurrently. Text, markdown, HTML and PDFs
+    arrive section by section: each section is embedded as soon as it is
+    read, and a long text's summary is asked for once its first
+    SUMMARY_INPUT_CHARS are in. The remaining texts that missed the cache
+    are summarized in one concurrent batch. Tasks found in the texts are
+    saved linked to their notes.
+    Files a previous run already finished are kept as they are; files whose
+    note it saved before it was cut short are only indexed, not redone.
+    """
+    def start(db):
+        job = crud.get_job(db, job_id)
+        if not job:
+            return None
+        crud.set_job_status(db, job_id, "running")
+        return job.user_id, schemas.JobOut.model_validate(job).files
+
+    started = await _in_session(session_factory, start)
+    if started is None:
+        return
+    user_id, files = started
+
+    # While the job runs its updated_at keeps moving; recover_jobs() takes over jobs where it stopped
+    heartbeat = asyncio.create_task(_heartbeat(job_id, session_factory))
+    try:
+        await _run_files(job_id, user_id, files, session_factory)
+    finally:
+        heartbeat.cancel()
+
+
+async def _run_files(job_id: str, user_id: int, files: list[schemas.JobFile], session_factory: sessionmaker) -> None:
+    finished = [f.status == "done" for f in files if f.status in ("done", "failed")]
+    todo_files = [(i, f) for i, f in enumerate(files) if f.status not in ("done", "failed")]
+    extracted: list[_Extracted | BaseException] = []
+    try:
+        # A file with a note_id got its note and tasks in an earlier run that was cut short
+        extracted = list(await asyncio.gather(*(
+            _resume(pending, user_id, session_factory) if pending.note_id else _extract(pending, session_factory)
+            for _, pending in todo_files
+        ), return_exceptions=True))
+        new = [k for k, (_, pending) in enumerate(todo_files) if not pending.note_id]
+
+        todo = [k for k in new if isinstance(extracted[k], _Extracted) and extracted[k].summary is None]
+        # Long texts had their summary started during extraction; the rest are summarized in one batch
+        started = [k for k in todo if extracted[k].sections.summarizing is not None]
+        batch = [k for k in todo if extracted[k].sections.summarizing is None]
+        # Task extraction sees every new text, cached or not: it is gated locally and its LLM calls cached anyway
+        batch_summaries, started_summaries, found_tasks = await asyncio.gather(
+            ai_service.summarize_many([extracted[k].text for k in batch]),
+            asyncio.gather(*(extracted[k].sections.summarizing for k in started), return_exceptions=True),
+            task_extraction.extract_tasks([
+                extracted[k].text if isinstance(extracted[k], _Extracted) else "" for k in new
+            ]),
+        )
+        for k, summary in zip(batch + started, [*batch_summaries, *started_summaries]):
+            if isinstance(summary, BaseException):
+                extracted[k].sections.discard()
+                extracted[k] = summary
+            else:
+                extracted[k].summary = summary
+
+        # Notes, their tasks and the note ids on the job's files go in with a single commit
+        ready = [k for k in new if isinstance(extracted[k], _Extracted)]
+        tasks: dict[int, list[schemas.TaskCreate]] = {}
+        for task in found_tasks:
+            k = new[task.index]
+            if k in ready:
+                tasks.setdefault(todo_files[k][0], []).append(
+                    schemas.TaskCreate(user_id=user_id, title=task.title, due_at=task.due_at)
+                )
+        note_ids = await _in_session(session_factory, crud.create_job_notes, job_id, {
+            todo_files[k][0]: schemas.NoteCreate(
+                user_id=user_id,
+                attachment_path=todo_files[k][1].location,
+                full_text=extracted[k].text,
+                summary=extracted[k].summary,
+            )
+            for k in ready
+        }, tasks)
+
+        progress_lock = asyncio.Lock()
+        outcomes = await asyncio.gather(*(
+            _persist(
+                job_id, user_id, i, pending, extracted[k], pending.note_id or note_ids.get(i),
+                session_factory, progress_lock,
+            )
+            for k, (i, pending) in enumerate(todo_files)
+        ))
+    except Exception as e:
+        for item in extracted:
+            if isinstance(item, _Extracted):
+                item.sections.discard()
+        await _in_session(session_factory, crud.set_job_status, job_id, "failed", error=str(e))
+        return
+
+    outcomes = finished + list(outcomes)
+    status = "done" if all(outcomes) else "failed"
+    error = None if status == "done" else f"{outcomes.count(False)} of {len(outcomes)} files failed"
+    await _in_session(session_factory, crud.set_job_status, job_id, status, error=error)
+
+
+async def recover_jobs(session_factory: sessionmaker) -> list[str]:
+    """Run again the jobs whose worker died mid-way (a crash or a restart).
+
+    Jobs are in-process background tasks, so nothing else would ever pick
+    them up: without this they stay queued or running forever.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    job_ids = await _in_session(session_factory, crud.claim_stale_jobs, stale_before)
+    for job_id in job_ids:
+        log_event("job_recovered", logging.WARNING, job_id=job_id)
+        await run_job(job_id, session_factory)
+    return job_ids
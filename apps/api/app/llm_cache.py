@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "tiered")  # tiered | memory | none
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "1024"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "data/llm_cache.db"))
+LLM_CACHE_TOUCH_BATCH = 64  # disk hits whose access times are written together
+LLM_CACHE_EVICT_BATCH = 64  # least recently used rows read per eviction round
+
+
+def make_key(**params) -> str:
+    """Stable key over everything that shapes the completion: model, messages and parameters."""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+    async def get_async(self, key: str) -> str | None: ...
+
+    async def set_async(self, key: str, value: str) -> None: ...
+
+    def stats(self) -> dict[str, int]: ...
+
+
+class NullCache:
+    def get(self, key: str) -> str | None:
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        pass
+
+    async def get_async(self, key: str) -> str | None:
+        return None
+
+    async def set_async(self, key: str, value: str) -> None:
+        pass
+
+    def stats(self) -> dict[str, int]:
+        return {}
+
+
+class MemoryCache:
+    """In-process LRU with a TTL per entry."""
+
+    def __init__(self, max_items: int = LLM_CACHE_MEMORY_ITEMS, ttl: float = LLM_CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Dict work under a lock: cheap enough to do on the event loop
+    async def get_async(self, key: str) -> str | None:
+        return self.get(key)
+
+    async def set_async(self, key: str, value: str) -> None:
+        self.set(key, value)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "items": len(self._entries),
+        }
+
+
+class SQLiteCache:
+    """Persistent tier: survives restarts and is shared by all workers on the host.
+
+    Expired rows are never returned; when the stored values exceed
+    `max_bytes`, the least recently used rows are deleted. The total size
+    is kept in a one-row table by triggers, so every worker sharing the
+    file sees it without summing the table. Hits record their access time
+    in batches of LLM_CACHE_TOUCH_BATCH, so a hit is a read, not a commit.
+    """
+
+    def __init__(self, path: Path = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # One transaction, so a file from before the size table is summed exactly once
+        self._conn.executescript(
+            "BEGIN IMMEDIATE;"
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at);"
+            "CREATE INDEX IF NOT EXISTS ix_llm_cache_expires ON llm_cache (expires_at);"
+            "CREATE TABLE IF NOT EXISTS llm_cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO llm_cache_size (id, total) SELECT 0, coalesce(sum(size), 0) FROM llm_cache;"
+            "CREATE TRIGGER IF NOT EXISTS llm_cache_size_insert AFTER INSERT ON llm_cache"
+            " BEGIN UPDATE llm_cache_size SET total = total + new.size; END;"
+            "CREATE TRIGGER IF NOT EXISTS llm_cache_size_update AFTER UPDATE OF size ON llm_cache"
+            " BEGIN UPDATE llm_cache_size SET total = total - old.size + new.size; END;"
+            "CREATE TRIGGER IF NOT EXISTS llm_cache_size_delete AFTER DELETE ON llm_cache"
+            " BEGIN UPDATE llm_cache_size SET total = total - old.size; END;"
+            "COMMIT;"
+        )
+        self._lock = threading.Lock()
+        self._touched: dict[str, float] = {}  # key -> access time not yet written
+        self._touches = 0  # hits since the last write
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            self._touches += 1
+            if self._touches >= LLM_CACHE_TOUCH_BATCH:
+                self._flush_touches()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            # Eviction goes by access time: bring it up to date first
+            self._flush_touches()
+            # An upsert, not INSERT OR REPLACE: its implicit delete would not fire the size trigger
+            self._conn.execute(
+                "INSERT INTO llm_cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,"
+                " expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, value, len(value.encode("utf-8")), now + self.ttl, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touches = 0
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT total FROM llm_cache_size").fetchone()[0]
+
+    def _evict(self, now: float) -> None:
+        removed = self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,)).rowcount
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed_at LIMIT ?", (LLM_CACHE_EVICT_BATCH,)
+            ).fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            if not doomed:
+                break
+            self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+            removed += len(doomed)
+        self.evictions += removed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            items = self._conn.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+            size = self._total_bytes()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "items": items,
+            "bytes": size,
+        }
+
+
+class TieredCache:
+    """Memory LRU in front of SQLite; disk hits are promoted to memory."""
+
+    def __init__(self, memory: MemoryCache, disk: SQLiteCache):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> str | None:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    async def get_async(self, key: str) -> str | None:
+        """Like get, with the SQLite tier read in a worker thread; memory hits stay on the loop."""
+        value = self.memory.get(key)
+        if value is None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    async def set_async(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        await asyncio.to_thread(self.disk.set, key, value)
+
+    def stats(self) -> dict[str, int]:
+        stats = {f"memory_{k}": v for k, v in self.memory.stats().items()}
+        stats.update({f"disk_{k}": v for k, v in self.disk.stats().items()})
+        stats["hits"] = self.memory.hits + self.disk.hits
+        stats["misses"] = self.disk.misses
+        return stats
+
+
+def build_cache(backend: str = LLM_CACHE_BACKEND) -> ResponseCache:
+    if backend == "none":
+        return NullCache()
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "tiered":
+        return TieredCache(MemoryCache(), SQLiteCache())
+    raise ValueError(f"Unknown LLM cache backend: {backend}")
@@ -0,0 +1,47 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+
+# One JSON object per line, each tagged with the request id of the request
+# (or Telegram update, via the bot's X-Request-ID header) that caused it.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+logger = logging.getLogger("api")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "request_id": request_id.get(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    if any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    logger.log(level, event, extra={"fields": fields})
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
@@ -1,22 +1,104 @@
 #uvicorn apps.api.app.main:app --reload --port 8000
 #python3 -m apps.bot.run_bot
 
+import asyncio
+import json
+import logging
+import time
 from pathlib import Path
 from datetime import datetime
 from typing import List
-import uuid
 import os
 from typing import Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Body
-from sqlalchemy.orm import Session
-from .db import engine, Base, get_db
-from . import models, crud, schemas, ai_service
-from apps.api.app.extraction import extract_text_generic
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Body, Request, Response, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.background import BackgroundTask
+from .db import engine, async_engine, get_async_db, get_async_session_factory, get_db, get_session_factory
+from . import models, crud, schemas, ai_service, blob_store, context, conversation, downloads, ingest, logs, metrics, migrations, pagination, transcription, uploads, vector_index
+from .logs import log_event
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logs.configure_logging()
+
+# Apply schema migrations on startup. Turn off when they run as a separate
+# deploy step (python -m apps.api.app.migrations), so scaled-out workers skip it.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+
+async def _archive_cold_blobs_periodically():
+    while True:
+        await asyncio.sleep(blob_store.BLOB_ARCHIVE_INTERVAL_SECONDS)
+        try:
+            archived = await asyncio.to_thread(blob_store.archive_cold_blobs)
+            if archived:
+                log_event("blobs_archived", count=len(archived))
+        except Exception as e:
+            log_event("blob_archival_failed", logging.ERROR, error=str(e))
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+async def _recover_jobs_periodically():
+    # Once at startup for the jobs the last process left behind, then for any whose heartbeat stops
+    while True:
+        try:
+            await ingest.recover_jobs(get_session_factory())
+        except Exception as e:
+            log_event("job_recovery_failed", logging.ERROR, error=str(e))
+        await asyncio.sleep(ingest.JOB_STALE_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE:
+        await asyncio.to_thread(migrations.migrate, engine)
+    await asyncio.to_thread(ai_service.init_clients)
+    archiver = asyncio.create_task(_archive_cold_blobs_periodically())
+    recovery = asyncio.create_task(_recover_jobs_periodically())
+    yield
+    archiver.cancel()
+    recovery.cancel()
+    ingest.shutdown()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    limit = uploads.oversized_body(request.url.path, request.headers)
+    if limit is not None:
+        return JSONResponse(status_code=413, content={"detail": f"Upload exceeds the limit of {limit} bytes"})
+    return await call_next(request)
+
+
+# Registered last, so it wraps the other middleware and also sees their responses
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Tag the request with an id (the bot's X-Request-ID if sent), log it, and time it by route."""
+    request_id = request.headers.get(logs.REQUEST_ID_HEADER) or logs.new_request_id()
+    token = logs.request_id.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers[logs.REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        # The route template, so /notes/1 and /notes/2 share a series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=str(status))
+        log_event("request", method=request.method, route=route, status=status, ms=round(elapsed * 1000, 1))
+        logs.request_id.reset(token)
+
+
+@app.get("/metrics")
+def read_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def root():
@@ -25,17 +107,14 @@ def root():
 @app.get("/notes/{note_id}/download")
 def download_note(
         note_id: int,
+        request: Request,
         db: Session = Depends(get_db),
 ):
     note = crud.get_note(db, note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    file_path = Path(note.attachment_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File missing from disk")
-
-    return FileResponse(file_path)
+    return downloads.blob_response(Path(note.attachment_path), request.headers)
 
 @app.get("/health")
 def health():
@@ -45,52 +124,61 @@ def health():
 def search_notes(
     q: str = Query(..., min_length=1),
     user_id: int = Query(...),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
 ):
 
-    raw_notes = crud.search_notes(db, user_id=user_id, search_term=q)
-    results = []
+    rows = crud.search_note_previews(db, user_id=user_id, search_term=q, limit=limit, offset=offset)
+    return [
+        schemas.NoteSearchResult(
+            id=row.id,
+            created_at=row.created_at,
+            filename=os.path.basename(row.attachment_path),
+            match_preview=row.preview,
+        )
+        for row in rows
+    ]
+
 
-    for note in raw_notes:
-        display_name = os.path.basename(note.attachment_path)
+def _decode_cursor(cursor: str | None, types: pagination.CursorTypes) -> tuple | None:
+    if cursor is None:
+        return None
+    try:
+        return pagination.decode_cursor(cursor, types)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
-        preview_text = generate_snippet(note.full_text, q)
 
-        result_object = schemas.NoteSearchResult(
-            id=note.id,
-            created_at=note.created_at,
-            filename=display_name,
-            match_preview=preview_text
-        )
-        results.append(result_object)
+def _paginate(rows: list, limit: int, page_key, response: Response) -> list:
+    """Trim the look-ahead row; if there was one, hand out the cursor for the next page."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(page_key(rows[-1]))
+    return rows
 
-    return results
+
+@app.get("/notes", response_model=list[schemas.NoteListItem])
+def list_notes(
+    response: Response,
+    user_id: int = Query(...),
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: Session = Depends(get_db),
+):
+    """A user's notes, newest first. Follow the X-Next-Cursor header for the next page."""
+    after = _decode_cursor(cursor, pagination.DATETIME_ID)
+    notes = crud.list_notes(db, user_id=user_id, limit=limit + 1, after=after)
+    return _paginate(notes, limit, crud.note_page_key, response)
 
 
 @app.get("/notes/{note_id}", response_model=schemas.NoteOut)
 def read_note(note_id: int, db: Session = Depends(get_db)):
-    note = crud.get_note(db, note_id)
+    note = crud.get_note(db, note_id, with_text=True)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     return note
 
-def generate_snippet(text: str, term: str) -> str:
-    text_lower = text.lower()
-    term_lower = term.lower()
-    start_idx = text_lower.find(term_lower)
-
-    if start_idx == -1:
-        return text[:50] + "..."
-
-    start = max(0, start_idx - 30)
-    end = start_idx + len(term) + 30
-
-    snippet = text[start:end]
-    return snippet
-
-
-
-
 @app.post("/tasks", response_model=schemas.TaskOut)
 def create_task(
     task_in: schemas.TaskCreate,
@@ -101,12 +189,16 @@ def create_task(
 
 @app.get("/tasks", response_model=list[schemas.TaskOut])
 def list_tasks(
+    response: Response,
     user_id: int = Query(...),
     status: Optional[str] = Query(None),
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db),
 ):
-    tasks = crud.list_tasks(db, user_id=user_id, status=status)
-    return tasks
+    after = _decode_cursor(cursor, pagination.DATETIME_ID)
+    tasks = crud.list_tasks(db, user_id=user_id, status=status, limit=limit + 1, after=after)
+    return _paginate(tasks, limit, crud.task_page_key, response)
 
 
 @app.post("/tasks/{task_id}/complete", response_model=schemas.TaskOut)
@@ -117,98 +209,259 @@ def complete_task(task_id: int, db: Session = Depends(get_db)):
     return task
 
 
-@app.post("/attachments")
+@app.post("/attachments", status_code=202)
 async def upload_attachments(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     user_id: int = Query(..., description="Telegram user id"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: sessionmaker = Depends(get_session_factory),
 ):
     if len(files) > 10:
         raise HTTPException(status_code=400, detail="Maximum number of files is 10")
 
-    os.makedirs("data/files", exist_ok=True)
-    results = []
-
-    for file in files:
+    budget = uploads.RequestBudget()
+    streamed = []
+    try:
+        for file in files:
+            streamed.append(await uploads.stream_to_disk(file, budget=budget))
+    except BaseException:
+        for item in streamed:
+            item.path.unlink(missing_ok=True)
+        raise
+
+    pending = []
+    for file, item in zip(files, streamed):
         ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{ext}"
-        file_path = os.path.join("data", "files", unique_filename)
+        # Identical bytes are stored once, whoever uploads them
+        sha256, file_path = blob_store.put_file(item.path, ext, sha256=item.sha256)
 
-        contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        pending.append(schemas.JobFile(
+            original_filename=file.filename,
+            stored_filename=file_path.name,
+            location=str(file_path),
+            content_type=file.content_type,
+            size=item.size,
+            sha256=sha256,
+        ))
 
-        text = ""
+    log_event("upload", user_id=user_id, files=len(files), bytes=budget.used)
 
-        try:
-            text = extract_text_generic(Path(file_path))
-        except Exception:
-            text = ""
+    job = await crud.create_job_async(db, user_id=user_id, files=pending)
+    return _enqueue_ingest(job, background_tasks, pending, session_factory)
 
-        ai_summary = ai_service.summarize_text(text)
 
-        preview = text[:300] if text else ""
+@app.post("/attachments/shared", status_code=202)
+def attach_shared_files(
+    payload: schemas.SharedAttachments,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    session_factory: sessionmaker = Depends(get_session_factory),
+):
+    """Ingest files already in SHARED_STORAGE_DIR by reference: no upload, no copy."""
+    if len(payload.files) > 10:
+        raise HTTPException(status_code=400, detail="Maximum number of files is 10")
 
-        note_in = schemas.NoteCreate(
-            user_id=user_id,
-            attachment_path=str(file_path),
-            full_text=text,
-            summary=ai_summary
+    shared_root = uploads.SHARED_STORAGE_DIR.resolve()
+    sources = []
+    for shared in payload.files:
+        src = Path(shared.path).resolve()
+        if not src.is_relative_to(shared_root) or not src.is_file():
+            raise HTTPException(status_code=400, detail=f"Not a file in shared storage: {shared.path}")
+        sources.append(src)
+
+    pending = []
+    for shared, src in zip(payload.files, sources):
+        filename = shared.filename or src.name
+        size = src.stat().st_size
+        sha256, file_path = blob_store.put_file(src, Path(filename).suffix, link=not payload.move)
+        pending.append(schemas.JobFile(
+            original_filename=filename,
+            stored_filename=file_path.name,
+            location=str(file_path),
+            content_type=shared.content_type,
+            size=size,
+            sha256=sha256,
+        ))
+
+    job = crud.create_job(db, user_id=payload.user_id, files=pending)
+    return _enqueue_ingest(job, background_tasks, pending, session_factory)
+
+
+def _enqueue_ingest(
+    job: models.IngestJob,
+    background_tasks: BackgroundTasks,
+    pending: list[schemas.JobFile],
+    session_factory: sessionmaker,
+) -> dict:
+    background_tasks.add_task(ingest.run_job, job.id, session_factory)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "upload_time": datetime.utcnow().isoformat(),
+        "uploaded": [
+            f.model_dump(include={"original_filename", "stored_filename", "content_type", "size", "location"})
+            for f in pending
+        ],
+    }
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobOut)
+def read_job(job_id: str, db: Session = Depends(get_db)):
+    job = crud.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+NO_NOTES_ANSWER = "I couldn't find any notes matching your question."
+
+
+async def _chat_context(request: schemas.ChatRequest, db: AsyncSession) -> context.AssembledContext | None:
+    """Note context for the question; None when the user has no notes to answer from."""
+    # Embedding the question may be a network call and the search reads mmapped files: keep both off the loop
+    chunks = await asyncio.to_thread(vector_index.get_index().search, request.user_id, request.question, k=5)
+
+    if chunks:
+        summaries = await crud.get_note_summaries_async(db, [chunk.note_id for chunk in chunks])
+        candidates = context.candidates_from_chunks(chunks, summaries)
+    else:
+        found_notes = await crud.search_notes_async(
+            db, user_id=request.user_id, search_term=request.question, limit=3, match_all=False, with_text=True
         )
-        note = crud.create_note(db, note_in=note_in)
-
-        results.append({
-            "success": True,
-            "original_filename": file.filename,
-            "stored_filename": unique_filename,
-            "content_type": file.content_type,
-            "size": len(contents),
-            "upload_time": datetime.utcnow().isoformat(),
-            "location": str(file_path),
-            "note_id": note.id,
-            "text_preview": preview,
-        })
-
-    return {"uploaded": results}
+        if not found_notes:
+            log_event("chat_context_fallback", user_id=request.user_id, source="recent_notes")
+            found_notes = await crud.get_user_notes_async(db, user_id=request.user_id, limit=3, with_text=True)
+        candidates = [
+            context.Candidate(text=note.full_text, fallback=note.summary, note_id=note.id)
+            for note in found_notes
+        ]
+    if not candidates:
+        return None
+
+    assembled = context.assemble_context(candidates)
+    metrics.CHAT_CONTEXT_TOKENS.observe(assembled.tokens)
+    log_event(
+        "chat_context",
+        user_id=request.user_id,
+        tokens=assembled.tokens,
+        pieces=assembled.used,
+        summarized=assembled.summarized,
+        dropped=assembled.dropped,
+    )
+    return assembled
+
+
+async def _chat_history(request: schemas.ChatRequest, db: AsyncSession, assembled: context.AssembledContext) -> tuple[list[dict], int]:
+    history = conversation.to_messages(await conversation.load_history(db, request.user_id))
+    prompt_tokens = context.count_message_tokens(ai_service.answer_messages(assembled.text, request.question, history))
+    metrics.CHAT_PROMPT_TOKENS.observe(prompt_tokens)
+    log_event("chat_prompt", user_id=request.user_id, tokens=prompt_tokens, history_messages=len(history))
+    return history, prompt_tokens
 
 
 @app.post("/chat")
-async def chat(request: schemas.ChatRequest, db: Session = Depends(get_db)):
-    found_notes = crud.search_notes(db, user_id=request.user_id)
-    if not found_notes:
-        print("Search failed. Switching to Recent Files Context.")
-        found_notes = crud.get_user_notes(db, user_id=request.user_id, limit=3)
-    texts = []
-    for note in found_notes:
-        texts.append(note.full_text)
-
-    if texts:
-        context_block = "\n\n".join(texts)
-    else:
-        context_block = ""
-    return ai_service.answer_user_question(context_block, request.question)
+async def chat(
+    request: schemas.ChatRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker = Depends(get_async_session_factory),
+):
+    assembled = await _chat_context(request, db)
+    if assembled is None:
+        return NO_NOTES_ANSWER
+    history, prompt_tokens = await _chat_history(request, db, assembled)
+    answer = await ai_service.answer_user_question_async(assembled.text, request.question, history)
+    if await conversation.record_turn(db, request.user_id, request.question, answer, prompt_tokens):
+        background_tasks.add_task(conversation.fold_history, session_factory, request.user_id)
+    response.headers["X-Context-Tokens"] = str(assembled.tokens)
+    response.headers["X-Prompt-Tokens"] = str(prompt_tokens)
+    return answer
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: schemas.ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker = Depends(get_async_session_factory),
+):
+    """Same as /chat, but the answer arrives as Server-Sent Events, token by token.
+
+    Each `data:` line is a JSON-encoded text delta; a final `event: done` ends the stream.
+    """
+    assembled = await _chat_context(request, db)
+    if assembled is None:
+        no_notes = f"data: {json.dumps(NO_NOTES_ANSWER)}\n\nevent: done\ndata: {{}}\n\n"
+        return StreamingResponse(iter([no_notes]), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    history, prompt_tokens = await _chat_history(request, db, assembled)
+
+    async def events():
+        parts = []
+        failed = False
+        async for delta in ai_service.stream_answer(assembled.text, request.question, history):
+            failed = failed or isinstance(delta, ai_service.AnswerError)
+            parts.append(delta)
+            yield f"data: {json.dumps(delta)}\n\n"
+        # Half an answer followed by an error would mislead the turns after it
+        if not failed and "".join(parts).strip():
+            # The request's own session is closed by now: the stream outlives the endpoint
+            async with session_factory() as session:
+                await conversation.record_turn(session, request.user_id, request.question, "".join(parts), prompt_tokens)
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "X-Context-Tokens": str(assembled.tokens),
+            "X-Prompt-Tokens": str(prompt_tokens),
+            "Cache-Control": "no-cache",
+        },
+        background=BackgroundTask(conversation.fold_history, session_factory, request.user_id),
+    )
+
+
+@app.get("/chat/history", response_model=schemas.ConversationOut)
+async def read_chat_history(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    summary = await crud.get_conversation_summary_async(db, user_id)
+    turns = await crud.get_conversation_turns_async(db, user_id, after_id=summary.through_turn_id if summary else 0)
+    return schemas.ConversationOut(
+        user_id=user_id,
+        summary=summary.summary if summary else None,
+        turns=turns[::-1],
+    )
+
+
+@app.delete("/chat/history")
+async def clear_chat_history(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    count = await crud.delete_conversation_async(db, user_id=user_id)
+    log_event("conversation_deleted", user_id=user_id, turns=count)
+    return {"message": f"Deleted {count} conversation turns."}
 
 @app.post("/transcribe")
 async def transcribe(file: UploadFile = File(...)):
-    temp_filename = f"temp_{uuid.uuid4()}.ogg"
-    file_path = os.path.join("data", "files", temp_filename)
-    os.makedirs("data/files", exist_ok=True)
-    contents = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(contents)
-
-    text = ai_service.transcribe_audio(file_path)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    suffix = os.path.splitext(file.filename or "")[1] or ".ogg"
+    streamed = await uploads.stream_to_disk(file, suffix=suffix)
+    try:
+        text = await transcription.transcribe(streamed.path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except Exception as e:
+        log_event("transcribe_error", logging.ERROR, error=str(e))
+        text = "Error transcribing audio."
+    finally:
+        streamed.path.unlink(missing_ok=True)
 
     return {"text": text}
 
 
 @app.delete("/notes")
-async def clear_notes(user_id: int, db: Session = Depends(get_db)):
-    count = crud.delete_user_notes(db, user_id=user_id)
+async def clear_notes(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    count = await crud.delete_user_notes_async(db, user_id=user_id)
+    await asyncio.to_thread(vector_index.get_index().delete_user, user_id)
 
-    print(f"🗑️ DEBUG: Deleting notes for user {user_id}. Rows deleted: {count}")
+    log_event("notes_deleted", user_id=user_id, count=count)
 
     return {"message": f"Deleted {count} notes."}
 
@@ -0,0 +1,167 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus text exposition (format 0.0.4) without the client library:
+# a handful of counters and histograms, rendered on GET /metrics.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: dict[tuple[str, ...], tuple[list[int], float]] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._series[key] = (counts, total + value)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(tuple(str(labels.get(n, "")) for n in self.labelnames))
+        return series[0][-1] if series else 0
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {counts[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+REGISTRY: list[Counter | Histogram] = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP requests by route and status.", ("method", "route", "status")
+)
+# One histogram for the whole pipeline. stage: upload_write, extract, summarize,
+# answer, transcribe, db_query; kind narrows it down (file type, SQL verb, ...).
+STAGE_SECONDS = Histogram("pipeline_stage_duration_seconds", "Time spent per pipeline stage.", ("stage", "kind"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the model API.", ("operation", "type"))
+LLM_CACHE_REQUESTS = Counter("llm_cache_requests_total", "LLM response cache lookups.", ("operation", "result"))
+CHAT_CONTEXT_TOKENS = Histogram(
+    "chat_context_tokens", "Tokens of note context sent with a chat question.",
+    buckets=(100, 250, 500, 1000, 2000, 3000, 4000, 8000),
+)
+TASK_EXTRACTION_NOTES = Counter(
+    "task_extraction_notes_total", "Notes seen by task extraction, by whether the local pass sent them to the model.",
+    ("result",),
+)
+CHAT_PROMPT_TOKENS = Histogram(
+    "chat_prompt_tokens", "Tokens of the whole chat prompt: instructions, conversation history, context and question.",
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000),
+)
+
+
+def timed(stage: str, kind: str = ""):
+    """`with metrics.timed("extract", ".pdf"):` - observe the block's duration for a pipeline stage."""
+    return STAGE_SECONDS.time(stage=stage, kind=kind)
+
+
+def record_usage(operation: str, usage) -> None:
+    """Count tokens from an OpenAI `usage` object, when the response carries one."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if isinstance(value, int):
+            LLM_TOKENS.inc(value, operation=operation, type=kind.removesuffix("_tokens"))
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# The start time rides on the statement's execution context: a statement that fails never
+# reaches after_cursor_execute, and its context is simply dropped with it
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._query_start
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="db_query", kind=verb)
+
+
+def instrument_sqlalchemy() -> None:
+    """Time every statement on every engine (sync, and the sync core of async ones)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
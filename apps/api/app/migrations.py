@@ -0,0 +1,79 @@
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, select
+from sqlalchemy.engine import Connection, Engine
+
+from . import logs, models, search_index
+from .db import Base
+from .logs import log_event
+
+# Schema setup is an explicit step, not an import side effect: run
+# `python -m apps.api.app.migrations` on deploy, or leave AUTO_MIGRATE on and
+# the API applies it in its lifespan hook.
+#
+# create_all() only creates missing tables. Changes to tables that already
+# exist in a deployed database (new indexes, columns) are applied here, in
+# order, exactly once per database. Append new steps; never edit old ones.
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, server_default=func.current_timestamp()),
+)
+
+
+def _add_listing_indexes(conn: Connection) -> None:
+    for table in (models.Note.__table__, models.Task.__table__):
+        for index in table.indexes:
+            if index.name in ("ix_notes_user_created", "ix_tasks_user_status_due"):
+                index.create(conn, checkfirst=True)
+
+
+def _add_task_due_index(conn: Connection) -> None:
+    for index in models.Task.__table__.indexes:
+        if index.name == "ix_tasks_user_due":
+            index.create(conn, checkfirst=True)
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add listing indexes", _add_listing_indexes),
+    (2, "add task due date index", _add_task_due_index),
+]
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Apply pending migrations, each in its own transaction; returns the versions applied."""
+    _metadata.create_all(bind=engine)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        with engine.begin() as conn:
+            if version in applied_versions(conn):
+                continue
+            log_event("migration_applying", version=version, name=name)
+            step(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name))
+        applied.append(version)
+    return applied
+
+
+def migrate(engine: Engine) -> list[int]:
+    """Bring a database fully up to date: missing tables, pending migrations, the search index."""
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
+    search_index.ensure_search_index(engine)
+    return applied
+
+
+if __name__ == "__main__":
+    from .db import engine
+
+    logs.configure_logging()
+    applied = migrate(engine)
+    log_event("database_up_to_date", applied=len(applied))
@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.orm import deferred
 from .db import Base
 
 
@@ -10,10 +11,14 @@ class Note(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True)
     attachment_path = Column(String, nullable=False)
-    full_text = Column(Text, nullable=False)
+    # Whole documents: only loaded when accessed, never by listings or search
+    full_text = deferred(Column(Text, nullable=False))
     created_at = Column(DateTime, default=datetime.utcnow)
     summary = Column(Text, nullable=True)
 
+    # Serves per-user listings newest first (GET /notes, recent-notes chat context)
+    __table_args__ = (Index("ix_notes_user_created", "user_id", "created_at"),)
+
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -25,4 +30,58 @@ class Task(Base):
     status = Column(String, default="open", index=True)
     note_id = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    completed_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    completed_at = Column(DateTime, nullable=True)
+
+    # Serve GET /tasks: filter by user (and status), walk in due date order
+    __table_args__ = (
+        Index("ix_tasks_user_status_due", "user_id", "status", "due_at"),
+        Index("ix_tasks_user_due", "user_id", "due_at"),
+    )
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, index=True)
+    status = Column(String, default="queued", index=True)
+    total_files = Column(Integer, default=0)
+    processed_files = Column(Integer, default=0)
+    files = Column(Text, nullable=False, default="[]")  # JSON list, one entry per uploaded file
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ExtractionCache(Base):
+    """Extracted text and summary of a blob, keyed by "<sha256>:<extractor id>"."""
+    __tablename__ = "extraction_cache"
+
+    key = Column(String, primary_key=True)
+    sha256 = Column(String, index=True, nullable=False)
+    full_text = Column(Text, nullable=False)
+    summary = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ConversationTurn(Base):
+    """One question/answer exchange in /chat, kept verbatim."""
+    __tablename__ = "conversation_turns"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False)  # everything sent to the model for this turn
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_conversation_turns_user_id", "user_id", "id"),)
+
+
+class ConversationSummary(Base):
+    """Rolling summary of a user's turns up to and including `through_turn_id`."""
+    __tablename__ = "conversation_summaries"
+
+    user_id = Column(Integer, primary_key=True)
+    summary = Column(Text, nullable=False)
+    through_turn_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,188 @@
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+from . import llm_cache
+
+# Image -> text: clean the image up for Tesseract, then OCR it, remembering
+# the result per image so the same photo or scanned page is only OCR'd once.
+#
+# Bump when preprocessing changes, so cached results from the old pipeline are not reused.
+OCR_PIPELINE_VERSION = "1"
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+# Photos carry no usable DPI: assume their long side spans an A4 page's long side.
+OCR_ASSUMED_PAGE_INCHES = 11.69
+OCR_MAX_SKEW_DEGREES = 10.0
+# Skew is searched on a copy this big (long side), first in whole degrees, then finer.
+SKEW_SAMPLE_SIDE = 600
+OCR_DETECT_ROTATION = os.getenv("OCR_DETECT_ROTATION", "1") == "1"
+OCR_MIN_ROTATION_CONFIDENCE = 2.0
+
+OCR_CACHE_BACKEND = os.getenv("OCR_CACHE_BACKEND", "tiered")  # tiered | memory | none
+OCR_CACHE_PATH = Path(os.getenv("OCR_CACHE_PATH", "data/ocr_cache.db"))
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", str(90 * 24 * 3600)))
+
+# Scanner defaults that say nothing about the real resolution
+_PLACEHOLDER_DPI = {0, 1, 72, 96}
+
+
+def _source_dpi(img: Image.Image) -> float | None:
+    dpi = img.info.get("dpi")
+    if not dpi:
+        return None
+    value = float(dpi[0])
+    return None if round(value) in _PLACEHOLDER_DPI else value
+
+
+def normalize_resolution(img: Image.Image, dpi: float | None = None) -> Image.Image:
+    """Downscale to about OCR_TARGET_DPI; more pixels only make Tesseract slower, not better."""
+    long_side = max(img.size)
+    if dpi:
+        scale = OCR_TARGET_DPI / dpi
+    else:
+        scale = OCR_TARGET_DPI * OCR_ASSUMED_PAGE_INCHES / long_side
+    if scale >= 0.95:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+
+def flatten_background(gray: Image.Image) -> Image.Image:
+    """Divide out uneven lighting (shadows, vignetting) using a coarse estimate of the paper's brightness."""
+    small = gray.reduce(16) if min(gray.size) >= 64 else gray
+    paper = small.filter(ImageFilter.MaxFilter(5)).filter(ImageFilter.GaussianBlur(2))
+    paper = paper.resize(gray.size, Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.uint16)
+    background = np.maximum(np.asarray(paper, dtype=np.uint16), 1)
+    return Image.fromarray(np.minimum(pixels * 255 // background, 255).astype(np.uint8))
+
+
+def otsu_threshold(gray: Image.Image) -> int:
+    hist = np.asarray(gray.histogram()[:256], dtype=np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 127
+    levels = np.arange(256)
+    weight_dark = np.cumsum(hist)
+    weight_light = total - weight_dark
+    mean_dark = np.cumsum(hist * levels)
+    mean_all = mean_dark[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean_all * weight_dark / total - mean_dark) ** 2 / (weight_dark * weight_light)
+    if np.isnan(between).all():
+        return 127  # a single grey level: nothing to separate
+    return int(np.nanargmax(between))
+
+
+def binarize(gray: Image.Image) -> Image.Image:
+    threshold = otsu_threshold(gray)
+    return gray.point(lambda v: 255 if v > threshold else 0)
+
+
+def _profile_score(ink: Image.Image, angle: float) -> float:
+    rows = np.asarray(ink.rotate(angle, resample=Image.Resampling.BILINEAR), dtype=np.float32).sum(axis=1)
+    return float(np.square(np.diff(rows)).sum())
+
+
+def estimate_skew(gray: Image.Image) -> float:
+    """Angle (degrees, counter-clockwise) that makes text lines horizontal.
+
+    Projection profile: rows of level text alternate sharply between ink and
+    paper, so the best angle maximises the differences between row sums.
+    """
+    ink = ImageOps.invert(binarize(gray))
+    ink.thumbnail((SKEW_SAMPLE_SIDE, SKEW_SAMPLE_SIDE))
+    coarse = max(
+        np.arange(-OCR_MAX_SKEW_DEGREES, OCR_MAX_SKEW_DEGREES + 1),
+        key=lambda angle: _profile_score(ink, float(angle)),
+    )
+    fine = max(np.arange(coarse - 1, coarse + 1.01, 0.2), key=lambda angle: _profile_score(ink, float(angle)))
+    return round(float(fine), 1) + 0.0  # no -0.0
+
+
+def detect_rotation(img: Image.Image) -> int:
+    """Clockwise degrees (0/90/180/270) that put the page upright, from Tesseract's OSD; 0 when unsure."""
+    import pytesseract
+
+    try:
+        osd = pytesseract.image_to_osd(img, output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractError:
+        # Too little text to tell, or no osd.traineddata installed
+        return 0
+    if float(osd.get("orientation_conf", 0)) < OCR_MIN_ROTATION_CONFIDENCE:
+        return 0
+    return int(osd.get("rotate", 0)) % 360
+
+
+def preprocess(img: Image.Image) -> Image.Image:
+    """EXIF orientation, grayscale, resolution, lighting, deskew, binarization, then page rotation."""
+    dpi = _source_dpi(img)
+    gray = ImageOps.exif_transpose(img).convert("L")
+    gray = normalize_resolution(gray, dpi)
+    gray = ImageOps.autocontrast(flatten_background(gray), cutoff=1)
+    angle = estimate_skew(gray)
+    if abs(angle) >= 0.2:
+        gray = gray.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+    page = binarize(gray)
+    if OCR_DETECT_ROTATION:
+        rotation = detect_rotation(page)
+        if rotation:
+            page = page.rotate(-rotation, expand=True, fillcolor=255)
+    return page
+
+
+def image_key(img: Image.Image) -> str:
+    """Cache key over the decoded pixels and everything that shapes the OCR output."""
+    digest = hashlib.sha256()
+    digest.update(f"{img.mode}:{img.size}:{_source_dpi(img)}:".encode())
+    digest.update(img.tobytes())
+    return f"{digest.hexdigest()}:{OCR_LANG}:{OCR_TARGET_DPI}:v{OCR_PIPELINE_VERSION}"
+
+
+def build_cache(backend: str = OCR_CACHE_BACKEND) -> llm_cache.ResponseCache:
+    if backend == "none":
+        return llm_cache.NullCache()
+    if backend == "memory":
+        return llm_cache.MemoryCache(ttl=OCR_CACHE_TTL)
+    if backend == "tiered":
+        return llm_cache.TieredCache(
+            llm_cache.MemoryCache(ttl=OCR_CACHE_TTL),
+            llm_cache.SQLiteCache(OCR_CACHE_PATH, ttl=OCR_CACHE_TTL),
+        )
+    raise ValueError(f"Unknown OCR cache backend: {backend}")
+
+
+_cache: llm_cache.ResponseCache | None = None
+
+
+def get_cache() -> llm_cache.ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = build_cache()
+    return _cache
+
+
+def set_cache(cache: llm_cache.ResponseCache) -> None:
+    global _cache
+    _cache = cache
+
+
+def run_tesseract(img: Image.Image) -> str:
+    import pytesseract
+
+    text = pytesseract.image_to_string(img, lang=OCR_LANG)
+    return text.replace("\x0c", "").strip()
+
+
+def ocr_image(img: Image.Image) -> str:
+    key = image_key(img)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
+    text = run_tesseract(preprocess(img))
+    get_cache().set(key, text)
+    return text
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+
+# Keyset ("seek") pagination: the cursor carries the sort key of the last row
+# served, and the next page starts strictly after it. Unlike OFFSET, every
+# page costs the same index range scan however deep the client has paged.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+# Types allowed at each position of a cursor's key
+CursorTypes = tuple[type | tuple[type, ...], ...]
+# (datetime or NULL, id): the keys of the notes and tasks listings
+DATETIME_ID: CursorTypes = ((datetime, type(None)), int)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(key: tuple) -> str:
+    payload = json.dumps([_encode_value(v) for v in key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: CursorTypes) -> tuple:
+    """Inverse of encode_cursor; raises InvalidCursor on anything a client may have mangled.
+
+    Each decoded value must be an instance of the matching entry of `types`,
+    so a forged cursor never reaches the database as a mistyped parameter.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("wrong cursor shape")
+        key = tuple(_decode_value(v) for v in values)
+        for value, allowed in zip(key, types):
+            if isinstance(value, bool) or not isinstance(value, allowed):
+                raise TypeError(f"unexpected {type(value).__name__} in cursor")
+        return key
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
@@ -1,5 +1,6 @@
+import json
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 
 class NoteBase(BaseModel):
@@ -21,6 +22,15 @@ class NoteOut(NoteBase):
         from_attributes = True
 
 
+class NoteListItem(NoteBase):
+    id: int
+    summary: str | None = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class NoteSearchResult(BaseModel):  # <--- No baggage
     id: int
     filename: str
@@ -55,3 +65,68 @@ class TaskOut(TaskBase):
 class ChatRequest(BaseModel):
     question: str
     user_id: int
+
+
+class ConversationTurnOut(BaseModel):
+    id: int
+    question: str
+    answer: str
+    prompt_tokens: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationOut(BaseModel):
+    user_id: int
+    summary: str | None = None
+    turns: list[ConversationTurnOut]  # not yet folded into the summary, oldest first
+
+
+class JobFile(BaseModel):
+    original_filename: str | None = None
+    stored_filename: str
+    location: str
+    content_type: str | None = None
+    size: int
+    sha256: str | None = None
+    status: str = "queued"
+    note_id: int | None = None
+    summary: str | None = None
+    text_preview: str | None = None
+    error: str | None = None
+
+
+class SharedFile(BaseModel):
+    path: str
+    filename: str | None = None
+    content_type: str | None = None
+
+
+class SharedAttachments(BaseModel):
+    """Files that already sit in the shared storage directory (bot and API on one host)."""
+    user_id: int
+    files: list[SharedFile]
+    move: bool = False  # True: the API takes ownership and moves the file; False: hard-link it
+
+
+class JobOut(BaseModel):
+    id: str
+    user_id: int
+    status: str
+    total_files: int
+    processed_files: int
+    files: list[JobFile]
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+    @field_validator("files", mode="before")
+    @classmethod
+    def _parse_files(cls, value):
+        # Stored as a JSON string on IngestJob.files
+        return json.loads(value) if isinstance(value, str) else value
+
+    class Config:
+        from_attributes = True
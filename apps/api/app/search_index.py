@@ -0,0 +1,94 @@
+import re
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+# External-content FTS5 table over notes.full_text / notes.summary.
+# Triggers keep it in sync with every insert/update/delete on `notes`,
+# including bulk deletes like crud.delete_user_notes.
+FTS_TABLE = "notes_fts"
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        full_text,
+        summary,
+        content='notes',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, full_text, summary)
+        VALUES (new.id, new.full_text, coalesce(new.summary, ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_text, summary)
+        VALUES ('delete', old.id, old.full_text, coalesce(old.summary, ''));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE ON notes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_text, summary)
+        VALUES ('delete', old.id, old.full_text, coalesce(old.summary, ''));
+        INSERT INTO {FTS_TABLE}(rowid, full_text, summary)
+        VALUES (new.id, new.full_text, coalesce(new.summary, ''));
+    END
+    """,
+]
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_supported(bind: Connection | Engine) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def create_search_index(connection: Connection) -> None:
+    """Create the FTS table and triggers; backfill it if it did not exist yet."""
+    existed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first()
+    for statement in _DDL:
+        connection.exec_driver_sql(statement)
+    if not existed:
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """Idempotent startup hook for databases created before the index existed."""
+    if not is_supported(engine):
+        return
+    with engine.begin() as connection:
+        create_search_index(connection)
+
+
+@event.listens_for(models.Note.__table__, "after_create")
+def _create_after_notes(target, connection, **kw):
+    if is_supported(connection):
+        create_search_index(connection)
+
+
+@event.listens_for(models.Note.__table__, "before_drop")
+def _drop_before_notes(target, connection, **kw):
+    if is_supported(connection):
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def build_match_query(search_term: str, match_all: bool = True) -> str | None:
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS operators in user input are inert) and
+    prefix-matched. `match_all=False` ORs the terms, which suits natural
+    language questions where BM25 should do the ranking.
+    """
+    terms = _TERM_RE.findall(search_term.lower())
+    if not terms:
+        return None
+    joiner = " " if match_all else " OR "
+    return joiner.join(f'"{term}"*' for term in terms)
@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Protocol
+
+# Archive tier for cold attachments. Hot blobs live uncompressed in
+# blob_store (extractors need real files); once cold they are moved here,
+# compressed if they look like text, and served back on download.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # local | s3
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "data/archive"))
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "blobs/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # MinIO, R2, ... ; unset for AWS
+
+READ_CHUNK_SIZE = 256 * 1024
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".tsv", ".json", ".xml", ".html", ".htm", ".log", ".svg", ".rtf"}
+TEXT_SNIFF_BYTES = 8192
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int  # bytes as uploaded, before compression
+    stored_size: int
+    encoding: str  # "identity" or "deflate"
+
+
+class Backend(Protocol):
+    """Raw object access; StoredObject bookkeeping and compression live in ArchiveStorage."""
+
+    def put(self, key: str, body: BinaryIO, metadata: dict[str, str]) -> int: ...
+
+    def head(self, key: str) -> dict[str, str] | None: ...
+
+    def read(self, key: str, start: int = 0, end: int | None = None) -> Iterator[bytes]: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class LocalBackend:
+    """Objects as files under `root`, metadata in a JSON sidecar next to each."""
+
+    def __init__(self, root: Path = ARCHIVE_DIR):
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def _meta_path(self, key: str) -> Path:
+        path = self._path(key)
+        return path.with_name(path.name + ".meta.json")
+
+    def put(self, key: str, body: BinaryIO, metadata: dict[str, str]) -> int:
+        dest = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{uuid.uuid4()}.tmp")
+        with open(tmp, "wb") as out:
+            shutil.copyfileobj(body, out, READ_CHUNK_SIZE)
+        self._meta_path(key).write_text(json.dumps(metadata))
+        os.replace(tmp, dest)
+        return dest.stat().st_size
+
+    def head(self, key: str) -> dict[str, str] | None:
+        path, meta = self._path(key), self._meta_path(key)
+        if not path.exists() or not meta.exists():
+            return None
+        return {**json.loads(meta.read_text()), "stored_size": str(path.stat().st_size)}
+
+    def read(self, key: str, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+        self._meta_path(key).unlink(missing_ok=True)
+
+
+def _is_not_found(error: Exception) -> bool:
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Backend:
+    """Any S3-compatible store, through a boto3-style client (put/get/head/delete_object)."""
+
+    def __init__(self, client, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @classmethod
+    def from_env(cls) -> "S3Backend":
+        import boto3  # optional dependency, only needed with STORAGE_BACKEND=s3
+
+        return cls(boto3.client("s3", endpoint_url=S3_ENDPOINT_URL))
+
+    def put(self, key: str, body: BinaryIO, metadata: dict[str, str]) -> int:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=body, Metadata=metadata)
+        return int(self.head(key)["stored_size"])
+
+    def head(self, key: str) -> dict[str, str] | None:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+        return {**response["Metadata"], "stored_size": str(response["ContentLength"])}
+
+    def read(self, key: str, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self.prefix + key}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**params)["Body"]
+        try:
+            while chunk := body.read(READ_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def is_text_like(path: Path) -> bool:
+    if path.suffix.lower() in TEXT_EXTENSIONS:
+        return True
+    with open(path, "rb") as f:
+        head = f.read(TEXT_SNIFF_BYTES)
+    if not head or b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still text
+        return e.start >= len(head) - 3
+    return True
+
+
+def _deflate_to_spool(src: BinaryIO) -> BinaryIO:
+    """Compress into a seekable temp file (S3 clients need a length); small blobs stay in memory."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    compressor = zlib.compressobj(6)
+    while chunk := src.read(READ_CHUNK_SIZE):
+        spool.write(compressor.compress(chunk))
+    spool.write(compressor.flush())
+    spool.seek(0)
+    return spool
+
+
+class ArchiveStorage:
+    """Blobs by key on a backend, deflate-compressed when text-like, readable by byte range."""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+
+    def put_file(self, key: str, src: Path) -> StoredObject:
+        size = src.stat().st_size
+        encoding = "deflate" if is_text_like(src) else "identity"
+        metadata = {"size": str(size), "encoding": encoding}
+        with open(src, "rb") as f:
+            if encoding == "deflate":
+                with _deflate_to_spool(f) as body:
+                    stored_size = self.backend.put(key, body, metadata)
+            else:
+                stored_size = self.backend.put(key, f, metadata)
+        return StoredObject(key=key, size=size, stored_size=stored_size, encoding=encoding)
+
+    def stat(self, key: str) -> StoredObject | None:
+        meta = self.backend.head(key)
+        if meta is None:
+            return None
+        return StoredObject(
+            key=key,
+            size=int(meta["size"]),
+            stored_size=int(meta.get("stored_size", meta["size"])),
+            encoding=meta.get("encoding", "identity"),
+        )
+
+    def read(self, obj: StoredObject, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        """Yield the original bytes start..end (inclusive); compressed objects are inflated and skipped to `start`."""
+        if obj.encoding == "identity":
+            yield from self.backend.read(obj.key, start, end)
+            return
+
+        end = obj.size - 1 if end is None else end
+        decompressor = zlib.decompressobj()
+        position = 0
+        for chunk in self.backend.read(obj.key):
+            data = decompressor.decompress(chunk)
+            lo, hi = max(start - position, 0), min(end - position + 1, len(data))
+            if lo < hi:
+                yield data[lo:hi]
+            position += len(data)
+            if position > end:
+                return
+        tail = decompressor.flush()
+        lo, hi = max(start - position, 0), min(end - position + 1, len(tail))
+        if lo < hi:
+            yield tail[lo:hi]
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+
+def build_storage(backend: str = STORAGE_BACKEND) -> ArchiveStorage:
+    if backend == "local":
+        return ArchiveStorage(LocalBackend())
+    if backend == "s3":
+        return ArchiveStorage(S3Backend.from_env())
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+_storage: ArchiveStorage | None = None
+
+
+def get_storage() -> ArchiveStorage:
+    global _storage
+    if _storage is None:
+        _storage = build_storage()
+    return _storage
+
+
+def set_storage(storage: ArchiveStorage) -> None:
+    global _storage
+    _storage = storage
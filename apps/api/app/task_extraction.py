@@ -0,0 +1,229 @@
+import asyncio
+import calendar
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Iterator
+
+from dateutil import parser as date_parser
+
+from . import ai_service, metrics
+from .logs import log_event
+
+# Text -> tasks in two passes. A local pass (regexes + dateutil) flags the
+# lines that look like to-dos or deadlines; only notes with flagged lines go
+# to the model, and only those lines, many notes per call.
+TASK_EXTRACTION = os.getenv("TASK_EXTRACTION", "1") == "1"
+TASK_BATCH_NOTES = int(os.getenv("TASK_BATCH_NOTES", "20"))
+TASK_MAX_CANDIDATES = 12  # flagged lines sent per note
+TASK_MAX_LINE_CHARS = 300
+TASK_MAX_TITLE_CHARS = 200
+# 03.04.2025 and 03/04/2025: 3 April (True) or 4 March (False)
+TASK_DATE_DAYFIRST = os.getenv("TASK_DATE_DAYFIRST", "1") == "1"
+
+# A to-do on its own, date or not
+_STRONG_RE = re.compile(
+    r"^\s*(?:[-*]\s*)?\[\s?\]"  # unchecked checkbox
+    r"|\b(?:to-?do|remind me|remember to|don'?t forget|do not forget|deadline|asap|follow[- ]up|"
+    r"due(?!\s+to\b)|overdue)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Only a to-do when the line also has a date: "must" and "pay" alone are everywhere in contracts and receipts
+_ACTION_RE = re.compile(
+    r"\b(?:need(?:s)? to|ha(?:ve|s) to|must|should|please|make sure|until|"
+    r"pay|call|e-?mail|submit|send|book|renew|schedule|cancel|buy|pick up|sign|reply|return|register|"
+    r"meeting|appointment|interview|exam)\b",
+    re.IGNORECASE,
+)
+
+_ISO_DATE_RE = re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b")
+_NUMERIC_DATE_RE = re.compile(r"\b\d{1,2}([./])\d{1,2}\1(?:\d{4}|\d{2})\b")
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_ORDINAL = r"\d{1,2}(?:st|nd|rd|th)?"
+_MONTH_DATE_RE = re.compile(
+    rf"\b(?:{_ORDINAL}\s+(?:of\s+)?{_MONTHS}|{_MONTHS}\s+{_ORDINAL}\b)(?:,?\s+\d{{4}}\b)?",
+    re.IGNORECASE,
+)
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3}
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _in_n(match: re.Match, today: date) -> date:
+    amount = _NUMBER_WORDS.get(match[1].lower()) or int(match[1])
+    unit = match[2].lower()
+    if unit == "month":
+        return _add_months(today, amount)
+    return today + timedelta(days=amount * (7 if unit == "week" else 1))
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _weekday(match: re.Match, today: date) -> date:
+    # The coming one, never today: "on Friday" said on a Friday means next week
+    ahead = (_WEEKDAYS.index(match[1].lower()) - today.weekday()) % 7 or 7
+    return today + timedelta(days=ahead)
+
+
+def _month_end(match: re.Match, today: date) -> date:
+    return today.replace(day=calendar.monthrange(today.year, today.month)[1])
+
+
+_RELATIVE: list[tuple[re.Pattern, Callable[[re.Match, date], date]]] = [
+    (re.compile(r"\b(?:today|tonight)\b", re.I), lambda m, today: today),
+    (re.compile(r"\bday after tomorrow\b", re.I), lambda m, today: today + timedelta(days=2)),
+    (re.compile(r"\btomorrow\b", re.I), lambda m, today: today + timedelta(days=1)),
+    (re.compile(r"\bin (\d{1,3}|an?|one|two|three) (day|week|month)s?\b", re.I), _in_n),
+    (re.compile(r"\bnext week\b", re.I), lambda m, today: today + timedelta(days=7 - today.weekday())),
+    (re.compile(r"\b(?:end of (?:the )?month|month end)\b", re.I), _month_end),
+    (re.compile(rf"\b({'|'.join(_WEEKDAYS)})\b", re.I), _weekday),
+]
+
+
+def _parse_absolute(text: str, today: date, iso: bool = False) -> date | None:
+    default = datetime(today.year, today.month, today.day)
+    try:
+        parsed = date_parser.parse(text, default=default, dayfirst=TASK_DATE_DAYFIRST and not iso).date()
+    except (ValueError, OverflowError):
+        return None
+    if not re.search(r"\d{4}", text) and parsed < today:
+        # "March 3" means the next one; "29 Feb" in a year without one becomes the 28th
+        year = parsed.year + 1
+        parsed = parsed.replace(year=year, day=min(parsed.day, calendar.monthrange(year, parsed.month)[1]))
+    return parsed
+
+
+def parse_due(line: str, today: date) -> date | None:
+    """The first date mentioned in the line: absolute (2025-03-12, 12.03.2025, 3 March) or relative (next Friday)."""
+    found: list[tuple[int, date]] = []
+    for pattern, iso in ((_ISO_DATE_RE, True), (_NUMERIC_DATE_RE, False), (_MONTH_DATE_RE, False)):
+        for match in pattern.finditer(line):
+            parsed = _parse_absolute(match[0], today, iso=iso)
+            if parsed:
+                found.append((match.start(), parsed))
+    # "day after tomorrow" also contains "tomorrow": the earliest match wins
+    for pattern, resolve in _RELATIVE:
+        match = pattern.search(line)
+        if match:
+            found.append((match.start(), resolve(match, today)))
+    return min(found, key=lambda item: item[0])[1] if found else None
+
+
+@dataclass
+class Candidate:
+    line: str
+    due: date | None = None
+
+
+@dataclass
+class ExtractedTask:
+    index: int  # position of the source text in the extract_tasks() input
+    title: str
+    due_at: datetime | None = None
+
+
+def _lines(text: str) -> Iterator[str]:
+    for line in _SENTENCE_END_RE.split(text):
+        line = " ".join(line.split())
+        if len(line) >= 4:
+            yield line[:TASK_MAX_LINE_CHARS]
+
+
+def find_candidates(text: str, today: date | None = None) -> list[Candidate]:
+    """Lines that look like a to-do: an explicit marker, or an action with a date."""
+    today = today or date.today()
+    candidates = []
+    for line in _lines(text):
+        strong = _STRONG_RE.search(line) is not None
+        if not strong and not _ACTION_RE.search(line):
+            continue
+        due = parse_due(line, today)
+        if strong or due:
+            candidates.append(Candidate(line=line, due=due))
+            if len(candidates) == TASK_MAX_CANDIDATES:
+                break
+    return candidates
+
+
+def _parse_task(raw: dict, batch: list[int]) -> ExtractedTask | None:
+    note = raw.get("note")
+    title = raw.get("title")
+    if not isinstance(note, int) or not 1 <= note <= len(batch) or not isinstance(title, str) or not title.strip():
+        return None
+    due_at = None
+    if isinstance(raw.get("due"), str):
+        try:
+            due_at = date_parser.isoparse(raw["due"])
+        except ValueError:
+            pass
+        if due_at and due_at.tzinfo:
+            due_at = due_at.astimezone(timezone.utc).replace(tzinfo=None)  # stored naive UTC, like created_at
+    return ExtractedTask(index=batch[note - 1], title=title.strip()[:TASK_MAX_TITLE_CHARS], due_at=due_at)
+
+
+async def _extract_batch(batch: list[int], candidates: dict[int, list[Candidate]], today: date) -> list[ExtractedTask]:
+    notes = [
+        [(c.line, c.due.isoformat() if c.due else None) for c in candidates[i]]
+        for i in batch
+    ]
+    found = await ai_service.extract_tasks_async(notes, today.isoformat())
+    if found is None:
+        return []
+    tasks, seen = [], set()
+    for raw in found:
+        task = _parse_task(raw, batch) if isinstance(raw, dict) else None
+        if task and (task.index, task.title.lower()) not in seen:
+            seen.add((task.index, task.title.lower()))
+            tasks.append(task)
+    return tasks
+
+
+def _find_all_candidates(texts: list[str], today: date) -> dict[int, list[Candidate]]:
+    candidates = {}
+    for i, text in enumerate(texts):
+        try:
+            found = find_candidates(text, today) if text else []
+        except Exception as e:
+            # One odd note costs its own tasks, not the rest of the upload's
+            log_event("task_extraction_error", logging.WARNING, stage="rules", error=str(e))
+            found = []
+        metrics.TASK_EXTRACTION_NOTES.inc(result="flagged" if found else "skipped")
+        if found:
+            candidates[i] = found
+    return candidates
+
+
+async def extract_tasks(texts: list[str], today: date | None = None) -> list[ExtractedTask]:
+    """Tasks found in each text, tagged with the text's index.
+
+    Texts without a flagged line never reach the model; the rest go in
+    batches of TASK_BATCH_NOTES, one call per batch. Never raises: task
+    extraction must not fail an upload.
+    """
+    if not TASK_EXTRACTION:
+        return []
+    today = today or date.today()
+    # The rule pass is plain regex work over every note; keep it off the loop
+    candidates = await asyncio.to_thread(_find_all_candidates, texts, today)
+
+    flagged = list(candidates)
+    batches = [flagged[start:start + TASK_BATCH_NOTES] for start in range(0, len(flagged), TASK_BATCH_NOTES)]
+    results = await asyncio.gather(
+        *(_extract_batch(batch, candidates, today) for batch in batches),
+        return_exceptions=True,
+    )
+    tasks = []
+    for batch, result in zip(batches, results):
+        if isinstance(result, BaseException):
+            log_event("task_extraction_error", logging.WARNING, stage="model", notes=len(batch), error=str(result))
+        else:
+            tasks.extend(result)
+    log_event("task_extraction", notes=len(texts), flagged=len(flagged), batches=len(batches), tasks=len(tasks))
+    return tasks
@@ -0,0 +1,231 @@
+import asyncio
+import io
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+from . import ai_service, metrics
+from .logs import log_event
+
+SAMPLE_RATE = 16000
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "openai")  # openai | local
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", "3600"))
+# Chunks aim for TARGET seconds, cut at the quietest spot, and never exceed MAX seconds
+CHUNK_TARGET_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "60"))
+CHUNK_MAX_SECONDS = CHUNK_TARGET_SECONDS * 1.5
+FRAME_MS = 30
+SILENCE_DBFS = -40.0
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class TranscriptionBackend(Protocol):
+    async def transcribe_samples(self, samples: np.ndarray, rate: int) -> str: ...
+
+    async def transcribe_path(self, path: Path) -> str: ...
+
+
+def _read_wav(path: Path) -> tuple[np.ndarray, int]:
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise AudioDecodeError("Only 16-bit PCM WAV is supported without ffmpeg")
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+
+def _resample(samples: np.ndarray, rate: int, target: int) -> np.ndarray:
+    if rate == target or len(samples) == 0:
+        return samples
+    duration = len(samples) / rate
+    positions = np.linspace(0, len(samples) - 1, int(duration * target))
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+
+
+def decode_audio(path: Path) -> np.ndarray:
+    """Decode any audio file to 16 kHz mono int16 PCM (WAV natively, everything else via ffmpeg)."""
+    if path.suffix.lower() == ".wav":
+        samples, rate = _read_wav(path)
+        return _resample(samples, rate, SAMPLE_RATE)
+
+    if shutil.which("ffmpeg") is None:
+        raise AudioDecodeError(f"ffmpeg is required to decode {path.suffix} audio")
+    proc = subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", str(path),
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise AudioDecodeError(proc.stderr.decode("utf-8", "replace").strip())
+    return np.frombuffer(proc.stdout, dtype=np.int16)
+
+
+def probe_duration(path: Path) -> float | None:
+    """Length in seconds from the WAV header or ffprobe, without decoding; None if unknown."""
+    if path.suffix.lower() == ".wav":
+        try:
+            with wave.open(str(path), "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError, ZeroDivisionError):
+            return None
+
+    if shutil.which("ffprobe") is None:
+        return None
+    proc = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", str(path)],
+        capture_output=True,
+        check=False,
+    )
+    try:
+        return float(proc.stdout) if proc.returncode == 0 else None
+    except ValueError:
+        return None  # "N/A" for streams that don't state their length
+
+
+def _check_duration(duration: float) -> None:
+    if duration > MAX_AUDIO_SECONDS:
+        raise ValueError(f"Recording is {duration:.0f}s long; the limit is {MAX_AUDIO_SECONDS:.0f}s")
+
+
+def split_on_silence(
+    samples: np.ndarray,
+    rate: int = SAMPLE_RATE,
+    target_seconds: float = CHUNK_TARGET_SECONDS,
+    max_seconds: float = CHUNK_MAX_SECONDS,
+) -> list[tuple[int, int]]:
+    """Return (start, end) sample spans, cutting in the quietest frame near each target length.
+
+    Cuts are searched between half the target and `max_seconds` into the
+    current chunk, so words are only split when a chunk has no pause at all.
+    """
+    frame = max(1, rate * FRAME_MS // 1000)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0, len(samples))] if len(samples) else []
+
+    frames = samples[: n_frames * frame].astype(np.float32).reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    dbfs = 20 * np.log10(np.maximum(rms, 1e-9) / 32768.0)
+
+    target = int(target_seconds * rate / frame)
+    longest = int(max_seconds * rate / frame)
+    spans = []
+    start = 0
+    while n_frames - start > longest:
+        lo, hi = start + max(1, target // 2), min(start + longest, n_frames)
+        window = dbfs[lo:hi]
+        quiet = np.flatnonzero(window <= SILENCE_DBFS)
+        if len(quiet):
+            # Middle of the silent frame closest to the target length
+            cut = lo + int(quiet[np.argmin(np.abs(quiet + lo - (start + target)))])
+        else:
+            cut = lo + int(np.argmin(window))
+        spans.append((start * frame, cut * frame))
+        start = cut
+    spans.append((start * frame, len(samples)))
+    return spans
+
+
+def encode_wav(samples: np.ndarray, rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+class OpenAIBackend:
+    """Whisper API; chunks are uploaded as small WAV files, concurrently."""
+
+    async def transcribe_samples(self, samples: np.ndarray, rate: int) -> str:
+        audio = ("chunk.wav", encode_wav(samples, rate), "audio/wav")
+        with metrics.timed("transcribe", "whisper-1"):
+            transcript = await ai_service._call_with_retries(
+                lambda: ai_service.get_async_client().audio.transcriptions.create(model="whisper-1", file=audio)
+            )
+        return transcript.text
+
+    async def transcribe_path(self, path: Path) -> str:
+        return await ai_service.transcribe_audio_async(str(path))
+
+
+class LocalWhisperBackend:
+    """CPU transcription with faster-whisper (optional dependency), no network."""
+
+    def __init__(self, model_size: str = os.getenv("LOCAL_WHISPER_MODEL", "base")):
+        self.model_size = model_size
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            from faster_whisper import WhisperModel
+
+            self._model = WhisperModel(self.model_size, device="cpu", compute_type="int8")
+        return self._model
+
+    def _run(self, audio) -> str:
+        segments, _ = self._get_model().transcribe(audio)
+        return " ".join(segment.text.strip() for segment in segments)
+
+    async def transcribe_samples(self, samples: np.ndarray, rate: int) -> str:
+        audio = _resample(samples, rate, SAMPLE_RATE).astype(np.float32) / 32768.0
+        return await asyncio.to_thread(self._run, audio)
+
+    async def transcribe_path(self, path: Path) -> str:
+        return await asyncio.to_thread(self._run, str(path))
+
+
+def get_backend(name: str = TRANSCRIBE_BACKEND) -> TranscriptionBackend:
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "local":
+        return LocalWhisperBackend()
+    raise ValueError(f"Unknown transcription backend: {name}")
+
+
+async def transcribe(path: Path, backend: TranscriptionBackend | None = None) -> str:
+    """Split on silence, transcribe the chunks concurrently and stitch them in order.
+
+    Audio that cannot be decoded here (e.g. .ogg without ffmpeg) is sent
+    whole, which is what the backend would have done before chunking.
+    """
+    backend = backend or get_backend()
+    # An overlong recording is turned away before it is decoded into memory
+    declared = await asyncio.to_thread(probe_duration, path)
+    if declared is not None:
+        _check_duration(declared)
+    try:
+        samples = await asyncio.to_thread(decode_audio, path)
+    except AudioDecodeError as e:
+        log_event("audio_decode_failed", logging.WARNING, file=path.name, error=str(e))
+        return await backend.transcribe_path(path)
+
+    # Headers can lie, and some formats have none
+    _check_duration(len(samples) / SAMPLE_RATE)
+
+    spans = split_on_silence(samples)
+    semaphore = asyncio.Semaphore(TRANSCRIBE_CONCURRENCY)
+
+    async def run(start: int, end: int) -> str:
+        async with semaphore:
+            return await backend.transcribe_samples(samples[start:end], SAMPLE_RATE)
+
+    with metrics.timed("transcribe", "recording"):
+        texts = await asyncio.gather(*(run(start, end) for start, end in spans))
+    return " ".join(text.strip() for text in texts if text and text.strip())
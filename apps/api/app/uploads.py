@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+
+from . import metrics
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_MB", "50")) * 1024 * 1024
+MAX_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "200")) * 1024 * 1024
+INCOMING_DIR = Path(os.getenv("INCOMING_DIR", "data/incoming"))
+# Directory shared with the bot when both run on one host (see /attachments/shared)
+SHARED_STORAGE_DIR = Path(os.getenv("SHARED_STORAGE_DIR", "data/shared"))
+# Multipart boundaries and part headers, on top of the file bytes themselves
+FORM_OVERHEAD_BYTES = 64 * 1024
+# Largest body each upload route accepts, checked on Content-Length before the body is read
+_BODY_LIMITS = {"/attachments": lambda: MAX_REQUEST_BYTES, "/transcribe": lambda: MAX_FILE_BYTES}
+
+
+@dataclass
+class StreamedFile:
+    path: Path
+    size: int
+    sha256: str
+
+
+class RequestBudget:
+    """Byte allowance shared by all files of one request."""
+
+    def __init__(self, max_bytes: int = MAX_REQUEST_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    def consume(self, n: int) -> None:
+        self.used += n
+        if self.used > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload exceeds the per-request limit of {self.max_bytes} bytes",
+            )
+
+
+def oversized_body(path: str, headers) -> int | None:
+    """The limit a request's declared Content-Length exceeds, if any.
+
+    Starlette spools a whole multipart body to temp files before the
+    endpoint runs, so this is the only check that keeps an oversized
+    upload off the disk. A body sent without Content-Length (chunked)
+    is still spooled and only caught by stream_to_disk().
+    """
+    limit = _BODY_LIMITS.get(path)
+    declared = headers.get("content-length", "")
+    if limit is None or not declared.isdigit():
+        return None
+    max_bytes = limit() + FORM_OVERHEAD_BYTES
+    return max_bytes if int(declared) > max_bytes else None
+
+
+async def stream_to_disk(
+    upload: UploadFile,
+    dest_dir: Path | None = None,
+    max_bytes: int | None = None,
+    budget: RequestBudget | None = None,
+    suffix: str = ".part",
+) -> StreamedFile:
+    """Copy an upload to a temp file chunk by chunk, hashing as it goes.
+
+    At most one chunk is held in memory. Limits are checked per chunk, so an
+    oversized file is rejected (413) as soon as it crosses the limit and the
+    partial file is removed. By then Starlette has already spooled the body:
+    these limits bound what is hashed and kept in INCOMING_DIR, while
+    oversized_body() is what rejects a large upload before it is read.
+    """
+    dest_dir = dest_dir or INCOMING_DIR
+    max_bytes = max_bytes or MAX_FILE_BYTES
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    path = dest_dir / f".{uuid.uuid4()}{suffix}"
+    digest = hashlib.sha256()
+    size = 0
+    kind = Path(upload.filename or "").suffix.lower()
+    try:
+        with metrics.timed("upload_write", kind), open(path, "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"{upload.filename} exceeds the per-file limit of {max_bytes} bytes",
+                    )
+                if budget is not None:
+                    budget.consume(len(chunk))
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return StreamedFile(path=path, size=size, sha256=digest.hexdigest())
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+import numpy as np
+
+from .embeddings import Embedder, get_embedder
+
+VECTOR_DIR = Path(os.getenv("VECTOR_INDEX_DIR", "data/vectors"))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+VECTOR_CACHE_USERS = int(os.getenv("VECTOR_CACHE_USERS", "64"))  # users whose metadata stays parsed in memory
+
+
+@dataclass
+class Chunk:
+    note_id: int
+    start: int
+    end: int
+    text: str
+    score: float = 0.0
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[tuple[int, int]]:
+    """Split text into overlapping (start, end) windows, preferring to cut at whitespace."""
+    spans: list[tuple[int, int]] = []
+    length = len(text)
+    start = 0
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            cut = text.rfind(" ", start + size // 2, end)
+            if cut != -1:
+                end = cut
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+@dataclass
+class Embedded:
+    """One section's chunks and their vectors, ready to append once the note has an id."""
+    chunks: list[Chunk]
+    vectors: np.ndarray
+
+
+@dataclass(frozen=True)
+class _Commit:
+    """How much of a user's matrix and metadata files is complete; `epoch` changes when the files are recreated."""
+    epoch: str = ""
+    rows: int = 0
+    meta_bytes: int = 0
+
+
+class VectorIndex:
+    """Per-user cosine index: an append-only float32 matrix plus a .jsonl of chunk metadata.
+
+    `<user>.f32` holds one raw row per chunk and `<user>.jsonl` one line per
+    row; both only ever grow. `<user>.json` records how many rows and
+    metadata bytes are complete. It is replaced atomically after both
+    appends, and it is the only place the row count lives. Readers never
+    look past it, and the next add() truncates whatever an interrupted
+    write left behind.
+
+    Matrices are opened memory-mapped, so a search only pages in what the
+    dot product touches. Parsed metadata is kept for the `max_users` most
+    recently searched users. Files live under `<root>/<embedder name>/` so
+    switching embedders never mixes incompatible vectors.
+    """
+
+    def __init__(self, root: Path = VECTOR_DIR, embedder: Embedder | None = None, max_users: int = VECTOR_CACHE_USERS):
+        self.embedder = embedder or get_embedder()
+        self.root = Path(root) / self.embedder.name
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        # user_id -> (commit, matrix, metadata), least recently used first
+        self._cache: OrderedDict[int, tuple[_Commit, np.ndarray, list[dict]]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _paths(self, user_id: int) -> tuple[Path, Path, Path]:
+        return self.root / f"{user_id}.f32", self.root / f"{user_id}.jsonl", self.root / f"{user_id}.json"
+
+    def _read_commit(self, user_id: int) -> _Commit:
+        commit_path = self._paths(user_id)[2]
+        try:
+            with open(commit_path, encoding="utf-8") as f:
+                return _Commit(**json.load(f))
+        except FileNotFoundError:
+            return _Commit()
+
+    def _write_commit(self, user_id: int, commit: _Commit) -> None:
+        commit_path = self._paths(user_id)[2]
+        tmp_path = commit_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(asdict(commit)), encoding="utf-8")
+        os.replace(tmp_path, commit_path)
+
+    def _load(self, user_id: int) -> tuple[np.ndarray, list[dict]] | None:
+        commit = self._read_commit(user_id)
+        if commit.rows == 0:
+            return None
+        with self._cache_lock:
+            cached = self._cache.get(user_id)
+            if cached and cached[0] == commit:
+                self._cache.move_to_end(user_id)
+                return cached[1], cached[2]
+        matrix_path, meta_path, _ = self._paths(user_id)
+        # Same files, more rows: only the new metadata lines need parsing
+        grown = cached is not None and cached[0].epoch == commit.epoch and cached[0].rows < commit.rows
+        meta = list(cached[2]) if grown else []
+        offset = cached[0].meta_bytes if grown else 0
+        try:
+            matrix = np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(commit.rows, self.embedder.dim))
+            with open(meta_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(commit.meta_bytes - offset)
+        except FileNotFoundError:
+            return None  # deleted since the commit record was read
+        meta.extend(json.loads(line) for line in data.splitlines())
+        with self._cache_lock:
+            self._cache[user_id] = (commit, matrix, meta)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        return matrix, meta
+
+    def embed(self, text: str, offset: int = 0) -> Embedded:
+        """Chunk and embed one section of a note; `offset` is where it starts in the note's text."""
+        chunks = [Chunk(note_id=0, start=offset + s, end=offset + e, text=text[s:e]) for s, e in chunk_text(text)]
+        if not chunks:
+            return Embedded(chunks=[], vectors=np.empty((0, self.embedder.dim), dtype=np.float32))
+        return Embedded(chunks=chunks, vectors=self.embedder.embed([c.text for c in chunks]))
+
+    def add(self, user_id: int, note_id: int, text: str) -> int:
+        """Chunk and embed a note's text, appending it to the user's index."""
+        return self.append(user_id, note_id, [self.embed(text)])
+
+    def append(self, user_id: int, note_id: int, sections: list[Embedded]) -> int:
+        """Append a note's embedded sections to the user's index, in order."""
+        chunks = [replace(chunk, note_id=note_id) for section in sections for chunk in section.chunks]
+        if not chunks:
+            return 0
+        vectors = np.ascontiguousarray(
+            np.concatenate([section.vectors for section in sections if section.chunks]), dtype=np.float32
+        )
+        records = []
+        for chunk in chunks:
+            record = asdict(chunk)
+            record.pop("score")
+            records.append(json.dumps(record) + "\n")
+        lines = "".join(records).encode("utf-8")
+
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            matrix_path, meta_path, _ = self._paths(user_id)
+            commit = self._read_commit(user_id)
+            if commit.rows == 0:
+                commit = _Commit(epoch=uuid.uuid4().hex)
+            committed_matrix_bytes = commit.rows * self.embedder.dim * vectors.itemsize
+            for path, committed, data in (
+                (matrix_path, committed_matrix_bytes, vectors.tobytes()),
+                (meta_path, commit.meta_bytes, lines),
+            ):
+                with open(path, "ab") as f:
+                    f.truncate(committed)  # drop the tail of a write that never committed
+                    f.write(data)
+            self._write_commit(user_id, replace(
+                commit, rows=commit.rows + len(chunks), meta_bytes=commit.meta_bytes + len(lines)
+            ))
+        return len(chunks)
+
+    def has_note(self, user_id: int, note_id: int) -> bool:
+        loaded = self._load(user_id)
+        return loaded is not None and any(record["note_id"] == note_id for record in loaded[1])
+
+    def search(self, user_id: int, query: str, k: int = 5, min_score: float = 0.0) -> list[Chunk]:
+        """Return the top-k chunks by cosine similarity, best first."""
+        loaded = self._load(user_id)
+        if loaded is None or not query.strip():
+            return []
+        matrix, meta = loaded
+        q = self.embedder.embed([query])[0]
+        scores = np.asarray(matrix @ q)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Chunk(**meta[i], score=float(scores[i]))
+            for i in top
+            if scores[i] > min_score
+        ]
+
+    def delete_user(self, user_id: int) -> None:
+        with self._lock:
+            # Commit record first: readers then see an empty index, never a half-deleted one
+            for path in self._paths(user_id)[::-1]:
+                path.unlink(missing_ok=True)
+            with self._cache_lock:
+                self._cache.pop(user_id, None)
+
+
+_index: VectorIndex | None = None
+
+
+def get_index() -> VectorIndex:
+    global _index
+    if _index is None:
+        _index = VectorIndex()
+    return _index
@@ -0,0 +1,155 @@
+import asyncio
+import contextvars
+import json as json_lib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable
+
+import aiohttp
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+
+# Statuses worth retrying: the API is restarting or overloaded
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "DELETE", "PUT"}
+
+# Set per Telegram update (see run_bot) and sent as X-Request-ID, so the API's
+# logs for everything one message caused share an id with the bot's.
+REQUEST_ID_HEADER = "X-Request-ID"
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+
+
+def _with_request_id(headers: dict | None) -> dict:
+    return {REQUEST_ID_HEADER: request_id.get() or uuid.uuid4().hex[:16], **(headers or {})}
+
+
+@dataclass
+class ApiResponse:
+    status: int
+    data: Any
+    text: str
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+class ApiClient:
+    """Shared async client for the API: one pooled keep-alive session for the whole bot.
+
+    Concurrency is capped with a semaphore so a burst of Telegram updates
+    can't open unbounded connections. Transient failures are retried with
+    exponential backoff; non-idempotent requests (uploads, /chat) are only
+    retried when the connection could not be established at all, so they
+    are never sent twice.
+    """
+
+    def __init__(
+        self,
+        base_url: str = API_URL,
+        timeout: float = float(os.getenv("API_TIMEOUT", "120")),
+        connect_timeout: float = 5.0,
+        max_connections: int = int(os.getenv("API_MAX_CONNECTIONS", "32")),
+        max_concurrency: int = int(os.getenv("API_MAX_CONCURRENCY", "32")),
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict | None = None,
+        json: Any = None,
+        data: Callable[[], Any] | None = None,
+        headers: dict | None = None,
+    ) -> ApiResponse:
+        """Send a request; `data` is a factory so the body can be rebuilt for a retry."""
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        url = f"{self.base_url}{path}"
+        headers = _with_request_id(headers)
+
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                try:
+                    async with self._get_session().request(
+                        method,
+                        url,
+                        params=params,
+                        json=json,
+                        data=data() if data else None,
+                        headers=headers,
+                    ) as resp:
+                        if resp.status in RETRY_STATUSES and idempotent and not last_attempt:
+                            await asyncio.sleep(self.backoff * 2 ** attempt)
+                            continue
+                        text = await resp.text()
+                        body = None
+                        if resp.content_type == "application/json":
+                            body = await resp.json()
+                        return ApiResponse(status=resp.status, data=body, text=text)
+                except aiohttp.ClientConnectorError:
+                    if last_attempt:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if last_attempt or not idempotent:
+                        raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        raise RuntimeError("unreachable")
+
+    async def stream_events(self, path: str, *, json: Any = None) -> AsyncIterator[tuple[str, Any]]:
+        """POST and yield Server-Sent Events as (event, decoded JSON data) pairs.
+
+        Not retried: a stream that fails midway has already been shown to the user.
+        """
+        async with self._semaphore:
+            async with self._get_session().post(
+                f"{self.base_url}{path}",
+                json=json,
+                headers=_with_request_id({"Accept": "text/event-stream"}),
+            ) as resp:
+                resp.raise_for_status()
+                event, data_lines = "message", []
+                async for raw in resp.content:
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[len("data:"):].strip())
+                    elif not line and data_lines:
+                        yield event, json_lib.loads("\n".join(data_lines))
+                        event, data_lines = "message", []
+
+    async def get(self, path: str, **kwargs: Any) -> ApiResponse:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> ApiResponse:
+        return await self.request("POST", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs: Any) -> ApiResponse:
+        return await self.request("DELETE", path, **kwargs)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+api = ApiClient()
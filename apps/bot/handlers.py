@@ -1,15 +1,91 @@
+import asyncio
 import os
-import requests
 import uuid
-from aiogram import Router, F
+from pathlib import Path
+import aiohttp
+from aiohttp.payload import AsyncIterablePayload
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.types import Message
 
+from apps.bot.api_client import api
+
 # Initialize the Router
 router = Router()
 
-# API URL
-API_URL = "http://127.0.0.1:8000"
+# How attachments reach the API:
+#   "stream" - pipe the Telegram download straight into the API upload (no temp file)
+#   "shared" - bot and API share a host: hand over a path in SHARED_STORAGE_DIR
+INGEST_MODE = os.getenv("BOT_INGEST_MODE", "stream")
+SHARED_STORAGE_DIR = Path(os.getenv("SHARED_STORAGE_DIR", "data/shared"))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Streaming answers: Telegram rate-limits edits, so update the message at most this often
+STREAM_EDIT_INTERVAL = 1.0
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Uploads are processed in the background; poll the job until it finishes
+JOB_POLL_INTERVAL = 1.0
+JOB_POLL_TIMEOUT = 180.0
+
+
+async def wait_for_job(job_id: str) -> dict | None:
+    """Poll /jobs/{id} until the job is done or failed; None on timeout."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + JOB_POLL_TIMEOUT
+    while loop.time() < deadline:
+        response = await api.get(f"/jobs/{job_id}")
+        if response.status == 200:
+            job = response.data
+            if job["status"] in ("done", "failed"):
+                return job
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+    return None
+
+
+async def upload_streamed(bot: Bot, file_path: str, endpoint: str, filename: str,
+                          content_type: str, params: dict | None):
+    """Relay the Telegram download to the API chunk by chunk, never touching the disk."""
+    # /attachments takes a list under "files", /transcribe a single "file"
+    field = "files" if endpoint == "attachments" else "file"
+
+    def build_form() -> aiohttp.FormData:
+        # Called per attempt, so a retried upload restarts the download
+        stream = bot.session.stream_content(
+            url=bot.session.api.file_url(bot.token, file_path),
+            chunk_size=DOWNLOAD_CHUNK_SIZE,
+            raise_for_status=True,
+        )
+        form = aiohttp.FormData()
+        form.add_field(field, AsyncIterablePayload(stream), filename=filename, content_type=content_type)
+        return form
+
+    return await api.post(f"/{endpoint}", params=params, data=build_form)
+
+
+async def handoff_shared(bot: Bot, file_path: str, filename: str, content_type: str, user_id: int):
+    """Give the API a path in shared storage; it hard-links or moves the file instead of copying."""
+    if bot.session.api.is_local:
+        # A local Bot API server already has the file on this host
+        local_path = Path(bot.session.api.wrap_local_file.to_local(file_path))
+        move = False
+    else:
+        SHARED_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+        local_path = SHARED_STORAGE_DIR / f"{uuid.uuid4()}{Path(filename).suffix}"
+        await bot.download_file(file_path, local_path)
+        move = True
+
+    payload = {
+        "user_id": user_id,
+        "move": move,
+        "files": [{"path": str(local_path.resolve()), "filename": filename, "content_type": content_type}],
+    }
+    try:
+        return await api.post("/attachments/shared", json=payload)
+    finally:
+        if move and local_path.exists():
+            local_path.unlink()
 
 
 # ---------------------------------------------------------
@@ -21,9 +97,9 @@ async def handle_clear(message: Message):
     await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
 
     try:
-        response = requests.delete(f"{API_URL}/notes?user_id={user_id}")
-        if response.status_code == 200:
-            data = response.json()
+        response = await api.delete("/notes", params={"user_id": user_id})
+        if response.status == 200:
+            data = response.data
             # This will confirm exactly how many were deleted
             await message.answer(f"🧹 {data.get('message', 'Cleared!')}")
         else:
@@ -74,53 +150,47 @@ async def handle_files(message: Message):
     action = "typing" if endpoint == "transcribe" else "upload_document"
     await message.bot.send_chat_action(chat_id=message.chat.id, action=action)
 
-    # 2. DOWNLOAD & PROCESS
-    temp_path = f"data/files/{filename}"
-    os.makedirs("data/files", exist_ok=True)
-
+    # 2. HAND THE FILE TO THE API
     try:
-        # Download from Telegram
         file_info = await message.bot.get_file(file_id)
-        await message.bot.download_file(file_info.file_path, temp_path)
-
-        api_url = f"{API_URL}/{endpoint}"
-        if endpoint == "attachments":
-            api_url += f"?user_id={user_id}"
 
-        # 3. UPLOAD TO API
-        with open(temp_path, "rb") as f:
-            # CRITICAL FIX: The key here must be "files" (plural) to match your API
-            files_payload = {"files": (filename, f, content_type)}
-
-            response = requests.post(api_url, files=files_payload)
+        if endpoint == "attachments" and INGEST_MODE == "shared":
+            response = await handoff_shared(message.bot, file_info.file_path, filename, content_type, user_id)
+        else:
+            params = {"user_id": user_id} if endpoint == "attachments" else None
+            response = await upload_streamed(
+                message.bot, file_info.file_path, endpoint, filename, content_type, params
+            )
 
-            if response.status_code == 200:
-                data = response.json()
+        if response.ok:
+            data = response.data
 
-                # Case A: Voice Transcription
-                if endpoint == "transcribe":
-                    text = data.get("text", "")
-                    await message.reply(f"🎤 **Transcribed:** \"{text}\"")
-                    # Auto-send to Chat
-                    chat_payload = {"question": text, "user_id": user_id}
-                    chat_resp = requests.post(f"{API_URL}/chat", json=chat_payload)
-                    await message.answer(chat_resp.json())
+            # Case A: Voice Transcription
+            if endpoint == "transcribe":
+                text = data.get("text", "")
+                await message.reply(f"🎤 **Transcribed:** \"{text}\"")
+                # Auto-send to Chat
+                chat_payload = {"question": text, "user_id": user_id}
+                chat_resp = await api.post("/chat", json=chat_payload)
+                await message.answer(chat_resp.data)
 
-                # Case B: Document/Photo Upload
-                else:
-                    summary = data.get("summary", "Saved successfully.")
-                    await message.reply(f"📄 **Saved!**\n\n{summary}")
+            # Case B: Document/Photo Upload
             else:
-                await message.reply(f"❌ API Error {response.status_code}: {response.text}")
+                await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
+                job = await wait_for_job(data["job_id"])
+                if job is None:
+                    await message.reply("⏳ Still processing, it will be searchable soon.")
+                elif job["status"] == "done":
+                    summary = job["files"][0].get("summary") or "Saved successfully."
+                    await message.reply(f"📄 **Saved!**\n\n{summary}")
+                else:
+                    await message.reply(f"❌ Processing failed: {job.get('error')}")
+        else:
+            await message.reply(f"❌ API Error {response.status}: {response.text}")
 
     except Exception as e:
         await message.answer(f"❌ Error: {str(e)}")
 
-    finally:
-        # Cleanup
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
 
 # ---------------------------------------------------------
 # 3. TEXT CHAT
@@ -130,15 +200,63 @@ async def handle_text(message: Message):
     if message.text.startswith("/"): return  # Ignore other commands
 
     await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
+    payload = {"question": message.text, "user_id": message.from_user.id}
 
     try:
-        payload = {"question": message.text, "user_id": message.from_user.id}
-        response = requests.post(f"{API_URL}/chat", json=payload)
+        await stream_answer(message, payload)
+    except Exception:
+        # Streaming unavailable: fall back to the one-shot endpoint
+        try:
+            response = await api.post("/chat", json=payload)
 
-        if response.status_code == 200:
-            await message.answer(response.json())
-        else:
-            await message.answer("⚠️ Brain offline.")
+            if response.status == 200:
+                await message.answer(response.data)
+            else:
+                await message.answer("⚠️ Brain offline.")
 
-    except Exception as e:
-        await message.answer(f"Connection Error: {e}")
\ No newline at end of file
+        except Exception as e:
+            await message.answer(f"Connection Error: {e}")
+
+
+async def stream_answer(message: Message, payload: dict) -> None:
+    """Show the answer while it is generated by editing one message, at most once per interval."""
+    reply: Message | None = None
+    text = ""
+    shown = ""
+    loop = asyncio.get_running_loop()
+    last_edit = 0.0
+
+    try:
+        async for event, data in api.stream_events("/chat/stream", json=payload):
+            if event == "done":
+                break
+            text += data
+            if reply is None:
+                # First token: this is the time-to-first-token the user sees
+                reply = await message.answer(text[:TELEGRAM_MESSAGE_LIMIT])
+                shown, last_edit = text, loop.time()
+            elif loop.time() - last_edit >= STREAM_EDIT_INTERVAL and len(shown) < TELEGRAM_MESSAGE_LIMIT:
+                shown = await _edit(reply, text)
+                last_edit = loop.time()
+    except Exception:
+        if reply is None:
+            raise  # nothing shown yet; the caller can still fall back
+        text += "\n\n⚠️ Answer interrupted."
+
+    if reply is None:
+        await message.answer(text or "🤷 No answer.")
+        return
+    if shown != text:
+        shown = await _edit(reply, text)
+    # Anything past Telegram's message size limit goes out as follow-up messages
+    for start in range(TELEGRAM_MESSAGE_LIMIT, len(text), TELEGRAM_MESSAGE_LIMIT):
+        await message.answer(text[start:start + TELEGRAM_MESSAGE_LIMIT])
+
+
+async def _edit(reply: Message, text: str) -> str:
+    visible = text[:TELEGRAM_MESSAGE_LIMIT]
+    try:
+        await reply.edit_text(visible)
+    except TelegramBadRequest:
+        pass  # e.g. "message is not modified"
+    return text
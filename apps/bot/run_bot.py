@@ -1,15 +1,23 @@
 import asyncio
 import logging
 import os
+import uuid
 from aiogram import Bot, Dispatcher
 from dotenv import load_dotenv
 
 # Import the unified router
 from apps.bot.handlers import router
+from apps.bot.api_client import api, request_id
 
 load_dotenv()
 
 
+async def tag_update(handler, event, data):
+    # Every API call made while handling this update carries the same request id
+    request_id.set(f"tg{event.update_id}-{uuid.uuid4().hex[:6]}")
+    return await handler(event, data)
+
+
 async def main():
     logging.basicConfig(level=logging.INFO)
 
@@ -24,6 +32,8 @@ async def main():
 
     # 2. Register the Router (The ONLY brain)
     dp.include_router(router)
+    dp.update.outer_middleware(tag_update)
+    dp.shutdown.register(api.close)
 
     # 3. Launch
     await bot.delete_webhook(drop_pending_updates=True)
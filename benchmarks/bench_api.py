@@ -0,0 +1,204 @@
+"""Throughput and latency of the API's hot paths, offline and reproducible.
+
+Runs the FastAPI app in-process (httpx ASGI transport) against a throwaway
+data directory, a generated corpus and a fake OpenAI client, then fires
+--requests calls per scenario at --concurrency:
+
+    attachments  POST /attachments, one corpus file per call. The in-process
+                 transport returns after background tasks finish, so this
+                 is upload + extraction + summary + indexing end to end.
+    search       GET /notes/search for vocabulary words
+    chat         POST /chat (vector/FTS context + fake model)
+    tasks        GET /tasks first pages over --tasks tasks per user
+
+Prints one JSON report. With --baseline, p95 latency and throughput are
+compared against a stored report and the exit status is 1 on regression:
+
+    python -m benchmarks.bench_api --requests 100 --concurrency 8 --save-baseline bench.json
+    python -m benchmarks.bench_api --requests 100 --concurrency 8 --baseline bench.json
+
+Image OCR needs the tesseract binary; without it images ingest as empty text.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCENARIOS = ("attachments", "search", "chat", "tasks")
+
+
+def _configure_env(root: Path, llm_cache: str) -> None:
+    # Must run before the app is imported: these are read at import time
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{root / 'app.db'}",
+        "BLOB_DIR": str(root / "blobs"),
+        "ARCHIVE_DIR": str(root / "archive"),
+        "INCOMING_DIR": str(root / "incoming"),
+        "VECTOR_INDEX_DIR": str(root / "vectors"),
+        "LLM_CACHE_BACKEND": llm_cache,
+        "LLM_CACHE_PATH": str(root / "llm_cache.db"),
+        "OCR_CACHE_PATH": str(root / "ocr_cache.db"),
+        "LOG_LEVEL": "WARNING",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "offline"),
+    })
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run_scenario(make_request, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(i)
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run(args: argparse.Namespace, root: Path) -> dict:
+    import httpx
+
+    from benchmarks import corpus, fake_openai
+
+    from apps.api.app import crud, ingest, migrations, schemas
+    from apps.api.app.db import SessionLocal, engine
+    from apps.api.app.main import app
+
+    # The ASGI transport doesn't run the lifespan hook, so set the schema up here
+    migrations.migrate(engine)  # logs through log_event, which _configure_env set to WARNING
+    fake_openai.install(latency=args.llm_latency)
+
+    files = corpus.build_corpus(
+        root / "corpus", pdfs=args.pdfs, images=args.images, docxs=args.docx, pdf_pages=args.pdf_pages
+    )
+    rng = random.Random(args.seed)
+    users = list(range(1, args.users + 1))
+    with SessionLocal() as db:
+        for user_id in users:
+            crud.create_tasks_bulk(db, [
+                schemas.TaskCreate(user_id=user_id, title=corpus.sentence(rng, 6), due_at=None)
+                for _ in range(args.tasks)
+            ])
+
+    report = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def upload(i: int):
+            path = files[i % len(files)]
+            return await client.post(
+                "/attachments",
+                params={"user_id": users[i % len(users)]},
+                files={"files": (path.name, path.read_bytes())},
+            )
+
+        async def search(i: int):
+            return await client.get(
+                "/notes/search", params={"q": corpus.VOCABULARY[i % len(corpus.VOCABULARY)], "user_id": users[i % len(users)]}
+            )
+
+        async def chat(i: int):
+            question = f"How much was the {corpus.VOCABULARY[i % len(corpus.VOCABULARY)]}?"
+            return await client.post("/chat", json={"user_id": users[i % len(users)], "question": question})
+
+        async def tasks(i: int):
+            return await client.get("/tasks", params={"user_id": users[i % len(users)], "limit": 50})
+
+        handlers = {"attachments": upload, "search": search, "chat": chat, "tasks": tasks}
+        # Uploads first, so search and chat run against an ingested corpus
+        for name in SCENARIOS:
+            if name in args.scenarios:
+                report[name] = await run_scenario(handlers[name], args.requests, args.concurrency)
+    ingest.shutdown()
+    return report
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Scenarios whose p95 grew, or whose throughput fell, by more than `tolerance`."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+        if base["throughput_rps"] and result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {result['throughput_rps']} rps")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--pdfs", type=int, default=10)
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--docx", type=int, default=10)
+    parser.add_argument("--pdf-pages", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=1000, help="tasks seeded per user")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake model call")
+    parser.add_argument("--llm-cache", choices=("none", "memory", "tiered"), default="none")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", type=Path, help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--save-baseline", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _configure_env(root, args.llm_cache)
+        scenarios = asyncio.run(run(args, root))
+
+    report = {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+                   if k not in ("baseline", "save_baseline")},
+        "python": platform.python_version(),
+        "scenarios": scenarios,
+    }
+    if args.baseline:
+        report["regressions"] = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Messages/sec the bot can push through the API: blocking `requests` vs the pooled async client.
+
+Starts a local stub of the API (every /chat call takes --latency seconds)
+and fires --messages concurrent "handle_text" calls both ways.
+
+    python -m benchmarks.bench_bot_client --messages 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+from apps.bot.api_client import ApiClient
+
+
+def _start_stub(latency: float) -> tuple[asyncio.AbstractEventLoop, str]:
+    """Run the stub API on its own loop/thread, so a blocking client can't stall it."""
+
+    async def chat(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response("stub answer")
+
+    loop = asyncio.new_event_loop()
+    started: "queue.Queue[str]" = queue.Queue()
+
+    async def serve() -> None:
+        app = web.Application()
+        app.router.add_post("/chat", chat)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        started.put(f"http://127.0.0.1:{port}")
+
+    def target() -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve())
+        loop.run_forever()
+
+    threading.Thread(target=target, daemon=True).start()
+    return loop, started.get(timeout=10)
+
+
+async def _blocking_handler(base_url: str, i: int) -> None:
+    # What handle_text used to do: a blocking call inside the coroutine
+    requests.post(f"{base_url}/chat", json={"question": f"q{i}", "user_id": i})
+
+
+async def _async_handler(client: ApiClient, i: int) -> None:
+    await client.post("/chat", json={"question": f"q{i}", "user_id": i})
+
+
+async def run(messages: int, latency: float) -> dict:
+    loop, base_url = _start_stub(latency)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(_blocking_handler(base_url, i) for i in range(messages)))
+        blocking = time.perf_counter() - start
+
+        client = ApiClient(base_url=base_url)
+        start = time.perf_counter()
+        await asyncio.gather(*(_async_handler(client, i) for i in range(messages)))
+        pooled = time.perf_counter() - start
+        await client.close()
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+    return {
+        "messages": messages,
+        "stub_latency_s": latency,
+        "blocking_requests_msgs_per_s": round(messages / blocking, 1),
+        "async_client_msgs_per_s": round(messages / pooled, 1),
+        "speedup": round(blocking / pooled, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.messages, args.latency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
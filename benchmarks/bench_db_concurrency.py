@@ -0,0 +1,121 @@
+"""Hammer crud.create_note and crud.search_notes from many threads.
+
+Runs the same workload against a plain SQLite engine (the old db.py setup)
+and the tuned engine from db.create_db_engine (WAL, pragmas, pool), each on
+a fresh temp database, and prints throughput, latency percentiles and
+"database is locked" errors as JSON.
+
+    python -m benchmarks.bench_db_concurrency --writers 8 --readers 8 --ops 200
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from apps.api.app import crud, schemas, search_index  # noqa: F401  (registers the FTS index)
+from apps.api.app.db import Base, create_db_engine
+
+WORDS = "invoice receipt rent milk contract passport insurance salary tax meeting".split()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _run(engine, writers: int, readers: int, ops: int) -> dict:
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    write_lat: list[float] = []
+    read_lat: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def writer(n: int) -> None:
+        nonlocal errors
+        with Session() as db:
+            for i in range(ops):
+                text = " ".join(WORDS[(n + i + k) % len(WORDS)] for k in range(50))
+                start = time.perf_counter()
+                try:
+                    crud.create_note(db, schemas.NoteCreate(
+                        user_id=n % 4, attachment_path=f"f{n}-{i}.pdf", full_text=text, summary=None,
+                    ))
+                except OperationalError:
+                    db.rollback()
+                    with lock:
+                        errors += 1
+                    continue
+                with lock:
+                    write_lat.append(time.perf_counter() - start)
+
+    def reader(n: int) -> None:
+        nonlocal errors
+        with Session() as db:
+            for i in range(ops):
+                start = time.perf_counter()
+                try:
+                    crud.search_notes(db, user_id=n % 4, search_term=WORDS[i % len(WORDS)])
+                except OperationalError:
+                    db.rollback()
+                    with lock:
+                        errors += 1
+                    continue
+                with lock:
+                    read_lat.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "ops_per_s": round((len(write_lat) + len(read_lat)) / elapsed, 1),
+        "write_p50_ms": round(statistics.median(write_lat) * 1000, 2) if write_lat else None,
+        "write_p95_ms": round(_percentile(write_lat, 95) * 1000, 2),
+        "read_p50_ms": round(statistics.median(read_lat) * 1000, 2) if read_lat else None,
+        "read_p95_ms": round(_percentile(read_lat, 95) * 1000, 2),
+        "locked_errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = create_engine(
+            f"sqlite:///{Path(tmp) / 'baseline.db'}",
+            connect_args={"check_same_thread": False},
+        )
+        tuned = create_db_engine(f"sqlite:///{Path(tmp) / 'tuned.db'}")
+        report = {
+            "writers": args.writers,
+            "readers": args.readers,
+            "ops_per_thread": args.ops,
+            "baseline": _run(baseline, args.writers, args.readers, args.ops),
+            "tuned": _run(tuned, args.writers, args.readers, args.ops),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""OCR seconds per megapixel, before and after preprocessing, on a generated image set.
+
+Builds a fixed set of images with corpus.py: 12 MP phone shots of printed
+pages (skewed, unevenly lit, some stored sideways with an EXIF orientation
+tag) and clean 300 DPI scans. Each image is OCR'd three ways:
+
+    before   grayscale straight into Tesseract (the old extract_text_from_image)
+    after    ocr.preprocess() then Tesseract, without the cache
+    cached   ocr.ocr_image() a second time, served from the per-image cache
+
+and the report gives seconds per input megapixel plus word recall against
+the rendered text, as JSON:
+
+    python -m benchmarks.bench_ocr --photos 4 --scans 2
+
+Needs the tesseract binary on PATH.
+"""
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+from apps.api.app import llm_cache, ocr
+from benchmarks import corpus
+
+
+def build_images(dest: Path, photos: int, scans: int, seed: int) -> list[tuple[Path, str]]:
+    rng = random.Random(seed)
+    images = []
+    for i in range(photos):
+        path = dest / f"photo{i:03d}.jpg"
+        truth = corpus.write_photo(path, rng, skew=rng.uniform(-6, 6), sideways=i % 2 == 1)
+        images.append((path, truth))
+    for i in range(scans):
+        path = dest / f"scan{i:03d}.png"
+        # A4 at 300 DPI: nothing to fix, so preprocessing should cost little here
+        page = Image.new("L", (2480, 3508), 255)
+        draw = ImageDraw.Draw(page)
+        font = ImageFont.load_default(size=42)
+        lines = [corpus.sentence(rng, 6) for _ in range(30)]
+        for n, line in enumerate(lines):
+            draw.text((200, 250 + n * 100), line, fill=0, font=font)
+        page.save(path, dpi=(300, 300))
+        images.append((path, "\n".join(lines)))
+    return images
+
+
+def word_recall(truth: str, text: str) -> float:
+    expected = Counter(re.findall(r"[a-z0-9]+", truth.lower()))
+    found = Counter(re.findall(r"[a-z0-9]+", text.lower()))
+    return sum((expected & found).values()) / max(1, sum(expected.values()))
+
+
+def _timed(fn, *args) -> tuple[float, str]:
+    start = time.perf_counter()
+    text = fn(*args)
+    return time.perf_counter() - start, text
+
+
+def run(images: list[tuple[Path, str]]) -> dict:
+    ocr.set_cache(llm_cache.MemoryCache())
+    per_image = []
+    totals = {"megapixels": 0.0, "before": 0.0, "after": 0.0, "cached": 0.0}
+    recall = {"before": [], "after": []}
+    for path, truth in images:
+        with Image.open(path) as img:
+            img.load()
+            megapixels = img.width * img.height / 1e6
+            before, before_text = _timed(lambda: ocr.run_tesseract(img.convert("L")))
+            after, after_text = _timed(lambda: ocr.run_tesseract(ocr.preprocess(img)))
+            ocr.ocr_image(img)  # fills the cache
+            cached, _ = _timed(ocr.ocr_image, img)
+        totals["megapixels"] += megapixels
+        totals["before"] += before
+        totals["after"] += after
+        totals["cached"] += cached
+        recall["before"].append(word_recall(truth, before_text))
+        recall["after"].append(word_recall(truth, after_text))
+        per_image.append({
+            "image": path.name,
+            "megapixels": round(megapixels, 2),
+            "before_s": round(before, 3),
+            "after_s": round(after, 3),
+            "before_recall": round(recall["before"][-1], 3),
+            "after_recall": round(recall["after"][-1], 3),
+        })
+
+    megapixels = totals["megapixels"] or 1.0
+    return {
+        "images": len(images),
+        "megapixels": round(totals["megapixels"], 2),
+        "before": {
+            "seconds_per_megapixel": round(totals["before"] / megapixels, 4),
+            "word_recall": round(sum(recall["before"]) / max(1, len(images)), 3),
+        },
+        "after": {
+            "seconds_per_megapixel": round(totals["after"] / megapixels, 4),
+            "word_recall": round(sum(recall["after"]) / max(1, len(images)), 3),
+        },
+        "cached": {"seconds_per_megapixel": round(totals["cached"] / megapixels, 5)},
+        "per_image": per_image,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=4, help="12 MP phone-style shots")
+    parser.add_argument("--scans", type=int, default=2, help="clean 300 DPI scans")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    try:
+        tesseract = str(pytesseract.get_tesseract_version())
+    except pytesseract.TesseractNotFoundError:
+        sys.exit("bench_ocr needs the tesseract binary on PATH")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = build_images(Path(tmp), args.photos, args.scans, args.seed)
+        results = run(images)
+
+    report = {
+        "config": vars(args),
+        "python": platform.python_version(),
+        "tesseract": tesseract,
+        **results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Deterministic corpus of PDFs, images and DOCX files for benchmarks.
+
+Text is drawn from a fixed vocabulary with a seeded RNG, so the same
+arguments always produce the same bytes (and the same search hits).
+"""
+import random
+from pathlib import Path
+
+import docx
+import numpy as np
+import pymupdf
+from PIL import Image, ImageDraw, ImageFont
+
+VOCABULARY = (
+    "invoice receipt rent electricity water insurance contract passport visa salary tax "
+    "refund deadline meeting dentist doctor prescription bank transfer loan mortgage "
+    "subscription internet phone groceries milk bread coffee flight hotel booking ticket "
+    "school tuition payment warranty repair car parking fine license renewal appointment"
+).split()
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    amount = f"${rng.randint(5, 5000)}"
+    body = " ".join(rng.choice(VOCABULARY) for _ in range(words))
+    return f"{body.capitalize()} {amount} due {rng.randint(1, 28)}.{rng.randint(1, 12)}.2025."
+
+
+def write_pdf(path: Path, rng: random.Random, pages: int) -> None:
+    doc = pymupdf.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        y = 72
+        for _ in range(30):
+            page.insert_text((72, y), sentence(rng), fontsize=9)
+            y += 22
+    doc.save(path)
+    doc.close()
+
+
+def write_image(path: Path, rng: random.Random) -> None:
+    img = Image.new("RGB", (1240, 1754), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(25):
+        draw.text((80, 80 + i * 60), sentence(rng, 8), fill="black")
+    img.save(path)
+
+
+def write_photo(
+    path: Path,
+    rng: random.Random,
+    size: tuple[int, int] = (3024, 4032),
+    skew: float = 0.0,
+    sideways: bool = False,
+    lines: int = 30,
+) -> str:
+    """A phone shot of a printed page: 12 MP, skewed, unevenly lit, JPEG. Returns the text on it.
+
+    `sideways` stores the pixels rotated and sets the EXIF orientation tag, as phones do.
+    """
+    width, height = size
+    font = ImageFont.load_default(size=max(12, height // 70))
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    text = [sentence(rng, 6) for _ in range(lines)]
+    for i, line in enumerate(text):
+        draw.text((width // 12, height // 12 + i * height // (lines + 6)), line, fill=30, font=font)
+    page = page.rotate(skew, resample=Image.Resampling.BICUBIC, fillcolor=255)
+
+    # Light falls off towards one corner, plus a little sensor noise
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    light = 1.0 - 0.45 * (x / width + y / height) / 2
+    noise = np.random.default_rng(rng.randint(0, 2**32)).normal(0, 6, (height, width))
+    pixels = np.clip(np.asarray(page, dtype=np.float32) * light + noise, 0, 255).astype(np.uint8)
+    photo = Image.fromarray(pixels).convert("RGB")
+
+    exif = Image.Exif()
+    if sideways:
+        photo = photo.transpose(Image.Transpose.ROTATE_90)
+        exif[0x0112] = 6  # Orientation: rotate 90 CW to display
+    photo.save(path, "JPEG", quality=90, exif=exif)
+    return "\n".join(text)
+
+
+def write_docx(path: Path, rng: random.Random, paragraphs: int) -> None:
+    document = docx.Document()
+    for _ in range(paragraphs):
+        document.add_paragraph(" ".join(sentence(rng) for _ in range(4)))
+    document.save(path)
+
+
+def build_corpus(
+    dest: Path,
+    pdfs: int = 10,
+    images: int = 5,
+    docxs: int = 10,
+    pdf_pages: int = 3,
+    seed: int = 7,
+) -> list[Path]:
+    dest.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    files = []
+    for i in range(pdfs):
+        files.append(dest / f"doc{i:03d}.pdf")
+        write_pdf(files[-1], rng, pdf_pages)
+    for i in range(images):
+        files.append(dest / f"scan{i:03d}.png")
+        write_image(files[-1], rng)
+    for i in range(docxs):
+        files.append(dest / f"letter{i:03d}.docx")
+        write_docx(files[-1], rng, paragraphs=pdf_pages * 8)
+    return files
@@ -0,0 +1,113 @@
+"""Offline stand-ins for the OpenAI clients used by ai_service, with a fixed latency per call.
+
+    from benchmarks import fake_openai
+    fake_openai.install(latency=0.05)
+"""
+import asyncio
+import json
+import re
+import time
+from types import SimpleNamespace
+
+from apps.api.app import ai_service
+
+
+def _usage(params: dict, completion: str) -> SimpleNamespace:
+    prompt = sum(len(m["content"].split()) for m in params.get("messages", []))
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=len(completion.split()))
+
+
+def _tasks(listed: str) -> str:
+    """One task per flagged line, in the JSON shape the tasks prompt asks for."""
+    tasks = []
+    for block in listed.split("\n\n"):
+        note = re.match(r"Note (\d+):", block)
+        for line in re.findall(r"^- (.*?)(?: \(date: (\S+)\))?$", block, re.MULTILINE):
+            if note:
+                tasks.append({"note": int(note.group(1)), "title": line[0], "due": line[1] or None})
+    return json.dumps({"tasks": tasks})
+
+
+def _answer(params: dict) -> str:
+    last = params["messages"][-1]["content"]
+    if params.get("response_format", {}).get("type") == "json_object":
+        return _tasks(last)
+    words = last.split()
+    return "Summary: " + " ".join(words[-12:]) if words else "Nothing to say."
+
+
+class _StreamEvents:
+    def __init__(self, text: str, usage: SimpleNamespace, latency: float):
+        self.parts = text.split(" ")
+        self.usage = usage
+        self.latency = latency
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        for i, part in enumerate(self.parts):
+            await asyncio.sleep(self.latency / len(self.parts))
+            delta = part if i == 0 else f" {part}"
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=delta), finish_reason=None)], usage=None
+            )
+        # Like the real API: an empty delta that says why the answer ended, then the usage-only event
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")], usage=None
+        )
+        yield SimpleNamespace(choices=[], usage=self.usage)
+
+
+class FakeOpenAI:
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    def _create(self, **params):
+        self.calls += 1
+        time.sleep(self.latency)
+        text = _answer(params)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=_usage(params, text),
+        )
+
+    def _transcribe(self, **params):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(text="fake transcript")
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    async def _create(self, stream: bool = False, stream_options: dict | None = None, **params):
+        self.calls += 1
+        text = _answer(params)
+        if stream:
+            return _StreamEvents(text, _usage(params, text), self.latency)
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=_usage(params, text),
+        )
+
+    async def _transcribe(self, **params):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(text="fake transcript")
+
+
+def install(latency: float = 0.05) -> tuple[FakeOpenAI, FakeAsyncOpenAI]:
+    """Point ai_service at fake clients; returns them so callers can read `.calls`."""
+    sync_client, async_client = FakeOpenAI(latency), FakeAsyncOpenAI(latency)
+    ai_service._client = sync_client
+    ai_service._async_client = async_client
+    return sync_client, async_client
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The app reads its storage locations when it is imported: point them at a throwaway directory first,
+# so tests neither see nor write the repo's data/
+_TMP = Path(tempfile.mkdtemp(prefix="api-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP / 'app.db'}"
+os.environ["VECTOR_INDEX_DIR"] = str(_TMP / "vectors")
+os.environ["LLM_CACHE_PATH"] = str(_TMP / "llm_cache.db")
+os.environ["ARCHIVE_DIR"] = str(_TMP / "archive")
+
+
+def pytest_unconfigure(config):
+    # Last hook of the run: every engine and cache that used the directory is done with it
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_schema():
+    # The lifespan hook creates the schema, and a bare TestClient(app) never runs it
+    from apps.api.app import migrations
+    from apps.api.app.db import engine
+
+    migrations.migrate(engine)
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Blobs, vectors and the OCR cache of each test go to its own tmp_path, never to data/."""
+    from apps.api.app import blob_store, ocr, uploads, vector_index
+
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+    monkeypatch.setattr(uploads, "INCOMING_DIR", tmp_path / "incoming")
+    monkeypatch.setattr(vector_index, "VECTOR_DIR", tmp_path / "vectors")
+    monkeypatch.setattr(vector_index, "_index", vector_index.VectorIndex(root=tmp_path / "vectors"))
+    monkeypatch.setattr(ocr, "OCR_CACHE_PATH", tmp_path / "ocr_cache.db")
+    monkeypatch.setattr(ocr, "_cache", None)
@@ -1,18 +1,34 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
 import pytest
+from openai import RateLimitError
 from pytest_mock import mocker
-from apps.api.app.ai_service import summarize_text
+from apps.api.app import ai_service
+from apps.api.app.ai_service import set_cache, summarize_text
+from apps.api.app.llm_cache import MemoryCache
 from apps.api.app.main import app
 from fastapi.testclient import TestClient
 
 client = TestClient(app)
 
+
+@pytest.fixture(autouse=True)
+def fresh_llm_cache():
+    # Keep the persistent response cache out of unit tests
+    set_cache(MemoryCache())
+    yield
+    set_cache(MemoryCache())
+
 def test_summarize_text_success(mocker):
     mock_response = mocker.Mock()
     mock_response.choices = [
         mocker.Mock(message=mocker.Mock(content="Concise summary: Bought milk."))
     ]
 
-    mocker.patch("apps.api.app.ai_service.client.chat.completions.create", return_value=mock_response)
+    client = mocker.patch("apps.api.app.ai_service.get_client").return_value
+    client.chat.completions.create.return_value = mock_response
 
     result = summarize_text("Long text about buying milk...")
 
@@ -20,10 +36,8 @@ def test_summarize_text_success(mocker):
 
 
 def test_summarize_text_api_failure(mocker):
-    mocker.patch(
-        "apps.api.app.ai_service.client.chat.completions.create",
-        side_effect=Exception("API Timeout")
-    )
+    client = mocker.patch("apps.api.app.ai_service.get_client").return_value
+    client.chat.completions.create.side_effect = Exception("API Timeout")
 
 
     result = summarize_text("Some text")
@@ -38,8 +52,8 @@ def test_summarize_empty_text():
 def test_chat_endpoint_happy_path(mocker):
     mock_note1 = mocker.Mock(full_text="Milk cost 5$")
     mock_note2 = mocker.Mock(full_text="Bread cost 2$")
-    mocker.patch("apps.api.app.main.crud.search_notes", return_value=[mock_note1, mock_note2])
-    mocker.patch("apps.api.app.main.ai_service.answer_user_question", return_value="You spent 7 dollars.")
+    mocker.patch("apps.api.app.main.crud.search_notes_async", return_value=[mock_note1, mock_note2])
+    mocker.patch("apps.api.app.main.ai_service.answer_user_question_async", return_value="You spent 7 dollars.")
     app.dependency_overrides = {}
     response = client.post("/chat", json={"user_id": 1, "question": "How much did I spend?"})
     assert response.status_code == 200
@@ -47,9 +61,118 @@ def test_chat_endpoint_happy_path(mocker):
 
 
 def test_chat_endpoint_no_notes_found(mocker):
-    mocker.patch("apps.api.app.main.crud.search_notes", return_value=[])
-    ai_spy = mocker.patch("apps.api.app.main.ai_service.answer_user_question")
+    mocker.patch("apps.api.app.main.crud.search_notes_async", return_value=[])
+    ai_spy = mocker.patch("apps.api.app.main.ai_service.answer_user_question_async")
     response = client.post("/chat", json={"user_id": 1, "question": "Where are my keys?"})
     assert response.status_code == 200
     assert response.json() == "I couldn't find any notes matching your question."
-    ai_spy.assert_not_called()
\ No newline at end of file
+    ai_spy.assert_not_called()
+
+class FakeAsyncCompletions:
+    """Counts calls and peak concurrency; optionally fails the first N calls with a 429."""
+
+    def __init__(self, fail_first=0):
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.fail_first = fail_first
+
+    async def create(self, **params):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "http://x"))
+            raise RateLimitError("slow down", response=response, body=None)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        text = params["messages"][-1]["content"].rsplit("\n", 1)[-1]
+        return _completion_response(f"summary of {text}")
+
+
+def _completion_response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _fake_async_client(mocker, completions):
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    mocker.patch.object(ai_service, "get_async_client", return_value=fake)
+
+
+def test_summarize_many_is_concurrent_bounded_and_ordered(mocker):
+    completions = FakeAsyncCompletions()
+    _fake_async_client(mocker, completions)
+    mocker.patch.object(ai_service, "AI_MAX_CONCURRENCY", 3)
+
+    texts = [f"doc {i}" for i in range(10)] + ["doc 0"]
+    results = asyncio.run(ai_service.summarize_many(texts))
+
+    assert results == [f"summary of {t}" for t in texts]
+    assert completions.calls == 10
+    assert completions.peak == 3
+
+
+def test_async_completion_retries_rate_limits(mocker):
+    completions = FakeAsyncCompletions(fail_first=2)
+    _fake_async_client(mocker, completions)
+
+    result = asyncio.run(ai_service.summarize_text_async("invoice"))
+
+    assert result == "summary of invoice"
+    assert completions.calls == 3
+
+
+def test_chat_stream_sends_server_sent_events(mocker):
+    async def fake_stream(context, question, history=None):
+        for delta in ["You spent", " 7", " dollars.\n"]:
+            yield delta
+
+    mocker.patch("apps.api.app.main.crud.search_notes_async", return_value=[mocker.Mock(full_text="Milk cost 5$", summary=None, id=1)])
+    mocker.patch("apps.api.app.main.ai_service.stream_answer", side_effect=fake_stream)
+
+    response = client.post("/chat/stream", json={"user_id": 1, "question": "How much did I spend?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert int(response.headers["x-context-tokens"]) > 0
+    assert response.text == (
+        'data: "You spent"\n\n'
+        'data: " 7"\n\n'
+        'data: " dollars.\\n"\n\n'
+        "event: done\ndata: {}\n\n"
+    )
+
+
+def test_stream_answer_yields_deltas_and_caches_full_answer(mocker):
+    class FakeStream:
+        def __init__(self, deltas):
+            self.deltas = deltas
+
+        def __aiter__(self):
+            return self._gen()
+
+        async def _gen(self):
+            for d, finish_reason in self.deltas:
+                yield SimpleNamespace(
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=d), finish_reason=finish_reason)]
+                )
+
+    create = mocker.AsyncMock(side_effect=[
+        FakeStream([("Hel", None), ("lo", None), (None, "stop")]),
+        FakeStream([("Cut", None), (None, "length")]),
+        FakeStream([("Cut", None), (" short", None), (None, "stop")]),
+    ])
+    mocker.patch.object(ai_service, "get_async_client",
+                        return_value=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+    async def collect(question):
+        return [d async for d in ai_service.stream_answer("ctx", question)]
+
+    assert asyncio.run(collect("hi")) == ["Hel", "lo"]
+    assert asyncio.run(collect("hi")) == ["Hello"]
+    assert create.call_count == 1
+
+    # A truncated answer is not replayed from the cache
+    assert asyncio.run(collect("long one")) == ["Cut"]
+    assert asyncio.run(collect("long one")) == ["Cut", " short"]
+    assert create.call_count == 3
@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from apps.bot.api_client import ApiClient
+
+
+async def _serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_get_retries_transient_errors_with_backoff():
+    calls = {"n": 0}
+
+    async def flaky(request):
+        calls["n"] += 1
+        if calls["n"] < 3:
+            return web.Response(status=503)
+        return web.json_response({"status": "done"})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/jobs/1", flaky)
+        runner, url = await _serve(app)
+        client = ApiClient(base_url=url, backoff=0.01)
+        try:
+            return await client.get("/jobs/1")
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    response = asyncio.run(scenario())
+    assert response.ok
+    assert response.data == {"status": "done"}
+    assert calls["n"] == 3
+
+
+def test_post_is_not_retried_after_reaching_the_server():
+    calls = {"n": 0}
+
+    async def overloaded(request):
+        calls["n"] += 1
+        return web.Response(status=503, text="busy")
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/chat", overloaded)
+        runner, url = await _serve(app)
+        client = ApiClient(base_url=url, backoff=0.01)
+        try:
+            return await client.post("/chat", json={"question": "hi", "user_id": 1})
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    response = asyncio.run(scenario())
+    assert response.status == 503
+    assert response.text == "busy"
+    assert calls["n"] == 1
+
+
+def test_requests_reuse_one_pooled_connection():
+    peers = set()
+
+    async def chat(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.json_response("answer")
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/chat", chat)
+        runner, url = await _serve(app)
+        client = ApiClient(base_url=url)
+        try:
+            for i in range(5):
+                await client.post("/chat", json={"question": str(i), "user_id": 1})
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert len(peers) == 1
+
+
+def test_stream_events_parses_server_sent_events():
+    async def chat_stream(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for delta in ["Hel", "lo\n", "!"]:
+            await resp.write(f"data: {json.dumps(delta)}\n\n".encode())
+        await resp.write(b"event: done\ndata: {}\n\n")
+        return resp
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/chat/stream", chat_stream)
+        runner, url = await _serve(app)
+        client = ApiClient(base_url=url)
+        try:
+            return [e async for e in client.stream_events("/chat/stream", json={"question": "hi"})]
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    events = asyncio.run(scenario())
+    assert events == [("message", "Hel"), ("message", "lo\n"), ("message", "!"), ("done", {})]
+
+
+def test_requests_carry_the_current_request_id():
+    from apps.bot.api_client import request_id
+    seen = []
+
+    async def echo(request):
+        seen.append(request.headers.get("X-Request-ID"))
+        return web.json_response({})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/health", echo)
+        runner, url = await _serve(app)
+        client = ApiClient(base_url=url)
+        try:
+            request_id.set("tg42-abc")
+            await client.get("/health")
+            await client.get("/health")
+            request_id.set(None)
+            await client.get("/health")
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert seen[:2] == ["tg42-abc", "tg42-abc"]
+    assert seen[2] and seen[2] != "tg42-abc"
@@ -0,0 +1,53 @@
+from apps.api.app.context import (
+    Candidate,
+    assemble_context,
+    candidates_from_chunks,
+    count_tokens,
+    merge_chunks,
+)
+from apps.api.app.vector_index import Chunk
+
+
+def test_merge_chunks_joins_overlapping_spans_of_same_note():
+    text = "alpha beta gamma delta epsilon"
+    chunks = [
+        Chunk(note_id=1, start=11, end=22, text=text[11:22], score=0.4),
+        Chunk(note_id=1, start=0, end=16, text=text[0:16], score=0.9),
+        Chunk(note_id=2, start=0, end=5, text="other", score=0.5),
+    ]
+    merged = merge_chunks(chunks)
+    assert [c.note_id for c in merged] == [1, 2]
+    assert merged[0].text == text[0:22]
+    assert merged[0].score == 0.9
+
+
+def test_assemble_context_respects_budget_and_falls_back_to_summary():
+    long_text = "word " * 500
+    candidates = [
+        Candidate(text="Milk cost 5 dollars", note_id=1),
+        Candidate(text=long_text, fallback="Summary of the long document", note_id=2),
+        Candidate(text=long_text, fallback=None, note_id=3),
+    ]
+    result = assemble_context(candidates, budget=50)
+    assert "Milk cost 5 dollars" in result.text
+    assert "Summary of the long document" in result.text
+    assert "word word" not in result.text
+    assert result.tokens <= 50
+    assert result.tokens == count_tokens(result.text)
+    assert (result.used, result.summarized, result.dropped) == (2, 1, 1)
+
+
+def test_assemble_context_dedupes_repeated_text():
+    candidates = [
+        Candidate(text="Rent is due on the 1st"),
+        Candidate(text="rent is  due on the 1st"),
+    ]
+    result = assemble_context(candidates, budget=100)
+    assert result.text == "Rent is due on the 1st"
+    assert result.used == 1
+
+
+def test_candidates_from_chunks_attach_note_summaries():
+    chunks = [Chunk(note_id=4, start=0, end=4, text="text", score=1.0)]
+    candidates = candidates_from_chunks(chunks, {4: "note summary"})
+    assert candidates == [Candidate(text="text", fallback="note summary", note_id=4)]
@@ -1,6 +1,8 @@
+import zipfile
 import pytest
 from pathlib import Path
 from pytest_mock import mocker
+from apps.api.app import extraction
 from apps.api.app.extraction import extract_text_generic
 
 def test_extract_text_unsupported_file():
@@ -28,3 +30,78 @@ def test_extract_text_docx(mocker):
     assert result == "Fake Docx Text"
 
 
+
+def test_magic_bytes_win_over_extension(tmp_path, mocker):
+    mocker.patch("apps.api.app.extraction.extract_text_from_image", return_value="Scanned receipt")
+    misnamed = tmp_path / "receipt.pdf"
+    misnamed.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+
+    assert extraction.detect_mime(misnamed) == "image/png"
+    assert extract_text_generic(misnamed) == "Scanned receipt"
+
+
+def test_text_without_extension_is_sniffed(tmp_path):
+    path = tmp_path / "README"
+    path.write_text("Pay the rent on the 5th.\n\nCall the landlord.")
+
+    assert extraction.detect_mime(path) == "text/plain"
+    assert extract_text_generic(path) == "Pay the rent on the 5th.\n\nCall the landlord."
+
+
+def test_zip_that_is_not_docx_is_unsupported(tmp_path):
+    path = tmp_path / "bundle.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("readme.txt", "hello")
+
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        extract_text_generic(path)
+
+
+def test_text_sections_are_bounded_and_cut_at_paragraphs(tmp_path, mocker):
+    mocker.patch.object(extraction, "SECTION_CHARS", 60)
+    paragraphs = [f"Paragraph {i} talks about invoice number {i}." for i in range(10)]
+    path = tmp_path / "notes.txt"
+    path.write_text("\n\n".join(paragraphs))
+
+    sections = list(extraction.iter_sections(path))
+
+    assert len(sections) > 1
+    assert all(len(section) <= 60 for section in sections)
+    assert "\n\n".join(sections).split("\n\n") == paragraphs
+
+
+def test_large_text_is_memory_mapped_and_decoded_across_blocks(tmp_path, mocker):
+    mocker.patch.object(extraction, "MMAP_MIN_BYTES", 0)
+    # Tiny blocks, so multi-byte characters and blank lines straddle block boundaries
+    mocker.patch.object(extraction, "TEXT_BLOCK_BYTES", 5)
+    text = "Grüße aus Köln\n\nÜber München nach Zürich"
+    path = tmp_path / "postcard.txt"
+    path.write_bytes(text.encode("utf-8"))
+
+    assert "".join(extraction._iter_text_blocks(path)) == text
+    assert list(extraction.iter_sections(path)) == [text]
+
+
+def test_markdown_headings_start_sections(tmp_path):
+    path = tmp_path / "trip.md"
+    path.write_text("# Flights\n\nDeparts 9:40.\n\n## Hotel\n\nCheck-in after 3pm.\n\nBreakfast included.")
+
+    assert list(extraction.iter_sections(path)) == [
+        "# Flights\n\nDeparts 9:40.",
+        "## Hotel\n\nCheck-in after 3pm.\n\nBreakfast included.",
+    ]
+
+
+def test_html_keeps_visible_text_only(tmp_path):
+    path = tmp_path / "page"
+    path.write_text(
+        "<!DOCTYPE html><html><head><style>p { color: red }</style><script>track()</script></head>"
+        "<body><h1>Order confirmed</h1><p>Total: 42&nbsp;&euro;</p><ul><li>Lamp</li><li>Desk</li></ul>"
+        "<h2>Delivery</h2><p>Friday</p></body></html>"
+    )
+
+    assert extraction.detect_mime(path) == "text/html"
+    assert list(extraction.iter_sections(path)) == [
+        "Order confirmed\n\nTotal: 42 €\n\nLamp\n\nDesk",
+        "Delivery\n\nFriday",
+    ]
@@ -43,4 +43,91 @@ def test_real_docx_worker_failure(tmp_path):
     with pytest.raises(ValueError) as excinfo:
         extract_text_from_docx(bad_file)
 
-    assert "Error reading .docx file" in str(excinfo.value)
\ No newline at end of file
+    assert "Error reading .docx file" in str(excinfo.value)
+
+def _make_pdf(path, pages):
+    import pymupdf
+    doc = pymupdf.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+def test_pdf_pages_extracted_in_parallel_keep_order(tmp_path, mocker):
+    from apps.api.app import extraction
+    pdf_path = tmp_path / "contract.pdf"
+    _make_pdf(pdf_path, [f"Clause number {i} of the contract" for i in range(12)])
+    mocker.patch.object(extraction, "PDF_PARALLEL_MIN_PAGES", 2)
+    mocker.patch.object(extraction, "EXTRACT_WORKERS", 2)
+    try:
+        result = extract_text_from_pdf(pdf_path)
+    finally:
+        extraction.shutdown_pool()
+    expected = " ".join(f"Clause number {i} of the contract" for i in range(12))
+    assert result == expected
+
+
+def test_pdf_image_only_page_is_ocrd(tmp_path, mocker):
+    import pymupdf
+    from apps.api.app import extraction
+    img_path = tmp_path / "scan.png"
+    Image.new("RGB", (200, 100), color=(255, 255, 255)).save(img_path)
+    doc = pymupdf.open()
+    doc.new_page().insert_text((72, 72), "Typed cover page with enough text")
+    doc.new_page().insert_image(pymupdf.Rect(0, 0, 200, 100), filename=str(img_path))
+    pdf_path = tmp_path / "scanned.pdf"
+    doc.save(pdf_path)
+    doc.close()
+    ocr = mocker.patch.object(extraction, "_ocr_image", return_value="Scanned signature page")
+
+    result = extract_text_from_pdf(pdf_path)
+
+    assert result == "Typed cover page with enough text Scanned signature page"
+    ocr.assert_called_once()
+
+
+def test_pdf_pages_are_yielded_one_by_one(tmp_path):
+    from apps.api.app import extraction
+    pdf_path = tmp_path / "minutes.pdf"
+    _make_pdf(pdf_path, ["First   page", "Second page"])
+
+    pages = extraction.iter_sections(pdf_path)
+
+    assert next(pages) == "First page"
+    assert list(pages) == ["Second page"]
+
+
+def test_hung_pdf_page_moves_the_rest_to_a_fresh_pool(tmp_path, mocker):
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from apps.api.app import extraction
+
+    class HungPool:
+        """Every task stays pending: the first one as if stuck in a worker, the rest queued behind it."""
+        def __init__(self):
+            self.shut_down = False
+
+        def submit(self, fn, *args):
+            return Future()
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    pdf_path = tmp_path / "report.pdf"
+    _make_pdf(pdf_path, [f"Section {i}" for i in range(4)])
+    hung, fresh = HungPool(), ThreadPoolExecutor(max_workers=1)
+    mocker.patch.object(extraction, "PDF_PARALLEL_MIN_PAGES", 2)
+    mocker.patch.object(extraction, "EXTRACT_WORKERS", 2)
+    mocker.patch.object(extraction, "PDF_PAGE_TIMEOUT", 0.05)
+    mocker.patch.object(extraction, "_pool", hung)
+    mocker.patch.object(extraction, "get_pool", side_effect=[hung, fresh])
+    mocker.patch.object(extraction, "_kill_workers")
+    try:
+        pages = list(extraction.iter_pdf_pages(pdf_path))
+    finally:
+        fresh.shutdown()
+
+    assert pages == ["", "Section 1", "Section 2", "Section 3"]
+    assert hung.shut_down
+    assert extraction._pool is None  # the next get_pool() builds a new one
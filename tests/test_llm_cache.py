@@ -0,0 +1,138 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from apps.api.app import ai_service
+from apps.api.app.llm_cache import MemoryCache, SQLiteCache, TieredCache, make_key
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        content = f"answer #{self.calls}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def fake_client(mocker):
+    completions = FakeCompletions()
+    mocker.patch.object(
+        ai_service, "get_client", return_value=SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    )
+    ai_service.set_cache(MemoryCache())
+    yield completions
+    ai_service.set_cache(MemoryCache())
+
+
+def test_make_key_depends_on_every_parameter():
+    base = make_key(model="m", messages=[{"role": "user", "content": "hi"}], temperature=0.5)
+    assert base == make_key(temperature=0.5, messages=[{"role": "user", "content": "hi"}], model="m")
+    assert base != make_key(model="m", messages=[{"role": "user", "content": "hi"}], temperature=0.7)
+    assert base != make_key(model="m2", messages=[{"role": "user", "content": "hi"}], temperature=0.5)
+
+
+def test_repeated_question_hits_cache(fake_client):
+    first = ai_service.answer_user_question("ctx", "How much was rent?")
+    second = ai_service.answer_user_question("ctx", "How much was rent?")
+    other = ai_service.answer_user_question("other ctx", "How much was rent?")
+
+    assert first == second == "answer #1"
+    assert other == "answer #2"
+    assert fake_client.calls == 2
+    assert ai_service.get_cache().stats()["hits"] == 1
+
+
+def test_memory_cache_evicts_lru_and_expires(mocker):
+    cache = MemoryCache(max_items=2, ttl=10)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    mocker.patch("apps.api.app.llm_cache.time.time", return_value=10**12)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sqlite_cache_persists_and_evicts_by_size(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(path=path, ttl=60, max_bytes=10)
+    cache.set("old", "12345")
+    cache.get("old")
+    cache.set("new", "678901")
+
+    reopened = SQLiteCache(path=path, ttl=60, max_bytes=10)
+    assert reopened.get("old") is None
+    assert reopened.get("new") == "678901"
+    assert reopened.stats()["bytes"] == 6
+
+
+def test_sqlite_cache_keeps_its_size_total_without_summing(tmp_path):
+    path = tmp_path / "cache.db"
+    legacy = sqlite3.connect(str(path))
+    legacy.execute(
+        "CREATE TABLE llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+        " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    legacy.execute("INSERT INTO llm_cache VALUES ('old', 'abc', 3, 1e12, 0)")
+    legacy.commit()
+    legacy.close()
+
+    cache = SQLiteCache(path=path, ttl=60, max_bytes=100)
+    assert cache.stats()["bytes"] == 3
+    cache.set("k", "12345")
+    cache.set("k", "12")
+    assert cache.stats()["bytes"] == 5
+    assert SQLiteCache(path=path, ttl=60, max_bytes=4).stats()["bytes"] == 5  # summed once, not again
+
+
+def test_sqlite_cache_writes_access_times_in_batches(tmp_path, mocker):
+    mocker.patch("apps.api.app.llm_cache.LLM_CACHE_TOUCH_BATCH", 3)
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(path=path, ttl=60)
+    cache.set("k", "v")
+    reader = sqlite3.connect(str(path))
+
+    def accessed_at():
+        return reader.execute("SELECT accessed_at FROM llm_cache WHERE key = 'k'").fetchone()[0]
+
+    written = accessed_at()
+    mocker.patch("apps.api.app.llm_cache.time.time", return_value=written + 10)
+    cache.get("k")
+    cache.get("k")
+    assert accessed_at() == written
+    cache.get("k")
+    assert accessed_at() == written + 10
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = SQLiteCache(path=tmp_path / "cache.db", ttl=60)
+    disk.set("k", "v")
+    tiered = TieredCache(MemoryCache(), disk)
+
+    assert tiered.get("k") == "v"
+    assert tiered.get("k") == "v"
+    stats = tiered.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["hits"]) == (1, 1, 2)
+
+
+def test_tiered_cache_reads_and_writes_sqlite_off_the_event_loop(tmp_path, mocker):
+    tiered = TieredCache(MemoryCache(), SQLiteCache(path=tmp_path / "cache.db", ttl=60))
+    to_thread = mocker.spy(asyncio, "to_thread")
+
+    async def run():
+        await tiered.set_async("k", "v")
+        tiered.memory = MemoryCache()
+        first = await tiered.get_async("k")  # from disk
+        second = await tiered.get_async("k")  # promoted to memory
+        return first, second
+
+    assert asyncio.run(run()) == ("v", "v")
+    assert [call.args[0] for call in to_thread.call_args_list] == [tiered.disk.set, tiered.disk.get]
@@ -1,20 +1,29 @@
+import os
 import pytest
+from pathlib import Path
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 from apps.api.app.main import app, get_db
-from apps.api.app.db import Base
+from apps.api.app import conversation
+from apps.api.app.db import Base, get_async_db, get_async_session_factory, get_session_factory
 
-SQLALCHEMY_DATABASE_URL = "sqlite://"
+# A file of its own, so the sync and async engines see the same database; it sits in the
+# throwaway directory conftest points DATABASE_URL at, which is removed after the run
+SQLALCHEMY_DATABASE_PATH = Path(os.environ["DATABASE_URL"].removeprefix("sqlite:///")).with_name("test.db")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
+    f"sqlite:///{SQLALCHEMY_DATABASE_PATH}",
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The test client runs each request on a fresh event loop, so async connections are not pooled
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{SQLALCHEMY_DATABASE_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 # 2. Override the Dependency
 def override_get_db():
@@ -25,7 +34,19 @@ def override_get_db():
         db.close()
 
 
-app.dependency_overrides[get_db] = override_get_db
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
+def install_overrides():
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    app.dependency_overrides[get_async_session_factory] = lambda: TestingAsyncSessionLocal
+
+
+install_overrides()
 
 # 3. Create the Test Client
 client = TestClient(app)
@@ -35,6 +56,8 @@ client = TestClient(app)
 # Before every test, create the tables. After, destroy them.
 @pytest.fixture(autouse=True)
 def setup_db():
+    # Other test modules reset dependency_overrides; always test against the throwaway DB
+    install_overrides()
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
@@ -50,7 +73,9 @@ def test_upload_and_search_flow(mocker):
     # 1. Mock the extractor
     # Make sure this string is unique so we can spot it easily
     fake_content = "MAGIC_STRING_INVOICE_100"
-    mocker.patch("apps.api.app.main.extract_text_generic", return_value="MAGIC_STRING_INVOICE_100")
+    # PDFs reach ingest section by section
+    mocker.patch("apps.api.app.ingest.iter_sections", side_effect=lambda path: iter([fake_content]))
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", return_value="An invoice.")
 
     # 2. UPLOAD
     upload_url = "/attachments"  # (Keep this as your working URL)
@@ -59,11 +84,15 @@ def test_upload_and_search_flow(mocker):
         params={"user_id": 123},
         files={"files": ("test.pdf", b"fake content", "application/pdf")}
     )
-    assert response.status_code == 200
-
-    db = TestingSessionLocal()
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
 
-    db.close()
+    # The test client runs background tasks before returning, so the job is finished
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert job["processed_files"] == 1
+    assert job["files"][0]["summary"] == "An invoice."
+    assert job["files"][0]["note_id"] is not None
 
     # 3. SEARCH
     # We search for "MAGIC" which is definitely in our fake content
@@ -76,7 +105,635 @@ def test_upload_and_search_flow(mocker):
     assert search_response.status_code == 200
     results = search_response.json()
 
-    # This print helps us see what the search actually returned
-    print(f"Search Results: {results}")
+    assert len(results) > 0
+
+def _add_note(db, user_id, full_text, summary=None):
+    from apps.api.app import crud, schemas
+    return crud.create_note(db, schemas.NoteCreate(
+        user_id=user_id,
+        attachment_path=f"data/files/{full_text[:8]}.pdf",
+        full_text=full_text,
+        summary=summary,
+    ))
+
+
+def test_search_notes_ranked_and_scoped_to_user():
+    from apps.api.app import crud
+    db = TestingSessionLocal()
+    _add_note(db, 1, "Grocery list: milk, eggs, bread")
+    best = _add_note(db, 1, "Invoice for milk delivery, milk subscription", summary="Milk invoice")
+    _add_note(db, 2, "Milk invoice for someone else")
+    _add_note(db, 1, "Nothing relevant here")
+
+    results = crud.search_notes(db, user_id=1, search_term="milk")
+
+    assert [n.user_id for n in results] == [1, 1]
+    assert results[0].id == best.id
+    assert crud.search_notes(db, user_id=1, search_term="milk invoice") == [best]
+    db.close()
+
+
+def test_async_crud_matches_sync_and_clear_notes_endpoint():
+    import asyncio
+    from apps.api.app import crud
+    db = TestingSessionLocal()
+    _add_note(db, 5, "Rent receipt for March", summary="Rent")
+    _add_note(db, 5, "Rent contract renewal")
+    _add_note(db, 6, "Rent for another user")
+
+    async def run():
+        async with TestingAsyncSessionLocal() as adb:
+            found = await crud.search_notes_async(adb, user_id=5, search_term="rent")
+            recent = await crud.get_user_notes_async(adb, user_id=5, limit=1)
+            summaries = await crud.get_note_summaries_async(adb, [n.id for n in found])
+        return found, recent, summaries
+
+    found, recent, summaries = asyncio.run(run())
+    assert [n.id for n in found] == [n.id for n in crud.search_notes(db, user_id=5, search_term="rent")]
+    assert len(recent) == 1 and recent[0].user_id == 5
+    assert sorted(summaries.values(), key=str) == [None, "Rent"]
+
+    response = client.delete("/notes", params={"user_id": 5})
+    assert response.json() == {"message": "Deleted 2 notes."}
+    db.expire_all()
+    assert crud.get_user_notes(db, user_id=5) == []
+    assert len(crud.get_user_notes(db, user_id=6)) == 1
+    db.close()
+
+
+def test_search_notes_paginates_and_follows_deletes():
+    from apps.api.app import crud
+    db = TestingSessionLocal()
+    for i in range(5):
+        _add_note(db, 7, f"receipt number {i}")
+
+    first = crud.search_notes(db, user_id=7, search_term="receipt", limit=2)
+    second = crud.search_notes(db, user_id=7, search_term="receipt", limit=2, offset=2)
+    assert len(first) == 2 and len(second) == 2
+    assert not {n.id for n in first} & {n.id for n in second}
+
+    crud.delete_user_notes(db, user_id=7)
+    assert crud.search_notes(db, user_id=7, search_term="receipt") == []
+    db.close()
+
+
+def test_search_notes_ignores_fts_syntax_in_query():
+    from apps.api.app import crud
+    db = TestingSessionLocal()
+    _add_note(db, 3, "Meeting notes about the budget")
+
+    assert crud.search_notes(db, user_id=3, search_term='"budget*(') != []
+    assert crud.search_notes(db, user_id=3, search_term="!!!") == []
+    db.close()
+
+
+def test_like_fallback_matches_wildcards_literally(mocker):
+    from apps.api.app import crud
+    mocker.patch("apps.api.app.crud.search_index.is_supported", return_value=False)
+    db = TestingSessionLocal()
+    _add_note(db, 13, "Sale: 50% off all shoes")
+    _add_note(db, 13, "Invoice 500 for the roof")
+    _add_note(db, 13, "file_name and path\\to")
+
+    assert [n.full_text for n in crud.search_notes(db, user_id=13, search_term="50%")] == ["Sale: 50% off all shoes"]
+    assert [n.full_text for n in crud.search_notes(db, user_id=13, search_term="e_n")] == ["file_name and path\\to"]
+    assert len(crud.search_notes(db, user_id=13, search_term="h\\t")) == 1
+    assert crud.search_notes(db, user_id=13, search_term="_") != []
+    assert crud.search_notes(db, user_id=13, search_term="%%") == []
+    db.close()
+
+
+def test_unknown_job_returns_404():
+    assert client.get("/jobs/does-not-exist").status_code == 404
+
+
+def test_upload_job_records_failed_file(mocker):
+    mocker.patch("apps.api.app.ingest.iter_sections", side_effect=lambda path: iter(["some text"]))
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", side_effect=RuntimeError("boom"))
+
+    response = client.post(
+        "/attachments",
+        params={"user_id": 5},
+        files=[
+            ("files", ("a.pdf", b"a", "application/pdf")),
+            ("files", ("b.pdf", b"b", "application/pdf")),
+        ],
+    )
+    job = client.get(f"/jobs/{response.json()['job_id']}").json()
+
+    assert job["status"] == "failed"
+    assert job["processed_files"] == 2
+    assert [f["status"] for f in job["files"]] == ["failed", "failed"]
+    assert job["files"][0]["error"] == "boom"
+
+
+def test_jobs_left_behind_by_a_dead_worker_are_recovered(mocker, tmp_path):
+    import asyncio
+    from datetime import datetime, timedelta
+    from apps.api.app import crud, ingest, models, schemas
+    extract = mocker.patch("apps.api.app.ingest.iter_sections", side_effect=lambda path: iter(["second file"]))
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", return_value="A note.")
+    mocker.patch("apps.api.app.task_extraction.ai_service.extract_tasks_async", return_value=[])
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_text(name)
+
+    db = TestingSessionLocal()
+    files = [
+        schemas.JobFile(stored_filename=name, location=str(tmp_path / name), size=5) for name in ("a.txt", "b.txt")
+    ]
+    files[0].status, files[0].note_id = "done", 42
+    stale = crud.create_job(db, user_id=4, files=files)
+    fresh = crud.create_job(db, user_id=4, files=files[1:])
+    # The first one's worker stopped heartbeating ten minutes ago; the second is alive
+    db.query(models.IngestJob).filter(models.IngestJob.id == stale.id).update(
+        {"status": "running", "updated_at": datetime.utcnow() - timedelta(minutes=10)}
+    )
+    db.commit()
+    stale_id, fresh_id = stale.id, fresh.id
+    db.close()
+
+    assert asyncio.run(ingest.recover_jobs(TestingSessionLocal)) == [stale_id]
+    assert asyncio.run(ingest.recover_jobs(TestingSessionLocal)) == []
+
+    job = client.get(f"/jobs/{stale_id}").json()
+    assert job["status"] == "done"
+    assert job["processed_files"] == 2
+    assert [f["note_id"] for f in job["files"]][0] == 42
+    assert job["files"][1]["text_preview"] == "second file"
+    extract.assert_called_once_with(tmp_path / "b.txt")  # the finished file is not redone
+    assert client.get(f"/jobs/{fresh_id}").json()["status"] == "queued"
+
+
+def test_recovery_reuses_the_notes_a_crashed_run_saved(mocker, tmp_path):
+    import asyncio
+    import json
+    from datetime import datetime, timedelta
+    from apps.api.app import crud, ingest, models, schemas, vector_index
+    extract = mocker.patch("apps.api.app.ingest.iter_sections")
+    summarize = mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async")
+
+    # The first run saved the note, its task and the note id on the file, then died
+    db = TestingSessionLocal()
+    note = _add_note(db, 4, "Pay the rent by Friday", summary="Rent reminder.")
+    crud.create_tasks_bulk(db, [schemas.TaskCreate(user_id=4, title="Pay the rent", note_id=note.id)])
+    pending = schemas.JobFile(stored_filename="a.txt", location=str(tmp_path / "a.txt"), size=22, note_id=note.id)
+    job_id, note_id = crud.create_job(db, user_id=4, files=[pending]).id, note.id
+    db.close()
+
+    def crash():
+        db = TestingSessionLocal()
+        db.query(models.IngestJob).filter(models.IngestJob.id == job_id).update({
+            "status": "running",
+            "files": json.dumps([pending.model_dump()]),
+            "updated_at": datetime.utcnow() - timedelta(minutes=10),
+        })
+        db.commit()
+        db.close()
+
+    crash()
+    assert asyncio.run(ingest.recover_jobs(TestingSessionLocal)) == [job_id]
+    # Again, as if it died after indexing but before marking the file done
+    crash()
+    assert asyncio.run(ingest.recover_jobs(TestingSessionLocal)) == [job_id]
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert (job["files"][0]["note_id"], job["files"][0]["summary"]) == (note_id, "Rent reminder.")
+    assert len(client.get("/notes", params={"user_id": 4}).json()) == 1
+    assert len(client.get("/tasks", params={"user_id": 4}).json()) == 1
+    assert len(vector_index.get_index().search(4, "rent", min_score=-1.0)) == 1
+    extract.assert_not_called()
+    summarize.assert_not_called()
+
+
+def test_voice_note_upload_is_transcribed(mocker, tmp_path):
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path)
+    transcribe = mocker.patch("apps.api.app.ingest.transcription.transcribe", return_value="Buy milk tomorrow")
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", return_value="A shopping reminder.")
+    mocker.patch("apps.api.app.task_extraction.ai_service.extract_tasks_async", return_value=[])
+
+    response = client.post(
+        "/attachments",
+        params={"user_id": 8},
+        files={"files": ("voice", b"OggS\x00\x02" + b"\x00" * 32, "application/octet-stream")},
+    )
+    job = client.get(f"/jobs/{response.json()['job_id']}").json()
+
+    assert job["status"] == "done"
+    assert job["files"][0]["text_preview"] == "Buy milk tomorrow"
+    transcribe.assert_called_once()
+
+
+def test_upload_creates_tasks_linked_to_their_notes(mocker, tmp_path):
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path)
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", return_value="A note.")
+    llm = mocker.patch(
+        "apps.api.app.task_extraction.ai_service.extract_tasks_async",
+        return_value=[{"note": 1, "title": "Renew the passport", "due": "2026-03-06"}],
+    )
+
+    response = client.post(
+        "/attachments",
+        params={"user_id": 6},
+        files=[
+            ("files", ("lease.txt", b"Lease agreement for the flat on Elm Street.", "text/plain")),
+            ("files", ("todo.txt", b"Remember to renew the passport by 6 March 2026.", "text/plain")),
+        ],
+    )
+    job = client.get(f"/jobs/{response.json()['job_id']}").json()
+    tasks = client.get("/tasks", params={"user_id": 6}).json()
+
+    # Only the note the local pass flagged went to the model
+    llm.assert_called_once()
+    assert llm.call_args.args[0] == [[("Remember to renew the passport by 6 March 2026.", "2026-03-06")]]
+    assert [(t["title"], t["due_at"], t["note_id"]) for t in tasks] == [
+        ("Renew the passport", "2026-03-06T00:00:00", job["files"][1]["note_id"]),
+    ]
+
+
+def test_long_files_are_summarized_and_indexed_while_still_being_extracted(mocker, tmp_path):
+    import threading
+    from apps.api.app import ai_service, crud, vector_index
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path)
+    mocker.patch.object(ai_service, "SUMMARY_INPUT_CHARS", 30)
+    summary_started = threading.Event()
+    started_before_page_two = []
+
+    async def summarize(text):
+        summary_started.set()
+        return f"Summary of {len(text)} chars"
+
+    def pages(path):
+        yield "Page one of the lease agreement."
+        started_before_page_two.append(summary_started.wait(timeout=5))
+        yield "Page two: the rent is due on the 5th."
+
+    mocker.patch("apps.api.app.ingest.iter_sections", side_effect=pages)
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", side_effect=summarize)
+    mocker.patch("apps.api.app.task_extraction.ai_service.extract_tasks_async", return_value=[])
+    embed = mocker.spy(vector_index.VectorIndex, "embed")
+
+    response = client.post("/attachments", params={"user_id": 9}, files={"files": ("lease.pdf", b"%PDF-1.7", "application/pdf")})
+    job = client.get(f"/jobs/{response.json()['job_id']}").json()
+
+    assert started_before_page_two == [True]
+    assert job["files"][0]["summary"] == "Summary of 32 chars"
+    assert embed.call_count == 2
+    db = TestingSessionLocal()
+    full_text = crud.get_note(db, job["files"][0]["note_id"], with_text=True).full_text
+    db.close()
+    chunks = vector_index.get_index().search(9, "rent due", k=5, min_score=-1.0)
+    assert {chunk.text for chunk in chunks} == {"Page one of the lease agreement.", "Page two: the rent is due on the 5th."}
+    assert all(full_text[chunk.start:chunk.end] == chunk.text for chunk in chunks)
+
+
+def test_repeat_upload_reuses_blob_and_cached_extraction(mocker, tmp_path):
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path)
+    extract = mocker.patch("apps.api.app.ingest.iter_sections", side_effect=lambda path: iter(["Lease agreement"]))
+    summarize = mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", return_value="A lease.")
+
+    jobs = []
+    for user_id in (1, 2):
+        response = client.post(
+            "/attachments",
+            params={"user_id": user_id},
+            files={"files": ("lease.pdf", b"same bytes", "application/pdf")},
+        )
+        jobs.append(client.get(f"/jobs/{response.json()['job_id']}").json())
+
+    first, second = (job["files"][0] for job in jobs)
+    assert first["location"] == second["location"]
+    assert first["sha256"] == second["sha256"]
+    assert second["summary"] == "A lease."
+    assert second["note_id"] != first["note_id"]
+    assert extract.call_count == 1
+    assert summarize.call_count == 1
+    assert len(list(tmp_path.rglob("*.pdf"))) == 1
+
+
+def test_failed_extraction_is_not_cached(mocker, tmp_path):
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path)
+    # A failing extractor leaves the file with no text, as a transient parser error would
+    extract = mocker.patch(
+        "apps.api.app.ingest.iter_sections", side_effect=[RuntimeError("parser crashed"), iter(["Lease agreement"])]
+    )
+    mocker.patch("apps.api.app.ingest.ai_service.summarize_text_async", return_value="A lease.")
+
+    for user_id in (1, 2):
+        response = client.post(
+            "/attachments",
+            params={"user_id": user_id},
+            files={"files": ("lease.pdf", b"same bytes", "application/pdf")},
+        )
+    second = client.get(f"/jobs/{response.json()['job_id']}").json()["files"][0]
+
+    assert extract.call_count == 2
+    assert second["text_preview"] == "Lease agreement"
+
+
+def test_upload_over_file_limit_is_rejected_without_leftovers(mocker, tmp_path):
+    mocker.patch("apps.api.app.uploads.INCOMING_DIR", tmp_path)
+    mocker.patch("apps.api.app.uploads.MAX_FILE_BYTES", 1024)
+    mocker.patch("apps.api.app.uploads.UPLOAD_CHUNK_SIZE", 256)
+    run_job = mocker.patch("apps.api.app.main.ingest.run_job")
+
+    response = client.post(
+        "/attachments",
+        params={"user_id": 1},
+        files=[
+            ("files", ("small.txt", b"x" * 100, "text/plain")),
+            ("files", ("big.txt", b"x" * 5000, "text/plain")),
+        ],
+    )
+
+    assert response.status_code == 413
+    assert "big.txt" in response.json()["detail"]
+    assert list(tmp_path.iterdir()) == []
+    run_job.assert_not_called()
+
+
+def test_upload_declared_too_large_is_rejected_before_the_body_is_read(mocker):
+    mocker.patch("apps.api.app.uploads.MAX_REQUEST_BYTES", 1024)
+    mocker.patch("apps.api.app.uploads.FORM_OVERHEAD_BYTES", 512)
+    stream = mocker.patch("apps.api.app.main.uploads.stream_to_disk")
+
+    response = client.post("/attachments", params={"user_id": 1}, files={"files": ("big.txt", b"x" * 5000, "text/plain")})
+
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds the limit of 1536 bytes"}
+    stream.assert_not_called()
+
+
+def test_request_budget_limits_total_bytes():
+    from fastapi import HTTPException
+    from apps.api.app.uploads import RequestBudget
+    budget = RequestBudget(max_bytes=10)
+    budget.consume(6)
+    with pytest.raises(HTTPException) as excinfo:
+        budget.consume(6)
+    assert excinfo.value.status_code == 413
+
+
+def test_shared_attachment_is_hard_linked_not_copied(mocker, tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    mocker.patch("apps.api.app.uploads.SHARED_STORAGE_DIR", shared)
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path / "blobs")
+    run_job = mocker.patch("apps.api.app.main.ingest.run_job")
+    src = shared / "scan.pdf"
+    src.write_bytes(b"%PDF shared bytes")
+
+    response = client.post("/attachments/shared", json={
+        "user_id": 9,
+        "files": [{"path": str(src), "filename": "scan.pdf", "content_type": "application/pdf"}],
+    })
+
+    assert response.status_code == 202
+    stored = Path(response.json()["uploaded"][0]["location"])
+    assert src.exists()
+    assert stored.stat().st_ino == src.stat().st_ino
+    run_job.assert_called_once()
+
+
+def test_shared_attachment_move_and_path_validation(mocker, tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    mocker.patch("apps.api.app.uploads.SHARED_STORAGE_DIR", shared)
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path / "blobs")
+    mocker.patch("apps.api.app.main.ingest.run_job")
+    src = shared / "photo.jpg"
+    src.write_bytes(b"jpeg bytes")
+    outside = tmp_path / "secret.txt"
+    outside.write_text("nope")
+
+    rejected = client.post("/attachments/shared", json={
+        "user_id": 9, "files": [{"path": str(shared / ".." / "secret.txt")}],
+    })
+    assert rejected.status_code == 400
+
+    moved = client.post("/attachments/shared", json={
+        "user_id": 9, "move": True, "files": [{"path": str(src)}],
+    })
+    assert moved.status_code == 202
+    assert not src.exists()
+    assert Path(moved.json()["uploaded"][0]["location"]).read_bytes() == b"jpeg bytes"
+
+
+def _walk_pages(url, params):
+    seen, pages, cursor = [], 0, None
+    while True:
+        response = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return seen, pages
+
+
+def test_tasks_keyset_pagination_walks_every_task_once():
+    from datetime import datetime
+    from apps.api.app import crud, schemas
+    db = TestingSessionLocal()
+    due = [datetime(2024, 1, 3), None, datetime(2024, 1, 1), datetime(2024, 1, 3), None, datetime(2024, 1, 2), None]
+    crud.create_tasks_bulk(db, [schemas.TaskCreate(user_id=3, title=f"t{i}", due_at=d) for i, d in enumerate(due)])
+    crud.create_task(db, schemas.TaskCreate(user_id=4, title="other user"))
+    expected = [t.id for t in crud.list_tasks(db, user_id=3)]
+    db.close()
+
+    seen, pages = _walk_pages("/tasks", {"user_id": 3, "limit": 2})
+
+    assert seen == expected
+    assert pages == 4
+    titles = [t["title"] for t in client.get("/tasks", params={"user_id": 3, "limit": 3}).json()]
+    assert titles == ["t2", "t5", "t0"]
+
+
+def test_forged_cursors_are_rejected():
+    from apps.api.app import pagination
+    forged = [[{"dt": "2024-01-01"}, {"a": 1}], ["abc", 1], [{"dt": "2024-01-01"}, True], [None, "1"]]
+    for key in forged:
+        cursor = pagination.encode_cursor(tuple(key))
+        assert client.get("/tasks", params={"user_id": 3, "cursor": cursor}).status_code == 400
+        assert client.get("/notes", params={"user_id": 3, "cursor": cursor}).status_code == 400
+
+
+def test_notes_listing_paginates_newest_first_and_rejects_bad_cursor():
+    db = TestingSessionLocal()
+    ids = [_add_note(db, 9, f"note number {i}").id for i in range(5)]
+    db.close()
+
+    seen, pages = _walk_pages("/notes", {"user_id": 9, "limit": 2})
+
+    assert seen == ids[::-1]
+    assert pages == 3
+    assert "full_text" not in client.get("/notes", params={"user_id": 9}).json()[0]
+    assert client.get("/notes", params={"user_id": 9, "cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_search_preview_is_cut_in_sql_and_bodies_stay_unloaded():
+    from apps.api.app import crud
+    db = TestingSessionLocal()
+    filler = " ".join(f"word{i}" for i in range(2000))
+    note = _add_note(db, 11, f"{filler} the quarterly dentist appointment is on friday {filler}")
+    db.expire_all()
+
+    found = crud.search_notes(db, user_id=11, search_term="dentist")
+    assert found[0].id == note.id
+    assert "full_text" not in found[0].__dict__
+    db.close()
+
+    results = client.get("/notes/search", params={"q": "dentist", "user_id": 11}).json()
+    preview = results[0]["match_preview"]
+    assert "dentist appointment" in preview
+    assert len(preview) < 200
+    assert client.get(f"/notes/{note.id}").json()["full_text"].startswith("word0 word1")
+
+
+def test_download_supports_etag_range_and_archived_blobs(mocker, tmp_path):
+    from apps.api.app import blob_store, storage
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path / "blobs")
+    mocker.patch.object(storage, "_storage", storage.ArchiveStorage(storage.LocalBackend(tmp_path / "archive")))
+    content = b"hello attachment " * 1000
+    sha256, path = blob_store.put_bytes(content, ".txt")
+    db = TestingSessionLocal()
+    note = _add_note(db, 12, "hello attachment")
+    note.attachment_path = str(path)
+    db.commit()
+    url = f"/notes/{note.id}/download"
+    db.close()
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.content == content
+    assert full.headers["etag"] == f'"{sha256}"'
+
+    assert client.get(url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+
+    part = client.get(url, headers={"Range": "bytes=6-15"})
+    assert part.status_code == 206
+    assert part.content == content[6:16]
+    assert part.headers["content-range"] == f"bytes 6-15/{len(content)}"
+    assert client.get(url, headers={"Range": f"bytes={len(content)}-"}).status_code == 416
+
+    assert blob_store.archive_cold_blobs(max_hot_bytes=0) == [blob_store.blob_key(path)]
+    assert not path.exists()
+    archived = client.get(url, headers={"Range": "bytes=-8"})
+    assert archived.status_code == 206
+    assert archived.content == content[-8:]
+    assert client.get(url).content == content
+
+
+def test_download_of_legacy_file_keeps_its_etag_and_mtime(mocker, tmp_path):
+    mocker.patch("apps.api.app.blob_store.BLOB_DIR", tmp_path / "blobs")
+    legacy = tmp_path / "files" / "3f2a9c"
+    legacy.parent.mkdir()
+    legacy.write_bytes(b"old upload")
+    mtime = legacy.stat().st_mtime_ns
+    db = TestingSessionLocal()
+    note = _add_note(db, 13, "old upload")
+    note.attachment_path = str(legacy)
+    db.commit()
+    url = f"/notes/{note.id}/download"
+    db.close()
+
+    first = client.get(url)
+    again = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.headers["etag"].startswith('W/"')
+    assert again.status_code == 304
+    assert legacy.stat().st_mtime_ns == mtime
+
+
+def test_chat_remembers_the_conversation_within_a_bounded_prompt(mocker):
+    db = TestingSessionLocal()
+    _add_note(db, 1, "Milk cost 5$")
+    db.close()
+    mocker.patch("apps.api.app.main.vector_index.get_index").return_value.search.return_value = []
+    mocker.patch.object(conversation, "CHAT_HISTORY_TURNS", 3)
+    histories = []
+
+    async def fake_answer(context, question, history=None):
+        histories.append(history)
+        return f"About {question.lower()}: " + "details " * 40
+
+    async def fake_fold(summary, turns, max_tokens):
+        return f"Asked about everything up to {turns[-1][0].lower()}"
+
+    mocker.patch("apps.api.app.main.ai_service.answer_user_question_async", side_effect=fake_answer)
+    fold = mocker.patch("apps.api.app.conversation.ai_service.summarize_conversation_async", side_effect=fake_fold)
+
+    prompt_tokens = []
+    for i in range(12):
+        response = client.post("/chat", json={"user_id": 1, "question": f"Question {i}"})
+        assert response.status_code == 200
+        prompt_tokens.append(int(response.headers["x-prompt-tokens"]))
+
+    # Grows while the verbatim window fills, then stays put however long the conversation runs
+    assert prompt_tokens[0] < prompt_tokens[3]
+    assert len(set(prompt_tokens[4:])) == 1
+    assert fold.call_count == 9
+    assert histories[-1][0]["content"].endswith("Asked about everything up to question 7")
+    assert [m["content"] for m in histories[-1][1::2]] == ["Question 8", "Question 9", "Question 10"]
+
+    history = client.get("/chat/history", params={"user_id": 1}).json()
+    assert history["summary"] == "Asked about everything up to question 8"
+    assert [turn["question"] for turn in history["turns"]] == ["Question 9", "Question 10", "Question 11"]
+    assert history["turns"][-1]["prompt_tokens"] == prompt_tokens[-1]
+    assert client.get("/chat/history", params={"user_id": 2}).json() == {"user_id": 2, "summary": None, "turns": []}
+
+    assert client.delete("/chat/history", params={"user_id": 1}).json() == {"message": "Deleted 12 conversation turns."}
+    assert client.get("/chat/history", params={"user_id": 1}).json()["summary"] is None
+
+
+def test_failed_answers_are_not_remembered(mocker):
+    db = TestingSessionLocal()
+    _add_note(db, 1, "Milk cost 5$")
+    db.close()
+    mocker.patch("apps.api.app.main.vector_index.get_index").return_value.search.return_value = []
+    mocker.patch("apps.api.app.main.ai_service.answer_user_question_async", return_value="AI Error: timeout")
+
+    response = client.post("/chat", json={"user_id": 1, "question": "Where are my keys?"})
+
+    assert response.json() == "AI Error: timeout"
+    assert client.get("/chat/history", params={"user_id": 1}).json()["turns"] == []
+
+
+def test_a_stream_that_fails_midway_is_not_remembered(mocker):
+    from apps.api.app import ai_service
+    db = TestingSessionLocal()
+    _add_note(db, 1, "Milk cost 5$")
+    db.close()
+    mocker.patch("apps.api.app.main.vector_index.get_index").return_value.search.return_value = []
+
+    async def broken_stream(context, question, history=None):
+        yield "You spent"
+        yield ai_service.AnswerError("AI Error: connection reset")
+
+    mocker.patch("apps.api.app.main.ai_service.stream_answer", side_effect=broken_stream)
+
+    response = client.post("/chat/stream", json={"user_id": 1, "question": "How much did I spend?"})
+
+    assert 'data: "AI Error: connection reset"' in response.text
+    assert client.get("/chat/history", params={"user_id": 1}).json()["turns"] == []
+
+
+def test_fold_loads_one_batch_of_the_oldest_turns(mocker):
+    import asyncio
+    from apps.api.app import crud
+
+    async def add_turns():
+        async with TestingAsyncSessionLocal() as db:
+            for i in range(conversation.CHAT_FOLD_BATCH + 15):
+                await crud.add_conversation_turn_async(db, 6, f"Question {i}", "Short answer.", 10)
+
+    asyncio.run(add_turns())
+    fold = mocker.patch("apps.api.app.conversation.ai_service.summarize_conversation_async", return_value="So far")
+    load = mocker.spy(crud, "get_conversation_turns_async")
+
+    assert asyncio.run(conversation.fold_history(TestingAsyncSessionLocal, 6)) is True
 
-    assert len(results) > 0
\ No newline at end of file
+    folded = fold.call_args.args[1]
+    assert len(folded) == conversation.CHAT_FOLD_BATCH
+    assert folded[0][0] == "Question 0"
+    assert all(call.kwargs["limit"] for call in load.call_args_list)
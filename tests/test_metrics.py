@@ -0,0 +1,82 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from apps.api.app import logs, metrics
+from apps.api.app.main import app
+
+client = TestClient(app)
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    histogram = metrics.Histogram("test_latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    counter = metrics.Counter("test_events_total", "Test events.", ("result",))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    counter.inc(result="hit")
+    counter.inc(2, result="hit")
+
+    text = metrics.render()
+
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{stage="a"} 2' in text
+    assert 'test_events_total{result="hit"} 3' in text
+
+
+def test_metrics_endpoint_times_routes_and_echoes_request_id():
+    response = client.get("/health", headers={"X-Request-ID": "tg7-abc"})
+    assert response.headers["x-request-id"] == "tg7-abc"
+    assert client.get("/health").headers["x-request-id"] != "tg7-abc"
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in body
+
+
+def test_db_queries_are_timed_by_statement():
+    engine = create_engine("sqlite://")
+    before = metrics.STAGE_SECONDS.count(stage="db_query", kind="select")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert metrics.STAGE_SECONDS.count(stage="db_query", kind="select") == before + 1
+
+
+def test_log_lines_are_json_with_the_request_id():
+    record = logging.LogRecord("api", logging.INFO, __file__, 1, "notes_deleted", None, None)
+    record.fields = {"user_id": 5, "count": 2}
+    token = logs.request_id.set("req-1")
+    try:
+        line = json.loads(logs.JsonFormatter().format(record))
+    finally:
+        logs.request_id.reset(token)
+
+    assert line["event"] == "notes_deleted"
+    assert line["request_id"] == "req-1"
+    assert line["user_id"] == 5 and line["count"] == 2
+
+
+def test_llm_calls_count_tokens_and_cache_hits(mocker):
+    from types import SimpleNamespace
+    from apps.api.app import ai_service
+    from apps.api.app.llm_cache import MemoryCache
+
+    ai_service.set_cache(MemoryCache())
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="A receipt."))],
+        usage=SimpleNamespace(prompt_tokens=120, completion_tokens=4),
+    )
+    client = mocker.patch("apps.api.app.ai_service.get_client").return_value
+    client.chat.completions.create.return_value = response
+    prompt_before = metrics.LLM_TOKENS.value(operation="summarize", type="prompt")
+    hits_before = metrics.LLM_CACHE_REQUESTS.value(operation="summarize", result="hit")
+
+    assert ai_service.summarize_text("receipt text") == "A receipt."
+    assert ai_service.summarize_text("receipt text") == "A receipt."
+
+    assert metrics.LLM_TOKENS.value(operation="summarize", type="prompt") == prompt_before + 120
+    assert metrics.LLM_CACHE_REQUESTS.value(operation="summarize", result="hit") == hits_before + 1
+    ai_service.set_cache(MemoryCache())
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import Session
+
+from apps.api.app import crud, migrations, schemas
+
+
+def test_migrations_add_indexes_to_an_existing_database_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        # Tables as the first release created them: only single-column indexes
+        conn.execute(text(
+            "CREATE TABLE notes (id INTEGER PRIMARY KEY, user_id INTEGER, attachment_path VARCHAR NOT NULL,"
+            " full_text TEXT NOT NULL, created_at DATETIME, summary TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE tasks (id INTEGER PRIMARY KEY, user_id INTEGER, title VARCHAR NOT NULL,"
+            " due_at DATETIME, status VARCHAR, note_id INTEGER, created_at DATETIME, completed_at DATETIME)"
+        ))
+
+    assert migrations.run_migrations(engine) == [1, 2]
+    assert migrations.run_migrations(engine) == []
+
+    inspector = inspect(engine)
+    note_index = next(i for i in inspector.get_indexes("notes") if i["name"] == "ix_notes_user_created")
+    assert note_index["column_names"] == ["user_id", "created_at"]
+    task_index = next(i for i in inspector.get_indexes("tasks") if i["name"] == "ix_tasks_user_status_due")
+    assert task_index["column_names"] == ["user_id", "status", "due_at"]
+
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE user_id = 1 AND status = 'open' ORDER BY due_at"
+        )).fetchall()
+    assert "ix_tasks_user_status_due" in " ".join(str(row) for row in plan)
+
+
+@pytest.mark.parametrize("status, after", [
+    (None, None),
+    ("open", None),
+    (None, (datetime(2026, 1, 5), 3)),
+    ("open", (datetime(2026, 1, 5), 3)),
+    (None, (None, 3)),
+    ("open", (None, 3)),
+])
+def test_list_tasks_pages_in_index_order(tmp_path, status, after):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    migrations.migrate(engine)
+    with Session(engine) as db:
+        crud.create_tasks_bulk(db, [
+            schemas.TaskCreate(user_id=user_id, title="t", due_at=datetime(2026, 1, day) if day % 3 else None)
+            for user_id in (1, 2) for day in range(1, 20)
+        ])
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    with Session(engine) as db:
+        crud.list_tasks(db, user_id=1, status=status, limit=50, after=after)
+    event.remove(engine, "before_cursor_execute", capture)
+
+    assert statements
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = " ".join(str(row) for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            assert "TEMP B-TREE" not in plan
+            assert ("ix_tasks_user_status_due" if status else "ix_tasks_user_due") in plan
@@ -0,0 +1,71 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from apps.api.app import llm_cache, ocr
+
+
+def _page(size=(1200, 1600)) -> Image.Image:
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=28)
+    for i in range(25):
+        draw.text((80, 80 + i * 55), f"Invoice {i} rent electricity water ${i * 37} due 12.3.2025", fill=0, font=font)
+    return page
+
+
+def test_photos_are_downscaled_to_the_target_dpi():
+    photo = Image.new("L", (3024, 4032), 255)
+    scan_600 = Image.new("L", (4960, 7016), 255)
+    scan_300 = Image.new("L", (2480, 3508), 255)
+
+    assert max(ocr.normalize_resolution(photo).size) == round(ocr.OCR_TARGET_DPI * ocr.OCR_ASSUMED_PAGE_INCHES)
+    assert ocr.normalize_resolution(scan_600, dpi=600).size == (2480, 3508)
+    assert ocr.normalize_resolution(scan_300, dpi=300) is scan_300
+
+
+def test_skew_is_detected_and_undone():
+    skewed = _page().rotate(4, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+
+    assert abs(ocr.estimate_skew(skewed) + 4) <= 0.5
+    assert abs(ocr.estimate_skew(_page())) <= 0.5
+
+
+def test_uneven_lighting_binarizes_to_clean_paper():
+    # Blank paper, much darker in one corner than the other
+    light = np.linspace(90, 250, 800, dtype=np.float32)
+    paper = Image.fromarray(np.tile(light, (600, 1)).astype(np.uint8))
+    draw = ImageDraw.Draw(paper)
+    draw.rectangle((100, 280, 700, 300), fill=20)  # one line of "ink"
+
+    page = np.asarray(ocr.binarize(ocr.flatten_background(paper)))
+
+    assert set(np.unique(page)) == {0, 255}
+    assert (page[:200] == 255).all()
+    assert (page[285:295, 150:650] == 0).all()
+
+
+def test_preprocess_applies_exif_orientation(mocker):
+    mocker.patch.object(ocr, "OCR_DETECT_ROTATION", False)
+    sideways = _page((600, 800)).transpose(Image.Transpose.ROTATE_90)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    sideways.info["exif"] = exif.tobytes()
+
+    result = ocr.preprocess(sideways)
+
+    assert result.width < result.height
+
+
+def test_ocr_results_are_cached_per_image(mocker):
+    ocr.set_cache(llm_cache.MemoryCache())
+    mocker.patch.object(ocr, "preprocess", side_effect=lambda img: img)
+    tesseract = mocker.patch.object(ocr, "run_tesseract", return_value="Receipt total 12.50")
+    try:
+        first = ocr.ocr_image(_page((400, 300)))
+        again = ocr.ocr_image(_page((400, 300)))  # same pixels, new object
+        other = ocr.ocr_image(_page((400, 320)))
+    finally:
+        ocr.set_cache(None)
+
+    assert first == again == other == "Receipt total 12.50"
+    assert tesseract.call_count == 2
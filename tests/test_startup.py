@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Loaded on first use (an upload of that type, the first AI call), never by importing the app
+HEAVY_MODULES = ["pymupdf", "PIL", "pytesseract", "docx", "openai"]
+REPORT_SIZE = 15
+
+
+def _import_app(tmp_path: Path) -> tuple[list[str], list[tuple[int, int, str]]]:
+    """Import the API in a fresh interpreter under -X importtime.
+
+    Returns the heavy modules it loaded and (self us, cumulative us, package) per import.
+    """
+    code = (
+        "import json, sys; import apps.api.app.main; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "x",
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}",
+        "LLM_CACHE_PATH": str(tmp_path / "llm_cache.db"),
+        "VECTOR_INDEX_DIR": str(tmp_path / "vectors"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        imports.append((int(own), int(cumulative), name.rstrip()))
+    return json.loads(result.stdout.strip().splitlines()[-1]), imports
+
+
+def test_importing_the_app_defers_heavy_work(tmp_path):
+    loaded, _ = _import_app(tmp_path)
+
+    assert loaded == []
+    # Migrations are a lifespan / deploy step: the import never touches the database
+    assert not (tmp_path / "app.db").exists()
+
+
+def test_import_time_profile(tmp_path, capsys):
+    _, imports = _import_app(tmp_path)
+    by_name = {name.strip(): cumulative for _, cumulative, name in imports}
+    assert "apps.api.app.main" in by_name
+
+    # What the app imports directly (one level of the profile's indentation down), slowest first
+    top = sorted(
+        (i for i in imports if i[2].startswith("   ") and not i[2].startswith("    ")),
+        key=lambda i: i[1], reverse=True,
+    )
+    lines = [f"import apps.api.app.main: {by_name['apps.api.app.main'] / 1000:.0f} ms cumulative"]
+    lines += [f"{cumulative / 1000:8.1f} ms  {name.strip()}" for _, cumulative, name in top[:REPORT_SIZE]]
+    with capsys.disabled():
+        print("\n" + "\n".join(lines))
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from datetime import date, datetime
+
+import pytest
+
+from apps.api.app import task_extraction
+
+TODAY = date(2026, 10, 14)  # a Wednesday
+
+
+@pytest.mark.parametrize("line, due", [
+    ("Pay the rent by Friday", date(2026, 10, 16)),
+    ("Dentist appointment on Wednesday", date(2026, 10, 21)),
+    ("Call mom the day after tomorrow, not tomorrow", date(2026, 10, 16)),
+    ("Send the report in 2 weeks", date(2026, 10, 28)),
+    ("Invoice due 05.11.2026", date(2026, 11, 5)),
+    ("Deadline 2026-11-02", date(2026, 11, 2)),
+    ("Submit the form by 3rd of March", date(2027, 3, 3)),
+    ("Renew the lease before end of month", date(2026, 10, 31)),
+    ("You may pay in cash", None),
+])
+def test_due_dates_are_read_from_the_line(line, due):
+    assert task_extraction.parse_due(line, TODAY) == due
+
+
+def test_leap_day_without_a_year_rolls_over_to_the_28th():
+    assert task_extraction.parse_due("Pay rent 29 Feb", date(2024, 3, 1)) == date(2025, 2, 28)
+
+
+def test_only_todo_like_lines_are_flagged():
+    receipt = "SUPERMARKET\nMilk 1.20\nTotal 12.50\nDate 12.03.2026\nReturn policy: bring your receipt."
+    contract = "The tenant must keep the flat clean. The landlord should be informed of repairs."
+    note = (
+        "Weekend plans.\n"
+        "- [ ] book the train tickets\n"
+        "Remember to water the plants.\n"
+        "Meeting with the accountant on Friday.\n"
+        "We had pizza on Sunday."
+    )
+
+    assert task_extraction.find_candidates(receipt, TODAY) == []
+    assert task_extraction.find_candidates(contract, TODAY) == []
+    assert task_extraction.find_candidates(note, TODAY) == [
+        task_extraction.Candidate("- [ ] book the train tickets"),
+        task_extraction.Candidate("Remember to water the plants."),
+        task_extraction.Candidate("Meeting with the accountant on Friday.", date(2026, 10, 16)),
+    ]
+
+
+def test_flagged_notes_are_batched_into_few_model_calls(mocker):
+    mocker.patch.object(task_extraction, "TASK_BATCH_NOTES", 2)
+    texts = ["TODO: pay the electricity bill", "Lunch was nice.", "Remind me to call Anna", "", "Deadline tomorrow"]
+
+    async def fake_llm(notes, today):
+        return [
+            {"note": n, "title": lines[0][0].split(maxsplit=1)[1], "due": lines[0][1]}
+            for n, lines in enumerate(notes, start=1)
+        ] + [{"note": 9, "title": "out of range"}, {"note": 1, "title": " "}, "junk"]
+
+    llm = mocker.patch.object(task_extraction.ai_service, "extract_tasks_async", side_effect=fake_llm)
+
+    tasks = asyncio.run(task_extraction.extract_tasks(texts, today=TODAY))
+
+    assert llm.call_count == 2
+    assert [(t.index, t.title, t.due_at) for t in tasks] == [
+        (0, "pay the electricity bill", None),
+        (2, "me to call Anna", None),
+        (4, "tomorrow", datetime(2026, 10, 15)),
+    ]
+
+
+def test_nothing_flagged_means_no_model_call(mocker):
+    llm = mocker.patch.object(task_extraction.ai_service, "extract_tasks_async")
+
+    assert asyncio.run(task_extraction.extract_tasks(["Lease agreement", "Milk 1.20"], today=TODAY)) == []
+    llm.assert_not_called()
+
+
+def test_model_failure_yields_no_tasks(mocker):
+    mocker.patch.object(task_extraction.ai_service, "extract_tasks_async", return_value=None)
+
+    assert asyncio.run(task_extraction.extract_tasks(["TODO: renew passport"], today=TODAY)) == []
+
+
+def test_a_failing_note_or_batch_only_loses_its_own_tasks(mocker):
+    mocker.patch.object(task_extraction, "TASK_BATCH_NOTES", 1)
+    real_find = task_extraction.find_candidates
+    mocker.patch.object(
+        task_extraction, "find_candidates",
+        side_effect=lambda text, today: real_find(text, today) if "odd" not in text else 1 / 0,
+    )
+
+    async def fake_llm(notes, today):
+        if "gas" in notes[0][0][0]:
+            raise RuntimeError("boom")
+        return [{"note": 1, "title": notes[0][0][0]}]
+
+    mocker.patch.object(task_extraction.ai_service, "extract_tasks_async", side_effect=fake_llm)
+    texts = ["TODO: pay the gas bill", "TODO: odd note", "TODO: call the bank"]
+
+    tasks = asyncio.run(task_extraction.extract_tasks(texts, today=TODAY))
+
+    assert [(t.index, t.title) for t in tasks] == [(2, "TODO: call the bank")]
+
+
+def test_the_rule_pass_runs_off_the_event_loop(mocker):
+    loop_thread = []
+    real_find = task_extraction.find_candidates
+    seen = []
+
+    def find(text, today):
+        seen.append(threading.get_ident())
+        return real_find(text, today)
+
+    mocker.patch.object(task_extraction, "find_candidates", side_effect=find)
+    mocker.patch.object(task_extraction.ai_service, "extract_tasks_async", return_value=None)
+
+    async def run():
+        loop_thread.append(threading.get_ident())
+        return await task_extraction.extract_tasks(["TODO: a", "TODO: b"], today=TODAY)
+
+    asyncio.run(run())
+
+    assert len(seen) == 2 and loop_thread[0] not in seen
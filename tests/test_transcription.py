@@ -0,0 +1,124 @@
+import asyncio
+import wave
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pytest
+
+from apps.api.app import transcription
+from apps.api.app.transcription import SAMPLE_RATE, decode_audio, split_on_silence
+
+
+class FakeBackend:
+    """Answers from `respond(samples, rate)` and records what it was sent."""
+
+    def __init__(self, respond: Callable[[np.ndarray, int], str] | None = None, delay: float = 0.0):
+        self.respond = respond or (lambda samples, rate: f"{len(samples) / rate:.1f}s")
+        self.delay = delay
+        self.calls: list[int] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def transcribe_samples(self, samples: np.ndarray, rate: int) -> str:
+        self.calls.append(len(samples))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return self.respond(samples, rate)
+
+    async def transcribe_path(self, path: Path) -> str:
+        return f"whole file {path.name}"
+
+
+def _speech(seconds, freq=220.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * freq * t) * 8000).astype(np.int16)
+
+
+def _silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+
+def _write_wav(path, samples, rate=SAMPLE_RATE, channels=1):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+
+
+def test_split_on_silence_cuts_inside_pauses():
+    audio = np.concatenate([_speech(4), _silence(1), _speech(4), _silence(1), _speech(3)])
+    spans = split_on_silence(audio, target_seconds=5, max_seconds=7)
+
+    assert spans[0][0] == 0 and spans[-1][1] == len(audio)
+    assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+    for _, end in spans[:-1]:
+        assert not audio[end - 100:end + 100].any()
+
+
+def test_split_on_silence_hard_cuts_without_pauses():
+    audio = _speech(20)
+    spans = split_on_silence(audio, target_seconds=5, max_seconds=7)
+    assert all((end - start) / SAMPLE_RATE <= 7 for start, end in spans)
+    assert spans[-1][1] == len(audio)
+
+
+def test_decode_wav_downmixes_and_resamples(tmp_path):
+    stereo = np.repeat(_speech(1)[::2], 2)  # 8 kHz worth of frames, two channels
+    path = tmp_path / "memo.wav"
+    _write_wav(path, stereo, rate=8000, channels=2)
+    samples = decode_audio(path)
+    assert abs(len(samples) - SAMPLE_RATE) < 10
+
+
+def test_transcribe_runs_chunks_concurrently_in_order(tmp_path, mocker):
+    mocker.patch.object(
+        transcription, "split_on_silence",
+        side_effect=lambda s: split_on_silence(s, target_seconds=2, max_seconds=3),
+    )
+    audio = np.concatenate([_speech(2, 200), _silence(0.5), _speech(2, 400), _silence(0.5), _speech(2, 800)])
+    path = tmp_path / "long.wav"
+    _write_wav(path, audio)
+
+    def respond(samples, rate):
+        spectrum = np.abs(np.fft.rfft(samples.astype(np.float32)))
+        return f"{int(np.argmax(spectrum) * rate / len(samples))}Hz"
+
+    backend = FakeBackend(respond=respond, delay=0.05)
+    text = asyncio.run(transcription.transcribe(path, backend=backend))
+
+    assert text.split() == ["200Hz", "400Hz", "800Hz"]
+    assert backend.peak == 3
+
+
+def test_transcribe_falls_back_to_whole_file_when_undecodable(tmp_path, mocker):
+    mocker.patch("apps.api.app.transcription.shutil.which", return_value=None)
+    path = tmp_path / "voice.ogg"
+    path.write_bytes(b"OggS")
+    assert asyncio.run(transcription.transcribe(path, backend=FakeBackend())) == "whole file voice.ogg"
+
+
+def test_transcribe_rejects_overlong_audio_before_decoding(tmp_path, mocker):
+    mocker.patch.object(transcription, "MAX_AUDIO_SECONDS", 1)
+    decode = mocker.spy(transcription, "decode_audio")
+    path = tmp_path / "long.wav"
+    _write_wav(path, _speech(2))
+    with pytest.raises(ValueError):
+        asyncio.run(transcription.transcribe(path, backend=FakeBackend()))
+    decode.assert_not_called()
+
+
+def test_duration_of_compressed_audio_comes_from_ffprobe(tmp_path, mocker):
+    mocker.patch("apps.api.app.transcription.shutil.which", return_value="/usr/bin/ffprobe")
+    run = mocker.patch("apps.api.app.transcription.subprocess.run")
+    run.return_value.returncode = 0
+    run.return_value.stdout = b"5400.250000\n"
+    path = tmp_path / "podcast.mp3"
+
+    assert transcription.probe_duration(path) == 5400.25
+    assert run.call_args.args[0][0] == "ffprobe"
+    run.return_value.stdout = b"N/A\n"
+    assert transcription.probe_duration(path) is None
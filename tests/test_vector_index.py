@@ -0,0 +1,92 @@
+import numpy as np
+from apps.api.app.embeddings import HashingEmbedder
+from apps.api.app.vector_index import VectorIndex, chunk_text
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dim=64)
+    first = embedder.embed(["Invoice for 100 dollars", ""])
+    second = embedder.embed(["Invoice for 100 dollars", ""])
+    assert first.shape == (2, 64)
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    assert not first[1].any()
+
+
+def test_chunk_text_covers_text_with_overlap():
+    text = " ".join(f"word{i}" for i in range(200))
+    spans = chunk_text(text, size=100, overlap=20)
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(text)
+    for (_, prev_end), (start, _) in zip(spans, spans[1:]):
+        assert start < prev_end
+    assert all(end - start <= 100 for start, end in spans)
+
+
+def test_vector_index_returns_relevant_chunks_per_user(tmp_path):
+    index = VectorIndex(root=tmp_path, embedder=HashingEmbedder(dim=256))
+    index.add(1, note_id=10, text="Electricity bill due March 3rd, total 80 euros")
+    index.add(1, note_id=11, text="Recipe: pancakes with flour, milk and eggs")
+    index.add(2, note_id=20, text="Electricity bill for another user")
+
+    results = index.search(1, "when is the electricity bill due", k=1)
+    assert [c.note_id for c in results] == [10]
+    assert results[0].text.startswith("Electricity")
+
+    assert {c.note_id for c in index.search(1, "electricity pancakes", k=5)} == {10, 11}
+
+    index.delete_user(1)
+    assert index.search(1, "electricity") == []
+    assert [c.note_id for c in index.search(2, "electricity")] == [20]
+
+
+def test_vector_index_persists_on_disk(tmp_path):
+    embedder = HashingEmbedder(dim=128)
+    VectorIndex(root=tmp_path, embedder=embedder).add(5, note_id=1, text="passport renewal appointment")
+
+    reopened = VectorIndex(root=tmp_path, embedder=embedder)
+    assert [c.note_id for c in reopened.search(5, "passport")] == [1]
+
+
+def test_interrupted_add_is_invisible_and_cleaned_up(tmp_path):
+    index = VectorIndex(root=tmp_path, embedder=HashingEmbedder(dim=64))
+    index.add(3, note_id=1, text="gas bill due friday")
+    matrix_path, meta_path, _ = index._paths(3)
+    # A crash after appending, before the commit record: a stray row and half a metadata line
+    with open(matrix_path, "ab") as f:
+        f.write(np.ones(64, dtype=np.float32).tobytes())
+    with open(meta_path, "a", encoding="utf-8") as f:
+        f.write('{"note_id": 99, "sta')
+
+    assert [c.note_id for c in index.search(3, "gas bill", k=5)] == [1]
+
+    index.add(3, note_id=2, text="water bill due monday")
+    assert {c.note_id for c in index.search(3, "bill due", k=5)} == {1, 2}
+    assert matrix_path.stat().st_size == 2 * 64 * 4
+    assert len(meta_path.read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_adds_append_instead_of_rewriting(tmp_path, mocker):
+    index = VectorIndex(root=tmp_path, embedder=HashingEmbedder(dim=64))
+    index.add(4, note_id=0, text="first note")
+    save = mocker.patch("numpy.save")
+
+    for note_id in range(1, 20):
+        index.add(4, note_id=note_id, text=f"note number {note_id}")
+        index.search(4, "note")
+
+    save.assert_not_called()
+    assert index._paths(4)[0].stat().st_size == 20 * 64 * 4
+    assert len(index.search(4, "note number", k=50)) == 20
+
+
+def test_only_recently_searched_users_stay_in_memory(tmp_path):
+    index = VectorIndex(root=tmp_path, embedder=HashingEmbedder(dim=64), max_users=2)
+    for user_id in (1, 2, 3):
+        index.add(user_id, note_id=user_id, text=f"rent receipt for user {user_id}")
+        index.search(user_id, "rent")
+    index.search(2, "rent")
+
+    assert list(index._cache) == [3, 2]
+    assert [c.note_id for c in index.search(1, "rent", min_score=-1.0)] == [1]
+    assert list(index._cache) == [2, 1]